@@ -0,0 +1,156 @@
+#!/usr/bin/env python2
+
+# Synthetic ansible 'setup' facts for copilot benchmarks and the fleet
+# simulator. Hosts are built from a handful of chassis templates, so a
+# fleet has the mix of disk layouts, NICs and subnets seen in real racks
+
+import re
+import random
+
+CHASSIS = [
+    # name, cores, threads/core, ram (MB), hdds, ssds, nvmes, nic driver, Mb/s
+    ("mon-1u", 8, 2, 32768, 0, 1, 0, "ixgbe", 10000),
+    ("osd-2u12", 16, 2, 131072, 12, 2, 0, "ixgbe", 10000),
+    ("osd-2u12-nvme", 16, 2, 131072, 12, 0, 1, "mlx5_core", 25000),
+    ("osd-4u36", 24, 2, 262144, 36, 0, 2, "i40e", 40000),
+    ("flash-1u10", 32, 2, 196608, 0, 0, 10, "mlx5_core", 100000),
+    ("vm", 4, 1, 8192, 3, 0, 0, "virtio_net", -1),
+]
+
+TB = 1000 ** 4
+
+DISK_NAME = re.compile(r'^sd[a-z]+$')
+
+
+def disk_name(index):
+    """
+    Kernel style name of a scsi disk - sda..sdz, then sdaa, sdab...
+    :param index: (int) disk number, 0 is sda
+    :return: (str) device name
+    """
+
+    suffix = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        suffix = chr(ord('a') + rem) + suffix
+    return "sd{}".format(suffix)
+
+
+def disk_facts(dev_name, rotational, size_bytes, partitioned=False):
+    sectorsize = 512
+    return {
+        "rotational": str(rotational),
+        "sectors": str(size_bytes // sectorsize),
+        "sectorsize": str(sectorsize),
+        "partitions": {"{}1".format(dev_name): {}} if partitioned else {},
+        "model": "SIM-{}".format('HDD' if rotational else 'FLASH'),
+        "removable": "0"
+    }
+
+
+def nic_facts(nic_id, ip_addr, netmask, network, driver, speed):
+    return {
+        "device": nic_id,
+        "active": True,
+        "module": driver,
+        "speed": speed,
+        "type": "ether",
+        "ipv4": {
+            "address": ip_addr,
+            "netmask": netmask,
+            "network": network
+        }
+    }
+
+
+def host_facts(idx, chassis, rnd):
+    """
+    Build the setup facts for one host
+    :param idx: (int) host number, used for addressing
+    :param chassis: (tuple) entry from CHASSIS
+    :param rnd: (random.Random) source of variation
+    :return: (dict) facts, in the form returned by the setup module
+    """
+
+    (_name, cores, threads, ram, hdds, ssds, nvmes, driver,
+     speed) = chassis
+
+    devices = {"sda": disk_facts("sda", 1, 1 * TB, partitioned=True)}
+    names = [disk_name(n) for n in range(1, hdds + ssds + 1)]
+    assert all(DISK_NAME.match(dev_name) for dev_name in names), \
+        "invalid device name in {}".format(names)
+    for dev_name in names[:hdds]:
+        # a failed drive now and then, so layouts are not all identical
+        if rnd.random() < 0.02:
+            continue
+        devices[dev_name] = disk_facts(dev_name, 1, rnd.choice([4, 8]) * TB)
+    for dev_name in names[hdds:]:
+        devices[dev_name] = disk_facts(dev_name, 0, TB // 2)
+    for n in range(nvmes):
+        dev_name = "nvme{}n1".format(n)
+        devices[dev_name] = disk_facts(dev_name, 0, 2 * TB)
+
+    octet3, octet4 = divmod(idx, 250)
+    octet4 += 1
+    facts = {
+        "ansible_processor_count": cores,
+        "ansible_processor_threads_per_core": threads,
+        "ansible_memory_mb": {"real": {"total": ram}},
+        "ansible_devices": devices,
+        "ansible_interfaces": ["lo", "eth0", "eth1"],
+        "ansible_lo": {"device": "lo", "active": True},
+        "ansible_eth0": nic_facts("eth0",
+                                  "10.{}.{}.{}".format(octet3 // 250,
+                                                       octet3 % 250, octet4),
+                                  "255.0.0.0", "10.0.0.0", driver, speed),
+        "ansible_eth1": nic_facts("eth1",
+                                  "172.16.{}.{}".format(octet3 % 250, octet4),
+                                  "255.255.0.0", "172.16.0.0", driver, speed),
+    }
+
+    # a management network on some of the hosts
+    if idx % 3 == 0:
+        facts["ansible_interfaces"].append("eth2")
+        facts["ansible_eth2"] = nic_facts("eth2",
+                                          "192.168.{}.{}".format(octet3 % 250,
+                                                                 octet4),
+                                          "255.255.255.0",
+                                          "192.168.{}.0".format(octet3 % 250),
+                                          "e1000", 1000)
+
+    return {"ansible_facts": facts}
+
+
+def generate_facts(num_hosts, seed=0):
+    """
+    Generate facts for a fleet of hosts
+    :param num_hosts: (int) number of hosts
+    :param seed: (int) random seed, so runs are repeatable
+    :return: (dict) hostname -> (facts, roles)
+    """
+
+    rnd = random.Random(seed)
+    fleet = dict()
+
+    num_mons = 3 if num_hosts >= 3 else 1
+    for idx in range(num_hosts):
+        hostname = "sim-{}".format(idx)
+        if idx < num_mons:
+            chassis = CHASSIS[0]
+            roles = ['mon']
+        else:
+            chassis = rnd.choice(CHASSIS[1:])
+            roles = ['osd']
+            if idx % 50 == 0:
+                roles.append('rgw')
+            if idx % 97 == 0:
+                roles.append('mds')
+        fleet[hostname] = (host_facts(idx, chassis, rnd), roles)
+
+    return fleet
+
+
+def host_text(num_hosts):
+    """ host definition text (with a range) as entered in the UI """
+    return "sim-[0-{}]".format(num_hosts - 1)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python2
+
+# Replay a recorded (copilot --record) or generated playbook event stream
+# into the Deploy page or the probe progress bar, on a headless screen, and
+# report the redraw cost and memory growth
+#
+# usage: python benchmarks/replay_ui.py --generate events.jsonl
+#                                       [--hosts 500] [--tasks 400]
+#        python benchmarks/replay_ui.py --events events.jsonl
+#                                       [--page deploy] [--speed 0]
+
+import os
+import sys
+import json
+import random
+import logging
+import argparse
+import resource
+import timeit
+
+import urwid
+from urwid.display_common import BaseScreen
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from ceph_ansible_copilot.ansible import (ResultCallback, ReplayPlaybook,
+                                          ProgressModel)
+from ceph_ansible_copilot.ui import UI_Deploy
+from ceph_ansible_copilot.ui.palette import palette
+from copilot import App, Config
+
+# task names in the order a ceph-ansible deploy runs them (abridged)
+TASK_NAMES = [
+    "ceph-defaults : check for a mon container",
+    "ceph-common : install redhat ceph packages",
+    "ceph-config : generate ceph configuration file",
+    "ceph-mon : generate monitor initial keyring",
+    "ceph-osd : prepare ceph osd disk",
+    "ceph-osd : activate osd(s) when device is a disk",
+    "ceph-mds : create filesystem pools",
+    "ceph-rgw : create rados gateway directories",
+]
+
+
+class HeadlessScreen(BaseScreen):
+    """ urwid screen that renders canvases without a terminal """
+
+    def __init__(self, cols=132, rows=50):
+        BaseScreen.__init__(self)
+        self.size = (cols, rows)
+        self.draws = 0
+        self.draw_time = 0.0
+
+    def get_cols_rows(self):
+        return self.size
+
+    def draw_screen(self, size, canvas):
+        start = timeit.default_timer()
+        for _row in canvas.content():
+            pass
+        self.draw_time += timeit.default_timer() - start
+        self.draws += 1
+
+    def clear(self):
+        pass
+
+
+class ReplayApp(object):
+    """ just enough of the App for the Deploy page and the progress bar """
+
+    def __init__(self, screen):
+        self.cfg = Config()
+        self.cfg.playbook_rc = 0
+        self.hosts = dict()
+        self.log = logging.getLogger('copilot')
+        self.page = list()
+        self.pagenum = 0
+        self.pb_active = False
+        self.pb = None
+        self.progress = None
+        self.top = None
+        self.loop = urwid.MainLoop(urwid.SolidFill(), palette, screen=screen)
+
+    def refresh_ui(self, left=None, right=None):
+        self.top = urwid.Frame(self.page[self.pagenum].render_page)
+
+    def show_message(self, msg_text, immediate=False):
+        pass
+
+    def progress_bar(self, complete=0, progress=None):
+        App.progress_bar.__func__(self, complete, progress)
+
+    def progress_bar_update(self, stats):
+        App.progress_bar_update.__func__(self, stats)
+
+
+def generate_recording(event_file, num_hosts, num_tasks, duration,
+                       fail_rate, seed=0):
+    """
+    Write a synthetic recording, in the EventRecorder format
+    :param event_file: (str) file to create
+    :param num_hosts: (int) hosts in the run
+    :param num_tasks: (int) tasks in the playbook
+    :param duration: (int) seconds the run lasts
+    :param fail_rate: (float) share of host results that fail
+    :param seed: (int) random seed
+    :return: (int) number of events written
+    """
+
+    rnd = random.Random(seed)
+    hosts = ["osd-{}".format(n) for n in range(num_hosts)]
+    step = float(duration) / (num_tasks * (num_hosts + 1))
+    offset = 0.0
+    count = 0
+
+    with open(event_file, 'w') as f:
+        f.write(json.dumps({"event": "header", "phase": "deploy",
+                            "started": 0}) + '\n')
+        for task_num in range(num_tasks):
+            task = TASK_NAMES[task_num % len(TASK_NAMES)]
+            f.write(json.dumps({"t": round(offset, 4),
+                                "event": "task_start",
+                                "task": task}) + '\n')
+            offset += step
+            for host in hosts:
+                roll = rnd.random()
+                if roll < fail_rate:
+                    record = {"event": "failed",
+                              "result": {"msg": "non-zero return code",
+                                         "stderr": "simulated failure"}}
+                elif roll < 0.3:
+                    record = {"event": "skipped",
+                              "result": {"skipped": True}}
+                else:
+                    record = {"event": "ok",
+                              "result": {"changed": roll < 0.5}}
+                record['t'] = round(offset, 4)
+                record['host'] = host
+                f.write(json.dumps(record) + '\n')
+                offset += step
+            count += num_hosts + 1
+        f.write(json.dumps({"t": round(offset, 4), "event": "end",
+                            "rc": 0}) + '\n')
+
+    return count
+
+
+def rss_kb():
+    """ current resident set size of this process """
+    with open('/proc/self/statm', 'r') as statm:
+        pages = int(statm.read().split()[1])
+    return pages * resource.getpagesize() // 1024
+
+
+def replay(event_file, page, speed):
+
+    screen = HeadlessScreen()
+    app = ReplayApp(screen)
+    samples = list()
+
+    if page == 'deploy':
+        deploy = UI_Deploy(app)
+        app.page.append(deploy)
+        app.refresh_ui()
+        app.loop.widget = app.top
+        callout = deploy.page_update
+    else:
+        app.top = urwid.Frame(urwid.SolidFill())
+        callout = app.progress_bar_update
+
+    calls = [0]
+
+    def sampled_callout(stats):
+        callout(stats)
+        calls[0] += 1
+        if calls[0] % 1000 == 0:
+            samples.append([calls[0], rss_kb()])
+
+    callback = ResultCallback(pb_callout=sampled_callout,
+                              logger=logging.getLogger('copilot'))
+    playbook = ReplayPlaybook(event_file, callback=callback, speed=speed)
+
+    progress = ProgressModel(playbook.task_list(), page, save_history=False)
+    if page == 'probe':
+        app.progress_bar(progress=progress)
+    else:
+        deploy.progress = progress
+
+    rss_start = rss_kb()
+    start = timeit.default_timer()
+    playbook.run()
+    elapsed = timeit.default_timer() - start
+
+    return {
+        "page": page,
+        "events": len(playbook.events),
+        "recorded_duration": playbook.events[-1]['t'] if playbook.events
+        else 0,
+        "elapsed": elapsed,
+        "draws": screen.draws,
+        "draw_time": screen.draw_time,
+        "draw_avg_ms": (screen.draw_time / screen.draws * 1000
+                        if screen.draws else 0),
+        "rss_start_kb": rss_start,
+        "rss_end_kb": rss_kb(),
+        "rss_samples": samples
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="replay playbook events "
+                                                 "into the copilot UI")
+    parser.add_argument("--events", type=str, metavar="FILE",
+                        help="recording to replay (e.g. from copilot "
+                             "--record)")
+    parser.add_argument("--generate", type=str, metavar="FILE",
+                        help="write a synthetic deploy recording, then exit")
+    parser.add_argument("--hosts", type=int, default=500,
+                        help="hosts in a generated recording")
+    parser.add_argument("--tasks", type=int, default=400,
+                        help="tasks in a generated recording")
+    parser.add_argument("--duration", type=int, default=7200,
+                        help="seconds a generated run lasts")
+    parser.add_argument("--fail-rate", type=float, default=0.0005,
+                        help="share of failed results in a generated run")
+    parser.add_argument("--page", type=str, choices=['deploy', 'probe'],
+                        default='deploy',
+                        help="UI the events are replayed into")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="replay speed multiplier (0 is no delay)")
+    parser.add_argument("--output", type=str,
+                        help="write the results as json to this file")
+    args = parser.parse_args()
+
+    logging.getLogger('copilot').addHandler(logging.NullHandler())
+
+    if args.generate:
+        count = generate_recording(args.generate, args.hosts, args.tasks,
+                                   args.duration, args.fail_rate)
+        print("{} events written to {}".format(count, args.generate))
+        return
+
+    if not args.events:
+        parser.error("--events or --generate is required")
+
+    results = replay(args.events, args.page, args.speed)
+    print("{} events replayed into the {} page in {:.2f}s "
+          "(recorded run {:.0f}s)".format(results['events'], results['page'],
+                                          results['elapsed'],
+                                          results['recorded_duration']))
+    print("{} redraws, {:.2f}s drawing, {:.3f}ms per redraw".format(
+        results['draws'], results['draw_time'], results['draw_avg_ms']))
+    print("rss {}KB -> {}KB".format(results['rss_start_kb'],
+                                    results['rss_end_kb']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("Results written to {}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python2
+
+# Time copilot's core engines against synthetic fleets of 10 to 10,000
+# hosts, and save the results as json so releases can be compared
+#
+# usage: python benchmarks/run_benchmarks.py [--sizes 10,100] [--repeat 3]
+#                                            [--compare previous.json]
+#                                            [--ceph-ansible DIR]
+#
+# The plugin benchmarks run against a scratch copy of ceph-ansible's sample
+# files - they're skipped when no ceph-ansible tree is found
+
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import ceph_ansible_copilot
+from ceph_ansible_copilot import Host
+from ceph_ansible_copilot.rules import ClusterState, HostState
+from ceph_ansible_copilot.ui import UI_Network
+from ceph_ansible_copilot.utils import (PluginMgr, NetworkIndex,
+                                        expand_hosts)
+from ceph_ansible_copilot.utils.plugins import Plugin
+from copilot import Config
+
+from facts import generate_facts, host_text
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+CEPH_ANSIBLE_ROOT = '/usr/share/ceph-ansible'
+
+# plugin paths are redirected to a scratch directory while benchmarking
+REDIRECTS = [CEPH_ANSIBLE_ROOT, '/etc/ansible']
+
+
+def timed(func, repeat, setup=None):
+    """
+    :param func: (function) code to time
+    :param repeat: (int) number of runs
+    :param setup: (function) called before each run, not timed
+    :return: (float) fastest run in seconds
+    """
+
+    best = None
+    for _n in range(repeat):
+        if setup:
+            setup()
+        start = timeit.default_timer()
+        func()
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_plugins(plugin_mgr):
+    """
+    Load every plugin module, without the check that its target directories
+    exist - they're redirected to the sandbox when benchmarked
+    :param plugin_mgr: (PluginMgr) manager of the repo's plugin directory
+    :return: (dict) plugin name -> Plugin
+    """
+
+    plugins = dict()
+    for plugin_file in sorted(glob.glob(os.path.join(plugin_mgr.plugin_dir,
+                                                     '*.py'))):
+        try:
+            mod = plugin_mgr._load_plugin(plugin_file)
+        except ImportError as error:
+            # e.g. ansible isn't installed
+            print("Plugin {} skipped : {}".format(
+                os.path.basename(plugin_file), error))
+            continue
+        plugins[mod.__name__] = Plugin(mod)
+
+    return plugins
+
+
+def sample_files(ceph_ansible_dir):
+    """ ceph-ansible's sample files (site.yml and group_vars) """
+
+    return (glob.glob(os.path.join(ceph_ansible_dir, '*.sample')) +
+            glob.glob(os.path.join(ceph_ansible_dir, 'group_vars',
+                                   '*.sample')))
+
+
+def build_config(fleet):
+
+    cfg = Config()
+    cfg.hosts = dict()
+    for hostname, (facts, roles) in fleet.items():
+        cfg.hosts[hostname] = Host(hostname, roles)
+        cfg.hosts[hostname].seed(facts)
+
+    cfg.cluster_name = 'ceph'
+    cfg.sw_source = 'Community'
+    cfg.ceph_version = 12
+    cfg.osd_objectstore = 'bluestore'
+    cfg.dmcrypt = False
+    cfg.osd_scenario = 'non-collocated'
+    cfg.public_network = '10.0.0.0/8'
+    cfg.cluster_network = '172.16.0.0/16'
+    cfg.network_index = NetworkIndex(cfg.hosts)
+    return cfg
+
+
+class NetworkPage(object):
+    """ just enough of the App for UI_Network's subnet discovery """
+
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.network_index = None
+
+    @property
+    def parent(self):
+        return self
+
+
+class PluginSandbox(object):
+    """
+    Scratch copy of the ceph-ansible files the plugins read, so they can be
+    run without touching the real configuration
+    """
+
+    def __init__(self, plugins, ceph_ansible_dir):
+        """
+        :param plugins: (dict) plugin name -> Plugin
+        :param ceph_ansible_dir: (str) ceph-ansible tree holding the samples
+        """
+
+        self.plugins = plugins
+        self.ceph_ansible_dir = ceph_ansible_dir
+        self.root = tempfile.mkdtemp(prefix='copilot-bench-')
+        self.originals = dict()
+
+        for plugin_name, plugin in plugins.items():
+            mod = plugin.module
+            for attr in ('yml_file', 'host_vars_dir'):
+                path = getattr(mod, attr, None)
+                if not path:
+                    continue
+                self.originals[(plugin_name, attr)] = path
+                for prefix in REDIRECTS:
+                    if path.startswith(prefix):
+                        setattr(mod, attr, os.path.join(
+                            self.root, prefix.strip('/'),
+                            path[len(prefix):].lstrip('/')))
+
+    def reset(self):
+        """ restore the scratch area to the state of a fresh install """
+
+        for prefix in REDIRECTS:
+            target = os.path.join(self.root, prefix.strip('/'))
+            shutil.rmtree(target, ignore_errors=True)
+            os.makedirs(os.path.join(target, 'group_vars'))
+
+        for sample in sample_files(self.ceph_ansible_dir):
+            shutil.copy2(sample, os.path.join(
+                self.root, CEPH_ANSIBLE_ROOT.strip('/'),
+                os.path.relpath(sample, self.ceph_ansible_dir)))
+
+    def close(self):
+        for (plugin_name, attr), path in self.originals.items():
+            setattr(self.plugins[plugin_name].module, attr, path)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def run_size(num_hosts, repeat, plugins, ceph_ansible_dir):
+
+    results = dict()
+    fleet = generate_facts(num_hosts)
+    hosts = dict((hostname, Host(hostname, roles))
+                 for hostname, (_facts, roles) in fleet.items())
+
+    def seed_all():
+        for hostname in hosts:
+            hosts[hostname].seed(fleet[hostname][0])
+    results['host_seed'] = timed(seed_all, repeat)
+
+    def check_all():
+        for hostname in hosts:
+            hosts[hostname].check()
+    def forget_checks():
+        HostState._results.clear()
+        for hostname in hosts:
+            hosts[hostname]._check_key = None
+
+    # cold - every host's rules are run, then warm from the hosts' own
+    # results
+    results['host_check'] = timed(check_all, repeat, setup=forget_checks)
+    results['host_check_cached'] = timed(check_all, repeat)
+
+    results['host_bulk_check'] = timed(lambda: HostState.bulk_check(hosts),
+                                       repeat)
+
+    def cluster_check():
+        state = ClusterState(hosts, mode='prod')
+        state.check()
+    results['cluster_state_check'] = timed(cluster_check, repeat)
+
+    page = NetworkPage(hosts)
+
+    def discover_networks():
+        page.network_index = NetworkIndex(hosts)
+        UI_Network._get_public_networks.__func__(page)
+        UI_Network._get_cluster_networks.__func__(
+            page, page.network_index.host_mask(role='osd'))
+    results['network_discovery'] = timed(discover_networks, repeat)
+
+    text = host_text(num_hosts)
+    results['expand_hosts'] = timed(lambda: expand_hosts(text), repeat)
+
+    if not plugins:
+        return results
+
+    cfg = build_config(fleet)
+    sandbox = PluginSandbox(plugins, ceph_ansible_dir)
+    try:
+        for plugin_name in sorted(plugins):
+            mod = plugins[plugin_name].module
+            key = 'plugin_{}'.format(plugin_name)
+            try:
+                results[key] = timed(lambda: mod.plugin_main(cfg), repeat,
+                                     setup=sandbox.reset)
+            except Exception as error:
+                results[key] = None
+                results['{}_error'.format(key)] = str(error)
+    finally:
+        sandbox.close()
+
+    return results
+
+
+def compare(current, previous_file):
+
+    with open(previous_file, 'r') as f:
+        previous = json.load(f)
+
+    print("\nCompared to {} ({})".format(previous['version'],
+                                         previous_file))
+    for size in sorted(current['results'], key=int):
+        old = previous['results'].get(size, {})
+        for bench in sorted(current['results'][size]):
+            now, then = current['results'][size][bench], old.get(bench)
+            if not isinstance(now, float) or not isinstance(then, float):
+                continue
+            change = (now - then) / then * 100 if then else 0
+            flag = ' <--' if change > 20 else ''
+            print("{:>6s} {:<28s} {:>10.4f}s {:>+7.1f}%{}".format(
+                size, bench, now, change, flag))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="copilot benchmarks")
+    parser.add_argument("--sizes", type=str, default="10,100,1000,10000",
+                        help="comma separated fleet sizes")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs of each benchmark (the best is kept)")
+    parser.add_argument("--output", type=str,
+                        help="results file (default is "
+                             "benchmarks/results/<version>-<time>.json)")
+    parser.add_argument("--compare", type=str, metavar="FILE",
+                        help="previous results to compare against")
+    parser.add_argument("--ceph-ansible", type=str, metavar="DIR",
+                        default=CEPH_ANSIBLE_ROOT,
+                        help="ceph-ansible tree whose sample files the "
+                             "plugins are run against (default "
+                             "{})".format(CEPH_ANSIBLE_ROOT))
+    args = parser.parse_args()
+
+    logger = logging.getLogger('copilot')
+    logger.addHandler(logging.NullHandler())
+
+    os.environ.setdefault('HOSTNAME', 'bench.example.com')
+
+    plugin_mgr = PluginMgr(plugin_dir=os.path.join(REPO_ROOT, 'plugins'),
+                           logger=logger)
+    load_time = timed(plugin_mgr.load_plugins, args.repeat)
+
+    plugins = dict()
+    if sample_files(args.ceph_ansible):
+        plugins = load_plugins(plugin_mgr)
+    else:
+        print("Plugin benchmarks skipped - no ceph-ansible sample files in "
+              "{} (see --ceph-ansible)".format(args.ceph_ansible))
+
+    report = {
+        "version": ceph_ansible_copilot.__version__,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "plugin_load": load_time,
+        "results": dict()
+    }
+
+    for size in [int(n) for n in args.sizes.split(',')]:
+        print("Benchmarking {} hosts".format(size))
+        results = run_size(size, args.repeat, plugins, args.ceph_ansible)
+        report['results'][str(size)] = results
+        for bench in sorted(results):
+            if isinstance(results[bench], float):
+                print("  {:<28s} {:>10.4f}s".format(bench, results[bench]))
+            elif bench.endswith('_error'):
+                print("  {:<28s} {}".format(bench, results[bench]))
+
+    output = args.output
+    if not output:
+        if not os.path.exists(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        output = os.path.join(RESULTS_DIR, '{}-{}.json'.format(
+            report['version'], time.strftime('%Y%m%d-%H%M%S')))
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print("Results written to {}".format(output))
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python2
+
+# Compare the pure python and libyaml (C) load/dump paths used by the
+# site_yml plugin and valid_yaml, against a real ceph-ansible site.yml
+#
+# usage: python benchmarks/yaml_bench.py [site.yml] [iterations]
+
+import sys
+import timeit
+from StringIO import StringIO
+
+sys.path.insert(0, '.')
+
+import yaml
+
+from ceph_ansible_copilot.utils import ordered_load, ordered_dump
+
+DEFAULT_FILE = '/usr/share/ceph-ansible/site.yml.sample'
+
+
+def bench(content, loader, dumper, iterations):
+
+    data = ordered_load(content, Loader=loader)
+
+    load_time = timeit.timeit(lambda: ordered_load(content, Loader=loader),
+                              number=iterations)
+    dump_time = timeit.timeit(lambda: ordered_dump(data,
+                                                   stream=StringIO(),
+                                                   Dumper=dumper,
+                                                   default_flow_style=False,
+                                                   explicit_start=True),
+                              number=iterations)
+
+    return load_time / iterations, dump_time / iterations
+
+
+def main():
+
+    yml_file = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FILE
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with open(yml_file, 'r') as f:
+        content = f.read()
+
+    print("{} ({} bytes), {} iterations".format(yml_file, len(content),
+                                                iterations))
+
+    py_load, py_dump = bench(content, yaml.SafeLoader, yaml.SafeDumper,
+                             iterations)
+    print("{:<8s} load {:8.2f}ms  dump {:8.2f}ms".format('python',
+                                                         py_load * 1000,
+                                                         py_dump * 1000))
+
+    if not hasattr(yaml, 'CSafeLoader'):
+        print("libyaml bindings are not available in this pyyaml build")
+        return
+
+    c_load, c_dump = bench(content, yaml.CSafeLoader, yaml.CSafeDumper,
+                           iterations)
+    print("{:<8s} load {:8.2f}ms  dump {:8.2f}ms".format('libyaml',
+                                                         c_load * 1000,
+                                                         c_dump * 1000))
+    print("speedup  load {:7.1f}x   dump {:7.1f}x".format(py_load / c_load,
+                                                         py_dump / c_dump))
+
+
+if __name__ == '__main__':
+    main()
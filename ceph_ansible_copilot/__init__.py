@@ -6,7 +6,12 @@ from .utils import setup_ansible_cfg
 
 __version__ = '0.9.5'
 
+# True when ansible.cfg has copilot's settings - ansible reads the file when
+# it's imported, so they're applied before anything imports ansible
+ansible_cfg_tuned = False
+
 if sys.argv[0] == '/usr/bin/copilot':
     setup_ansible_cfg()
+    ansible_cfg_tuned = True
 
 
@@ -3,4 +3,18 @@ from .playbook import (ResultCallback,
                        CoPilotPlaybookError,
                        CoPilotPlayBook,
                        StaticPlaybook,
-                       DynamicPlaybook)
+                       DynamicPlaybook,
+                       STRATEGIES)
+
+from .inventory import (CoPilotInventory, CoPilotInventoryManager,
+                        ROLE_GROUPS)
+
+from .factcache import (write_fact_cache, prune_fact_cache, use_fact_cache,
+                        restore_constants)
+
+from .recorder import EventRecorder, ReplayPlaybook, load_events
+
+from .progress import ProgressModel, TaskHistory, fmt_duration
+
+from .report import (write_run_report, load_run_reports,
+                     strategy_summary)
@@ -0,0 +1,112 @@
+
+# Seed ansible's jsonfile fact cache with the facts gathered by the host
+# probe. With smart gathering, the deploy's plays then only gather facts for
+# hosts that aren't in the cache, instead of collecting them all over again.
+# Each host is a json file named after the host, holding its ansible_facts -
+# the layout ansible's jsonfile cache plugin reads
+
+import os
+import json
+import time
+import tempfile
+
+from ansible import constants as C
+
+from ceph_ansible_copilot.utils import FACT_CACHE_DIR
+
+# ansible constants set by use_fact_cache
+CACHE_CONSTANTS = ('CACHE_PLUGIN', 'CACHE_PLUGIN_CONNECTION',
+                   'CACHE_PLUGIN_TIMEOUT', 'DEFAULT_GATHERING')
+
+
+def write_fact_cache(results, cache_dir=FACT_CACHE_DIR):
+    """
+    Add the facts of a probe to the cache
+    :param results: (dict) host name -> setup module result (the callback's
+                    successes)
+    :param cache_dir: (str) fact cache directory
+    :return: (int) number of hosts written
+    """
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, 0o700)
+
+    count = 0
+    for host_name, result in results.items():
+        facts = result.get('ansible_facts')
+        if not facts:
+            continue
+
+        # smart gathering skips a host only when its cached facts came from
+        # the setup module
+        facts = dict(facts)
+        facts['module_setup'] = True
+
+        # write then rename, so ansible never reads a partial file
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, prefix='.copilot-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(facts, f, sort_keys=True, indent=4)
+        os.rename(tmp_file, os.path.join(cache_dir, host_name))
+        count += 1
+
+    return count
+
+
+def prune_fact_cache(max_age, cache_dir=FACT_CACHE_DIR):
+    """
+    Remove the hosts whose facts are older than max_age
+    :param max_age: (int) seconds facts stay valid, 0 removes every entry
+    :param cache_dir: (str) fact cache directory
+    :return: (list) host names removed
+    """
+
+    if not os.path.isdir(cache_dir):
+        return []
+
+    removed = list()
+    now = time.time()
+    for host_name in os.listdir(cache_dir):
+        cache_file = os.path.join(cache_dir, host_name)
+        try:
+            if max_age and now - os.path.getmtime(cache_file) <= max_age:
+                continue
+            os.remove(cache_file)
+        except OSError:
+            # removed by ansible in the meantime
+            continue
+        if not host_name.startswith('.'):
+            removed.append(host_name)
+
+    return sorted(removed)
+
+
+def use_fact_cache(max_age, cache_dir=FACT_CACHE_DIR):
+    """
+    Point ansible at the fact cache, with smart gathering. ansible.cfg has
+    already been read, so the settings are made on ansible's constants and
+    apply to playbooks created from here on, until they're restored. max_age
+    is the only expiry applied to the cache (ansible.cfg doesn't set one)
+    :param max_age: (int) seconds cached facts are valid for
+    :param cache_dir: (str) fact cache directory
+    :return: (dict) the previous values, for restore_constants
+    """
+
+    saved = dict((name, getattr(C, name)) for name in CACHE_CONSTANTS)
+
+    C.CACHE_PLUGIN = 'jsonfile'
+    C.CACHE_PLUGIN_CONNECTION = cache_dir
+    C.CACHE_PLUGIN_TIMEOUT = max_age
+    C.DEFAULT_GATHERING = 'smart'
+
+    return saved
+
+
+def restore_constants(saved):
+    """
+    Put back the ansible constants changed by use_fact_cache
+    :param saved: (dict) constant name -> value, from use_fact_cache
+    :return: None
+    """
+
+    for name, value in saved.items():
+        setattr(C, name, value)
@@ -0,0 +1,155 @@
+
+# The cluster's ansible inventory, built directly from copilot's Host objects.
+# The same inventory is written to /etc/ansible/hosts (with host ranges), and
+# handed to the playbooks in memory, so it's never parsed back from the file
+
+import pipes
+from collections import OrderedDict
+
+from ansible.inventory.manager import InventoryManager
+
+from ceph_ansible_copilot.utils import compress_hosts
+
+# inventory group for each copilot role
+ROLE_GROUPS = OrderedDict([
+    ("mon", "mons"),
+    ("osd", "osds"),
+    ("rgw", "rgws"),
+    ("mds", "mdss")
+])
+
+# groups holding the same hosts as a role group - the mgrs run on the mons
+MIRROR_GROUPS = {
+    "mons": ["mgrs"]
+}
+
+
+class CoPilotInventory(object):
+    """ Groups and host variables of the cluster's hosts """
+
+    def __init__(self, hosts, selected_only=True):
+        """
+        :param hosts: (dict) host name -> Host object
+        :param selected_only: (bool) leave out the hosts deselected in the UI
+        """
+
+        self.groups = OrderedDict()
+        for group in ROLE_GROUPS.values():
+            self.groups[group] = []
+            for mirror in MIRROR_GROUPS.get(group, []):
+                self.groups[mirror] = []
+
+        self.hostvars = dict()
+        self.ungrouped = list()
+
+        for host_name in sorted(hosts.keys()):
+            host_obj = hosts[host_name]
+            if selected_only and not host_obj.selected:
+                continue
+
+            groups = [ROLE_GROUPS[role] for role in host_obj.roles
+                      if role in ROLE_GROUPS]
+            for group in groups:
+                self.groups[group].append(host_name)
+                for mirror in MIRROR_GROUPS.get(group, []):
+                    self.groups[mirror].append(host_name)
+            if not groups:
+                self.ungrouped.append(host_name)
+
+            if host_obj.ssh.requiretty:
+                # sudo on this host needs a tty, which pipelining lacks
+                self.hostvars[host_name] = {"ansible_pipelining": False}
+
+    @property
+    def host_names(self):
+        """ every host in the inventory, sorted """
+
+        names = set(self.ungrouped)
+        for members in self.groups.values():
+            names.update(members)
+        return sorted(names)
+
+    def to_dict(self):
+        """
+        :return: (dict) group name -> host names, for the populated groups
+        """
+
+        return dict((group, list(members))
+                    for group, members in self.groups.items() if members)
+
+    def _host_lines(self, host_names):
+        """ inventory lines for hosts - ranges, then hosts with variables """
+
+        plain = [host_name for host_name in host_names
+                 if host_name not in self.hostvars]
+        lines = compress_hosts(plain)
+        for host_name in host_names:
+            if host_name in self.hostvars:
+                host_vars = self.hostvars[host_name]
+                lines.append(' '.join([host_name] +
+                                      ["{}={}".format(var,
+                                                      pipes.quote(str(value)))
+                                       for var, value in
+                                       sorted(host_vars.items())]))
+        return lines
+
+    def ini_lines(self):
+        """
+        :return: (list) lines of an ini inventory file, with host ranges
+        """
+
+        contents = []
+        if self.ungrouped:
+            contents.extend(self._host_lines(self.ungrouped))
+            contents.append(" ")
+
+        for group, members in self.groups.items():
+            if not members:
+                continue
+            contents.append("[{}]".format(group))
+            contents.extend(self._host_lines(members))
+            contents.append(" ")
+
+        return contents
+
+    def populate(self, inventory_data):
+        """
+        Load the groups, hosts and variables into ansible's inventory
+        :param inventory_data: (InventoryData) ansible inventory to fill
+        :return: None
+        """
+
+        for host_name in self.ungrouped:
+            inventory_data.add_host(host_name)
+
+        for group, members in self.groups.items():
+            if not members:
+                continue
+            inventory_data.add_group(group)
+            for host_name in members:
+                inventory_data.add_host(host_name, group=group)
+
+        for host_name, host_vars in self.hostvars.items():
+            for var, value in host_vars.items():
+                inventory_data.set_variable(host_name, var, value)
+
+        inventory_data.reconcile_inventory()
+
+
+class CoPilotInventoryManager(InventoryManager):
+    """
+    InventoryManager filled from a CoPilotInventory, in place of parsing an
+    inventory source
+    """
+
+    def __init__(self, loader, inventory):
+        """
+        :param loader: (DataLoader) ansible data loader
+        :param inventory: (CoPilotInventory) the cluster's inventory
+        """
+
+        self.copilot_inventory = inventory
+        InventoryManager.__init__(self, loader, sources=[])
+
+    def parse_sources(self, cache=False):
+        self.copilot_inventory.populate(self._inventory)
@@ -3,19 +3,33 @@
 # Embedding Ansible through python API - requires ansible 2.4 or above
 # ref: http://docs.ansible.com/ansible/latest/dev_guide/developing_api.html
 
+import os
 import logging
+import fnmatch
 
 from collections import namedtuple
 
+from ansible import constants as C
 from ansible.cli import CLI as cli
 from ansible.parsing.dataloader import DataLoader
 from ansible.vars.manager import VariableManager
 from ansible.inventory.manager import InventoryManager
+from ansible.playbook import Playbook
 from ansible.playbook.play import Play
+from ansible.playbook.block import Block
+from ansible.template import Templar
+from ansible.module_utils.parsing.convert_bool import boolean
 from ansible.executor.task_queue_manager import TaskQueueManager
 from ansible.executor.playbook_executor import PlaybookExecutor
 from ansible.plugins.callback import CallbackBase
 
+from ceph_ansible_copilot.utils import ordered_load, ordered_dump
+from .factcache import use_fact_cache, restore_constants
+from .inventory import CoPilotInventory, CoPilotInventoryManager
+
+# ansible execution strategies offered for deploys
+STRATEGIES = ['linear', 'free']
+
 
 class ResultCallback(CallbackBase):
     """ Callback plugin to act on results as they are emitted """
@@ -24,9 +38,10 @@ class ResultCallback(CallbackBase):
     CALLBACK_TYPE = 'stdout'
     CALLBACK_NAME = 'pb_results'
 
-    def __init__(self, pb_callout=None, logger=None):
+    def __init__(self, pb_callout=None, logger=None, recorder=None):
 
         self.logger = logger
+        self.recorder = recorder        # EventRecorder, when recording
 
         self.stats = {'task_state': {
                                      'success': 0,
@@ -35,8 +50,10 @@ class ResultCallback(CallbackBase):
                                      'unreachable': 0
                                      },
                       'failures': {},
+                      'unreachable': {},
                       'successes': {},
-                      'task_name': ''
+                      'task_name': '',
+                      'first_failed_task': ''
                       }
 
         self.done = 0
@@ -72,6 +89,9 @@ class ResultCallback(CallbackBase):
     def v2_runner_on_ok(self, result, **kwargs):
         host = result._host.name
 
+        if self.recorder:
+            self.recorder.record('ok', host, result._result)
+
         self._handle_warnings(result._result)
 
         # Hold output of last command
@@ -90,6 +110,9 @@ class ResultCallback(CallbackBase):
 
         host = result._host.name
 
+        if self.recorder:
+            self.recorder.record('failed', host, result._result)
+
         self._handle_warnings(result._result)
 
         if host in self.stats['failures'].keys():
@@ -97,6 +120,9 @@ class ResultCallback(CallbackBase):
         else:
             self.stats['failures'][host] = [result._result]
 
+        if not self.stats['first_failed_task']:
+            self.stats['first_failed_task'] = self.stats['task_name']
+
         if self.logger:
             self._log_msg(result, msg_type='error')
 
@@ -107,13 +133,26 @@ class ResultCallback(CallbackBase):
     def v2_runner_on_unreachable(self, result, **kwargs):
         host = result._host.name
 
+        if self.recorder:
+            self.recorder.record('unreachable', host, result._result)
+
         self._handle_warnings(result._result)
+
+        # keep the host names, so a rerun can be limited to these hosts
+        self.stats['unreachable'][host] = result._result
+        if not self.stats['first_failed_task']:
+            self.stats['first_failed_task'] = self.stats['task_name']
+
         self.stats['task_state']['unreachable'] += 1
         if self.pb_callout:
             self.pb_callout(self.stats)
 
     def v2_runner_on_skipped(self, result, **kwargs):
         host = result._host.name
+
+        if self.recorder:
+            self.recorder.record('skipped', host, result._result)
+
         self._handle_warnings(result._result)
 
         self.stats['task_state']['skipped'] += 1
@@ -123,6 +162,8 @@ class ResultCallback(CallbackBase):
     def playbook_on_task_start(self, name, is_conditional):
 
         self.stats['task_name'] = name
+        if self.recorder:
+            self.recorder.record('task_start', task=name)
         if self.pb_callout:
             pass
 
@@ -131,14 +172,112 @@ class CoPilotPlaybookError(Exception):
     pass
 
 
+def block_tasks(block):
+    """ names of the tasks in a block (and its nested blocks) that always
+        run - rescue sections only run on a failure, so are left out """
+
+    names = list()
+    for task in block.block + block.always:
+        if isinstance(task, Block):
+            names.extend(block_tasks(task))
+        elif task.action != 'meta':
+            names.append(task.name)
+    return names
+
+
+def play_tasks(play, inventory, variable_manager, loader):
+    """
+    List the tasks of a play, with the number of hosts each one runs on.
+    Tasks from dynamic includes are only known at run time, so aren't
+    listed
+    :param play: (Play) loaded play
+    :param inventory: (InventoryManager) inventory the play runs against
+    :param variable_manager: (VariableManager) for templated host patterns
+    :param loader: (DataLoader) data loader
+    :return: (list) of (task name, host count) tuples in run order
+    """
+
+    templar = Templar(loader=loader,
+                      variables=variable_manager.get_vars(play=play))
+    hosts = len(inventory.get_hosts(templar.template(play.hosts)))
+
+    tasks = list()
+    if play.gather_facts is None or boolean(play.gather_facts, strict=False):
+        tasks.append(('Gathering Facts', hosts))
+
+    for block in play.compile():
+        tasks.extend([(name, hosts) for name in block_tasks(block)])
+
+    return tasks
+
+
+def derive_playbook(pb_file, strategy=None, serial=None, groups=None):
+    """
+    Write a copy of a playbook with the strategy and serial (batch size) of
+    some of its plays overridden. The copy sits next to the original, so
+    role and group_vars lookups relative to the playbook still work
+    :param pb_file: (str) playbook to copy
+    :param strategy: (str) strategy for the plays e.g. free
+    :param serial: (str|int) batch size for the plays e.g. 10, "25%"
+    :param groups: (list) inventory groups - a play is changed when it only
+                   runs against these groups
+    :return: (str) path of the derived playbook
+    """
+
+    groups = groups if groups else []
+
+    with open(pb_file, 'r') as f:
+        plays = ordered_load(f)
+
+    for play in plays:
+        if not isinstance(play, dict) or 'hosts' not in play:
+            # playbook includes/imports
+            continue
+
+        hosts = play['hosts']
+        if not isinstance(hosts, list):
+            hosts = [pattern.strip() for pattern in str(hosts).split(',')]
+        if not all(pattern in groups for pattern in hosts):
+            continue
+
+        if strategy:
+            play['strategy'] = strategy
+        if serial:
+            play['serial'] = serial
+
+    derived = os.path.join(os.path.dirname(os.path.abspath(pb_file)),
+                           '.copilot-{}'.format(os.path.basename(pb_file)))
+    with open(derived, 'w') as f:
+        f.write("---\n# created by copilot from {} - removed after the "
+                "run\n".format(pb_file))
+        ordered_dump(plays, f, default_flow_style=False)
+
+    return derived
+
+
 class CoPilotPlayBook(object):
 
-    def __init__(self, host_list, callback=None):
+    # connection plugin used to reach the hosts
+    connection = 'ssh'
+
+    def __init__(self, host_list, callback=None, limit=None,
+                 start_at_task=None, forks=None):
+        """
+        :param host_list: (str|CoPilotInventory) inventory file, comma
+                          separated hosts, or the cluster's inventory
+        :param callback: (ResultCallback) callback for the run's events
+        :param limit: (str) host pattern to restrict the run to e.g. the
+                      failed hosts of a previous run
+        :param start_at_task: (str) name of the task to start the run at
+        :param forks: (int) hosts worked on in parallel (default is
+                      ansible.cfg's forks)
+        """
 
         Options = namedtuple('Options',
                              ['connection', 'module_path', 'forks', 'become',
                               'become_method', 'become_user', 'check', 'diff',
-                              'listtags', 'listtasks', 'listhosts', 'syntax']
+                              'listtags', 'listtasks', 'listhosts', 'syntax',
+                              'start_at_task']
                              )
 
         self.logger = logging.getLogger('copilot')
@@ -151,22 +290,31 @@ class CoPilotPlayBook(object):
                                listtags=False,
                                listtasks=False,
                                listhosts=False,
-                               connection='ssh',
+                               connection=self.connection,
                                module_path='',
-                               forks=100,
+                               forks=forks or C.DEFAULT_FORKS,
                                become=True,
                                become_method='sudo',
                                become_user='root',
                                check=False,
-                               diff=False
+                               diff=False,
+                               start_at_task=start_at_task
                        )
 
         # create inventory and pass to variable manager
-        self.inventory = InventoryManager(loader=self.loader,
-                                          sources=host_list)
+        if isinstance(host_list, CoPilotInventory):
+            self.inventory = CoPilotInventoryManager(loader=self.loader,
+                                                     inventory=host_list)
+        else:
+            self.inventory = InventoryManager(loader=self.loader,
+                                              sources=host_list)
 
         self.host_list = host_list
 
+        self.limit = limit
+        if limit:
+            self.inventory.subset(limit)
+
         self.variable_manager = VariableManager(loader=self.loader,
                                                 inventory=self.inventory)
 
@@ -188,6 +336,13 @@ class CoPilotPlayBook(object):
     def run(self):
         raise CoPilotPlaybookError("Missing 'run' method override")
 
+    def task_list(self):
+        """
+        Tasks the playbook will run, for progress tracking
+        :return: (list) of (task name, host count) tuples in run order
+        """
+        raise CoPilotPlaybookError("Missing 'task_list' method override")
+
 
 class DynamicPlaybook(CoPilotPlayBook):
 
@@ -210,6 +365,10 @@ class DynamicPlaybook(CoPilotPlayBook):
                                     variable_manager=self.variable_manager,
                                     loader=self.loader)
 
+    def task_list(self):
+        return play_tasks(self.playbook, self.inventory,
+                          self.variable_manager, self.loader)
+
     def run(self):
         # running the playbook
         tqm = None
@@ -232,10 +391,63 @@ class DynamicPlaybook(CoPilotPlayBook):
 
 class StaticPlaybook(CoPilotPlayBook):
 
-    def setup(self, pb_file):
+    def __init__(self, host_list, callback=None, limit=None,
+                 start_at_task=None, forks=None, fact_cache_dir=None,
+                 fact_cache_age=0):
+        """
+        :param fact_cache_dir: (str) jsonfile fact cache seeded by the probe.
+                               When given, facts are only gathered for the
+                               hosts missing from the cache (smart gathering)
+        :param fact_cache_age: (int) seconds cached facts are valid for
+        """
+
+        # the cache is attached to the variable manager, so it has to be
+        # in place before the base class creates one. The constants are put
+        # back once the playbook has run
+        self._saved_constants = dict()
+        if fact_cache_dir and fact_cache_age:
+            self._saved_constants = use_fact_cache(fact_cache_age,
+                                                   cache_dir=fact_cache_dir)
+
+        try:
+            CoPilotPlayBook.__init__(self, host_list, callback=callback,
+                                     limit=limit, start_at_task=start_at_task,
+                                     forks=forks)
+        except Exception:
+            # no playbook will run to put them back
+            self._restore_constants()
+            raise
+
+    def setup(self, pb_file, strategy=None, serial=None, groups=None):
+        """
+        :param pb_file: (str) playbook to run
+        :param strategy: (str) execution strategy for the plays of 'groups'
+                         (default is ansible's linear strategy)
+        :param serial: (str|int) batch size for the plays of 'groups'
+        :param groups: (list) inventory groups the overrides apply to
+        """
 
         self.pb_file = pb_file
-        self.playbook = PlaybookExecutor(playbooks=[self.pb_file],
+        self.strategy = strategy if strategy else 'linear'
+        self.serial = serial
+        self.derived_pb = None
+
+        if self.strategy != 'linear' or serial:
+            try:
+                self.derived_pb = derive_playbook(pb_file, strategy=strategy,
+                                                  serial=serial,
+                                                  groups=groups)
+            except Exception as error:
+                self._restore_constants()
+                raise CoPilotPlaybookError("Unable to apply strategy/serial "
+                                           "to {} : {}".format(pb_file,
+                                                               error))
+            self.logger.info("Running {} with strategy={} serial={} for "
+                             "{}".format(pb_file, self.strategy, serial,
+                                         ','.join(groups or [])))
+
+        self.playbook = PlaybookExecutor(playbooks=[self.derived_pb or
+                                                    self.pb_file],
                                          inventory=self.inventory,
                                          variable_manager=self.variable_manager,
                                          loader=self.loader,
@@ -246,5 +458,43 @@ class StaticPlaybook(CoPilotPlayBook):
 
         self.playbook._tqm._stdout_callback = self.callback
 
-        self.rc = self.playbook.run()
+        try:
+            self.rc = self.playbook.run()
+        finally:
+            self._restore_constants()
+            if self.derived_pb and os.path.exists(self.derived_pb):
+                os.remove(self.derived_pb)
+
+    def _restore_constants(self):
+        """ undo the ansible settings made for the fact cache """
+
+        restore_constants(self._saved_constants)
+        self._saved_constants = dict()
 
+    def task_list(self):
+
+        tasks = list()
+        try:
+            playbook = Playbook.load(self.derived_pb or self.pb_file,
+                                     variable_manager=self.variable_manager,
+                                     loader=self.loader)
+            for play in playbook.get_plays():
+                tasks.extend(play_tasks(play, self.inventory,
+                                        self.variable_manager, self.loader))
+
+            start_at = self.options.start_at_task
+            if start_at:
+                # tasks ahead of the start task are skipped by ansible
+                names = [name for name, _hosts in tasks]
+                for idx, name in enumerate(names):
+                    if name == start_at or fnmatch.fnmatch(name, start_at):
+                        tasks = tasks[idx:]
+                        break
+        except Exception as error:
+            # progress is a nice to have - the run itself reports any
+            # problem with the playbook
+            self.logger.warning("Unable to list the tasks of {} : "
+                                "{}".format(self.pb_file, error))
+            return []
+
+        return tasks
@@ -0,0 +1,254 @@
+
+# Progress and time remaining estimates for playbook runs. The expected
+# number of results comes from the playbook's task list (host x task), and
+# the time left from the durations of the same tasks in previous runs
+
+import os
+import json
+import math
+import time
+
+from ceph_ansible_copilot.utils import STATE_DIR
+
+
+def fmt_duration(seconds):
+    """
+    :param seconds: (float) duration
+    :return: (str) duration in a short form e.g. 1h 05m, 3m 10s, 45s
+    """
+
+    seconds = int(round(seconds))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return "{}h {:02d}m".format(hours, minutes)
+    elif minutes:
+        return "{}m {:02d}s".format(minutes, seconds)
+    return "{}s".format(seconds)
+
+
+class TaskHistory(object):
+    """
+    Task durations from previous runs, kept per phase (probe, deploy). A
+    duration is held per wave of hosts (hosts / forks), so a history taken
+    on a small cluster still applies to a large one. Repeat runs are
+    blended, weighting the latest run by 'weight'
+    """
+
+    def __init__(self, history_file=os.path.join(STATE_DIR,
+                                                 'task_history.json'),
+                 weight=0.5):
+        """
+        :param history_file: (str) json file holding the durations
+        :param weight: (float) weight given to the latest run (0-1)
+        """
+
+        self.history_file = history_file
+        self.weight = weight
+        self.history = dict()
+
+        if os.path.exists(history_file):
+            try:
+                with open(history_file, 'r') as f:
+                    self.history = json.load(f)
+            except ValueError:
+                # unreadable history is discarded, and rebuilt by this run
+                self.history = dict()
+
+    def duration(self, phase, task_name):
+        """ seconds per wave of hosts for a task, or None when unknown """
+        return self.history.get(phase, {}).get(task_name)
+
+    def update(self, phase, durations):
+        """
+        Blend the task durations of a run into the history
+        :param phase: (str) probe or deploy
+        :param durations: (dict) task name -> seconds per wave
+        :return: None
+        """
+
+        phase_history = self.history.setdefault(phase, dict())
+        for task_name, seconds in durations.items():
+            previous = phase_history.get(task_name)
+            if previous is None:
+                phase_history[task_name] = seconds
+            else:
+                phase_history[task_name] = (self.weight * seconds +
+                                            (1 - self.weight) * previous)
+
+    def save(self):
+
+        history_dir = os.path.dirname(self.history_file)
+        if not os.path.exists(history_dir):
+            os.makedirs(history_dir, 0o700)
+
+        with open(self.history_file, 'w') as f:
+            json.dump(self.history, f, indent=2, sort_keys=True)
+
+
+class ProgressModel(object):
+    """
+    Track a playbook run against the results it's expected to produce, and
+    estimate the time remaining
+    """
+
+    def __init__(self, task_list, phase, history=None, forks=100,
+                 save_history=True):
+        """
+        :param task_list: (list) of (task name, host count) tuples, in run
+                          order (see CoPilotPlayBook.task_list)
+        :param phase: (str) probe or deploy, the key for the task history
+        :param history: (TaskHistory) durations from previous runs
+        :param forks: (int) hosts ansible works on in parallel
+        :param save_history: (bool) add this run's durations to the history
+                             when it finishes
+        """
+
+        self.task_list = task_list
+        self.phase = phase
+        self.history = history
+        self.forks = forks
+        self.save_history = save_history
+
+        self.expected = sum([hosts for _name, hosts in task_list])
+        self.done = 0
+
+        self.start = time.time()
+        self.task_name = None
+        self.task_start = None
+        self.position = -1              # index of the running task
+        self.durations = dict()         # task name -> seconds per wave
+        self._runs = dict()             # task name -> times the task ran
+        self.finished = False
+
+        # estimates of the tasks from each position to the end of the list,
+        # so the eta is a lookup rather than a walk of the remaining tasks.
+        # Seconds come from the history, tasks without history are held as
+        # a host count and timed at this run's rate of results
+        self._seconds_after = [0.0] * (len(task_list) + 1)
+        self._hosts_after = [0] * (len(task_list) + 1)
+        for idx in range(len(task_list) - 1, -1, -1):
+            seconds, hosts = self._task_estimate(idx)
+            self._seconds_after[idx] = self._seconds_after[idx + 1] + seconds
+            self._hosts_after[idx] = self._hosts_after[idx + 1] + hosts
+
+    def _waves(self, hosts):
+        return max(1, int(math.ceil(float(hosts) / self.forks)))
+
+    def _close_task(self, now):
+        if self.task_name is None:
+            return
+
+        hosts = 1
+        if 0 <= self.position < len(self.task_list):
+            hosts = self.task_list[self.position][1]
+        per_wave = (now - self.task_start) / self._waves(hosts)
+
+        # a task name used in more than one play holds the average
+        runs = self._runs.get(self.task_name, 0)
+        self.durations[self.task_name] = ((self.durations.get(self.task_name,
+                                                              0) * runs +
+                                           per_wave) / (runs + 1))
+        self._runs[self.task_name] = runs + 1
+
+    def _advance(self, task_name):
+        """ move to the next occurrence of a task in the task list """
+        for idx in range(self.position + 1, len(self.task_list)):
+            if self.task_list[idx][0] == task_name:
+                self.position = idx
+                return
+        # a task we didn't expect (e.g. from a dynamic include) - stay put
+
+    def update(self, stats):
+        """
+        Update the model from the callback's stats
+        :param stats: (dict) ResultCallback stats
+        :return: None
+        """
+
+        self.done = sum(stats['task_state'].values())
+
+        task_name = stats['task_name']
+        if task_name and task_name != self.task_name:
+            now = time.time()
+            self._close_task(now)
+            self._advance(task_name)
+            self.task_name = task_name
+            self.task_start = now
+
+    def finish(self):
+        """
+        End the run, and add its task durations to the history
+        :return: None
+        """
+
+        self._close_task(time.time())
+        self.task_name = None
+        self.finished = True
+
+        if self.save_history and self.history is not None and \
+                self.durations:
+            self.history.update(self.phase, self.durations)
+            self.history.save()
+
+    @property
+    def percent(self):
+        """ percentage complete, or None when the expected count is unknown """
+
+        if self.finished:
+            return 100
+        if not self.expected:
+            return None
+        return min(99, int(self.done * 100 / self.expected))
+
+    def _task_estimate(self, idx):
+        """
+        Expected duration of a task in the task list
+        :param idx: (int) position of the task
+        :return: (tuple) seconds from the history, and the host count when
+                 the task has no history (timed at the run's rate of results)
+        """
+
+        task_name, hosts = self.task_list[idx]
+        per_wave = self.history.duration(self.phase, task_name) \
+            if self.history else None
+        if per_wave is not None:
+            return per_wave * self._waves(hosts), 0
+        return 0.0, hosts
+
+    @property
+    def eta(self):
+        """ estimated seconds remaining, or None when there's no basis """
+
+        if self.finished:
+            return 0
+        if not self.expected or self.done == 0:
+            return None
+
+        now = time.time()
+        rate = self.done / max(now - self.start, 0.001)
+
+        if self.position < 0:
+            return (self.expected - self.done) / rate
+
+        seconds, hosts = self._task_estimate(self.position)
+        current = seconds + hosts / rate
+        remaining = max(0, current - (now - self.task_start))
+
+        return (remaining + self._seconds_after[self.position + 1] +
+                self._hosts_after[self.position + 1] / rate)
+
+    @property
+    def status_text(self):
+        """ progress description for the UI """
+
+        percent = self.percent
+        if percent is None:
+            return "{} results".format(self.done)
+
+        eta = self.eta
+        if eta is None or self.finished:
+            return "{}% complete".format(percent)
+
+        return "{}% complete, about {} left".format(percent,
+                                                    fmt_duration(eta))
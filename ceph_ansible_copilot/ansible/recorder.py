@@ -0,0 +1,187 @@
+
+# Record the events a ResultCallback receives during a playbook run, and
+# replay them later into the same UI callbacks without running ansible.
+# Events are held as json lines - a header, one line per event with its
+# offset (seconds) from the start of the run, and an end record with the rc
+
+import json
+import time
+import threading
+
+
+class EventRecorder(object):
+    """ Write the callback events of a playbook run to a file """
+
+    def __init__(self, event_file, phase=''):
+        """
+        :param event_file: (str) file to write the events to (replaced)
+        :param phase: (str) copilot phase being recorded e.g. probe, deploy
+        """
+
+        self.event_file = event_file
+        self.start = time.time()
+        self.events = 0
+        self._lock = threading.Lock()
+        self._fd = open(event_file, 'w')
+        self._write({"event": "header",
+                     "phase": phase,
+                     "started": self.start})
+
+    def _write(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if self._fd:
+                self._fd.write(line + '\n')
+
+    def record(self, event, host=None, result=None, task=None):
+        """
+        Add an event to the recording
+        :param event: (str) ok, failed, unreachable, skipped or task_start
+        :param host: (str) host name the result is for
+        :param result: (dict) task result, as given to the callback
+        :param task: (str) task name, for task_start events
+        :return: None
+        """
+
+        record = {"t": round(time.time() - self.start, 4),
+                  "event": event}
+        if host is not None:
+            record['host'] = host
+        if result is not None:
+            record['result'] = result
+        if task is not None:
+            record['task'] = task
+
+        self.events += 1
+        self._write(record)
+
+    def close(self, rc=0):
+        """ write the end record, and close the file """
+
+        self._write({"t": round(time.time() - self.start, 4),
+                     "event": "end",
+                     "rc": rc})
+        with self._lock:
+            if self._fd:
+                self._fd.close()
+                self._fd = None
+
+
+def load_events(event_file):
+    """
+    Read a recording
+    :param event_file: (str) file written by EventRecorder
+    :return: (tuple) header dict, list of event dicts, rc of the run
+    """
+
+    header = dict()
+    events = list()
+    rc = 0
+    with open(event_file, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record['event'] == 'header':
+                header = record
+            elif record['event'] == 'end':
+                rc = record['rc']
+            else:
+                events.append(record)
+
+    return header, events, rc
+
+
+class ReplayHost(object):
+    """ stands in for ansible's Host object in a replayed result """
+
+    def __init__(self, name):
+        self.name = name
+
+
+class ReplayResult(object):
+    """ stands in for ansible's TaskResult object """
+
+    def __init__(self, host_name, result):
+        self._host = ReplayHost(host_name)
+        self._result = result
+
+
+class ReplayPlaybook(object):
+    """
+    Feed a recorded event stream into a ResultCallback, in place of running
+    a DynamicPlaybook or StaticPlaybook. The events keep their recorded
+    spacing, scaled by the replay speed
+    """
+
+    handlers = {
+        "ok": "v2_runner_on_ok",
+        "failed": "v2_runner_on_failed",
+        "unreachable": "v2_runner_on_unreachable",
+        "skipped": "v2_runner_on_skipped"
+    }
+
+    def __init__(self, event_file, callback=None, speed=1.0, host_list=None):
+        """
+        :param event_file: (str) recording to replay
+        :param callback: (ResultCallback) callback to receive the events
+        :param speed: (float) replay speed multiplier, 0 replays without
+                      any delay between events
+        :param host_list: (str|list) hosts to replay events for (comma
+                          separated string, as given to the playbooks).
+                          Default is every host in the recording
+        """
+
+        self.event_file = event_file
+        self.callback = callback
+        self.speed = speed
+        if isinstance(host_list, basestring):
+            host_list = [host for host in host_list.split(',') if host]
+        self.host_list = set(host_list) if host_list else None
+
+        self.header, self.events, self.recorded_rc = load_events(event_file)
+        self.rc = 0
+
+    def setup(self, *args, **kwargs):
+        """ the recording replaces the playbook, so there's nothing to load """
+        return
+
+    def _replayed(self, event):
+        return self.host_list is None or event['host'] in self.host_list
+
+    def task_list(self):
+        """ tasks in the recording, with the hosts that reported on each """
+
+        tasks = list()
+        for event in self.events:
+            if event['event'] == 'task_start':
+                tasks.append([event['task'], 0])
+            elif tasks and self._replayed(event):
+                tasks[-1][1] += 1
+            elif self._replayed(event):
+                tasks.append(['', 1])
+
+        return [tuple(task) for task in tasks]
+
+    def run(self):
+
+        start = time.time()
+        for event in self.events:
+
+            if self.speed > 0:
+                delay = (event['t'] / self.speed) - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            if event['event'] == 'task_start':
+                self.callback.playbook_on_task_start(event['task'], False)
+                continue
+
+            if not self._replayed(event):
+                continue
+
+            handler = getattr(self.callback, self.handlers[event['event']])
+            handler(ReplayResult(event['host'], event['result']))
+
+        self.rc = self.recorded_rc
+        return self.rc
@@ -0,0 +1,75 @@
+
+# Deploy run reports - one entry per run, so the timing of the execution
+# strategies and batch sizes can be compared on the same hardware
+
+import os
+import json
+
+from ceph_ansible_copilot.utils import STATE_DIR
+
+REPORT_FILE = os.path.join(STATE_DIR, 'deploy_runs.json')
+
+
+def load_run_reports(report_file=REPORT_FILE):
+    """
+    :param report_file: (str) json file holding the run reports
+    :return: (list) run reports, oldest first
+    """
+
+    if not os.path.exists(report_file):
+        return []
+
+    try:
+        with open(report_file, 'r') as f:
+            return json.load(f)
+    except ValueError:
+        return []
+
+
+def write_run_report(report, report_file=REPORT_FILE, keep=50):
+    """
+    Add a run to the report file
+    :param report: (dict) details of the run - strategy, serial, hosts,
+                   elapsed, rc etc
+    :param report_file: (str) json file holding the run reports
+    :param keep: (int) number of runs retained
+    :return: (list) run reports, including this one
+    """
+
+    runs = load_run_reports(report_file)
+    runs.append(report)
+    runs = runs[-keep:]
+
+    report_dir = os.path.dirname(report_file)
+    if not os.path.exists(report_dir):
+        os.makedirs(report_dir, 0o700)
+
+    with open(report_file, 'w') as f:
+        json.dump(runs, f, indent=2, sort_keys=True)
+
+    return runs
+
+
+def strategy_summary(runs):
+    """
+    Compare the runs of each strategy/batch size. Only complete runs over
+    the whole inventory count - reruns of a few hosts would skew the times
+    :param runs: (list) run reports
+    :return: (dict) "strategy/serial" -> {"runs": int,
+             "seconds_per_host": float}
+    """
+
+    summary = dict()
+    for run in runs:
+        if run.get('limit') or run.get('start_at_task') or \
+                run.get('replay') or not run.get('hosts'):
+            continue
+
+        key = "{}/{}".format(run['strategy'], run.get('serial') or 'all')
+        entry = summary.setdefault(key, {"runs": 0, "total": 0.0})
+        entry['runs'] += 1
+        entry['total'] += run['elapsed'] / float(run['hosts'])
+
+    return dict((key, {"runs": entry['runs'],
+                       "seconds_per_host": entry['total'] / entry['runs']})
+                for key, entry in summary.items())
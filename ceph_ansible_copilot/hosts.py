@@ -3,10 +3,18 @@ import json
 from collections import OrderedDict
 
 from ceph_ansible_copilot.utils import (merge_dicts, netmask_to_cidr,
-                                        bytes2human, SSHsession)
+                                        bytes2human, SSHsession,
+                                        device_class)
 from ceph_ansible_copilot.rules import HostState
 
 
+def mbps_to_gb(speed):
+    """ convert a link speed in Mb/s to Gb, keeping whole numbers as int """
+    if speed % 1000 == 0:
+        return speed // 1000
+    return speed / 1000.0
+
+
 class Host(object):
 
     supported_roles = OrderedDict([
@@ -16,6 +24,27 @@ class Host(object):
         ("mds", "F"),
     ])
 
+    # speed (Gb) assumed from the driver, when the link speed is unknown
+    nic_drivers = {
+        "ixgbe": 10,
+        "ixgbevf": 10,
+        "i40e": 40,
+        "i40evf": 40,
+        "ice": 100,
+        "cxgb": 10,
+        "cxgb4": 40,
+        "mlx4_en": 10,
+        "mlx5_core": 25,
+        "bnxt_en": 25,
+        "qede": 25,
+        "sfc": 10,
+        "enic": 10,
+        "vmxnet3": 10
+    }
+
+    # bonding modes where only one member is active at a time
+    failover_modes = ['active-backup', 'broadcast']
+
     def __init__(self, hostname=None, roles=None):
 
         self.hostname = hostname
@@ -25,6 +54,7 @@ class Host(object):
         self._facts = {}                # populated by ansible setup module
         self.state = 'Unknown'          # Unknown, OK, NOTOK
         self.state_msg = ''
+        self._check_key = None          # fingerprint behind state/state_msg
         self.selected = True
 
         self.available_cores = 0
@@ -38,6 +68,7 @@ class Host(object):
         self.ssd_count = 0
         self.nic_count = 0
         self.disk_capacity = 0
+        self.disks = {}                 # free disk class and size
         self.subnets = []              # ipv4 network list
         self.nics = {}                  # NIC details
 
@@ -57,12 +88,6 @@ class Host(object):
         return role_str
 
     def seed(self, ansible_facts):
-        nic_drivers = {
-            "ixgbe": 10,
-            "i40e": 40,
-            "cxgb": 10
-        }
-
         self._facts = ansible_facts['ansible_facts']
 
         self.available_cores = self._facts.get('ansible_processor_count') * \
@@ -85,6 +110,11 @@ class Host(object):
             sectors = int(all_disks[disk_id]['sectors'])
             sectorsz = int(all_disks[disk_id]['sectorsize'])
             total += sectors * sectorsz
+            self.disks[disk_id] = {
+                "class": device_class(disk_id,
+                                      all_disks[disk_id]['rotational']),
+                "size": sectors * sectorsz
+            }
         self.disk_capacity = total
 
         subnets = set()
@@ -102,22 +132,53 @@ class Host(object):
                 net_str = '{}/{}'.format(network, cidr)
                 subnets.add(net_str)
 
-                nic_type = nic_drivers.get(self._facts[key].get('module'), 1)
+                nic_gb, source = self._link_speed(nic_id)
                 self.nics[nic_id] = {
                                      "network": net_str,
                                      "driver": self._facts[key].get("module"),
                                      "state": self._facts[key].get("active"),
-                                     "nic_gb": nic_type
+                                     "nic_gb": nic_gb,
+                                     "speed_source": source
                                     }
 
         self.subnets = list(subnets)
 
-    def check(self):
+    def _link_speed(self, nic_id):
+        """
+        Determine the bandwidth of an interface. The negotiated speed is
+        used when the kernel reports it. For a bond without a speed, the
+        speeds of its slave interfaces are combined. A team's ports are not
+        in the setup facts, so a team without a speed falls through to the
+        driver table, which is the last resort
+        :param nic_id: (str) interface name
+        :return: (tuple) bandwidth in Gb, and how it was determined
+        """
+
+        nic = self._facts.get('ansible_{}'.format(nic_id), {})
+
+        speed = nic.get('speed')
+        if isinstance(speed, int) and speed > 0:
+            return mbps_to_gb(speed), 'link'
+
+        slaves = nic.get('slaves', [])
+        if slaves:
+            member_speeds = [self._link_speed(slave)[0] for slave in slaves]
+            if nic.get('mode', '') in Host.failover_modes:
+                # only one member carries traffic
+                return max(member_speeds), 'bond'
+            return sum(member_speeds), 'bond'
+
+        return Host.nic_drivers.get(nic.get('module'), 1), 'driver'
+
+    def check(self, mode='dev'):
+
+        # nothing the rules read has changed since the last check
+        key = HostState.host_fingerprint(self, mode)
+        if key == self._check_key:
+            return
 
-        host_state = HostState(self)
-        host_state.check()
-        self.state = host_state.state
-        self.state_msg = host_state.state_long
+        self.state, self.state_msg = HostState.summary(self, mode, key=key)
+        self._check_key = key
 
     def _free_disks(self, rotational=1):
         free = {}
@@ -1,3 +1,4 @@
 from .cluster import ClusterState
 from .host import HostState
-from .base import BaseCheck
+from .base import BaseCheck, rule
+from .inventory import ClusterInventory
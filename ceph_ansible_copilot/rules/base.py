@@ -1,10 +1,63 @@
 #!/usr/bin/env python2
 
-import inspect
+from collections import namedtuple
+
+
+Rule = namedtuple('Rule', ['name', 'severity', 'roles', 'modes', 'cost'])
+
+
+def rule(severity='warning', roles=None, modes=None, cost=1):
+    """
+    Decorator to register a method as a check rule
+    :param severity: (str) most severe problem the rule can raise
+    :param roles: (list) roles the rule applies to (None = all)
+    :param modes: (list) run modes the rule applies to (None = all)
+    :param cost: (int) relative cost of the rule, cheaper rules run first
+    :return: decorated method
+    """
+
+    def decorator(func):
+        func._rule = Rule(name=func.__name__,
+                          severity=severity,
+                          roles=tuple(roles) if roles else None,
+                          modes=tuple(modes) if modes else None,
+                          cost=cost)
+        return func
+
+    return decorator
+
+
+class RuleRegistry(type):
+    """
+    Metaclass that builds the rule list of a check class once, at class
+    creation time. Rules are inherited, and a subclass may override a rule by
+    redefining the method
+    """
+
+    def __init__(cls, name, bases, attrs):
+        super(RuleRegistry, cls).__init__(name, bases, attrs)
+
+        rules = dict()
+        for base in reversed(cls.__mro__[1:]):
+            for r in getattr(base, '_rules', []):
+                rules[r.name] = r
+
+        for attr_name, attr in attrs.items():
+            if attr_name.startswith('_check') and callable(attr):
+                rules[attr_name] = getattr(attr, '_rule',
+                                           Rule(name=attr_name,
+                                                severity='warning',
+                                                roles=None,
+                                                modes=None,
+                                                cost=1))
+
+        cls._rules = sorted(rules.values(), key=lambda r: (r.cost, r.name))
 
 
 class BaseCheck(object):
 
+    __metaclass__ = RuleRegistry
+
     valid_run_modes = ['prod', 'dev']
 
     def __init__(self):
@@ -13,42 +66,63 @@ class BaseCheck(object):
             "warning": []
         }
 
+    @property
+    def roles(self):
+        """ roles used to filter the rules, None means run every rule """
+        return None
+
+    def _applicable(self, check_rule):
+
+        if check_rule.modes and getattr(self, 'mode', None) not in \
+                check_rule.modes:
+            return False
+
+        if check_rule.roles and self.roles is not None:
+            return any(role in self.roles for role in check_rule.roles)
+
+        return True
+
     def check(self):
 
-        check_methods = [member for member in
-                         [getattr(self, attr) for attr in dir(self)]
-                         if inspect.ismethod(member) and
-                         member.__name__.startswith("_check")]
+        self.problems = {
+            "error": [],
+            "warning": []
+        }
 
-        for checker in check_methods:
-            checker()
+        for check_rule in self._rules:
+            if self._applicable(check_rule):
+                getattr(self, check_rule.name)()
 
     def _add_problem(self, severity, msg):
         self.problems[severity].append(msg)
 
-    @property
-    def state(self):
-        error_count = len(self.problems['error'])
-        warn_count = len(self.problems['warning'])
+    @staticmethod
+    def summarise(problems):
+        """
+        :param problems: (dict) problem messages, indexed by severity
+        :return: (tuple) short state and long description of the problems
+        """
+        error_count = len(problems['error'])
+        warn_count = len(problems['warning'])
         if error_count + warn_count == 0:
-            return 'OK'
+            state = 'OK'
+        elif error_count > 0:
+            state = 'NOTOK {} Err'.format(error_count)
         else:
-            if error_count > 0:
-                return 'NOTOK {} Err'.format(error_count)
-            else:
-                return 'OK {} Wrn'.format(warn_count)
+            state = 'OK {} Wrn'.format(warn_count)
 
-    @property
-    def state_long(self):
         state_desc = list()
-        if len(self.problems['error']) > 0:
-            state_desc.append("Error:{}".format(', '.join(self.problems['error'])))
-        if len(self.problems['warning']) > 0:
-            state_desc.append("Warning:{}".format(', '.join(self.problems['warning'])))
-
-        return ' / '.join(state_desc)
-
-
+        if error_count > 0:
+            state_desc.append("Error:{}".format(', '.join(problems['error'])))
+        if warn_count > 0:
+            state_desc.append("Warning:{}".format(', '.join(problems['warning'])))
 
+        return state, ' / '.join(state_desc)
 
+    @property
+    def state(self):
+        return BaseCheck.summarise(self.problems)[0]
 
+    @property
+    def state_long(self):
+        return BaseCheck.summarise(self.problems)[1]
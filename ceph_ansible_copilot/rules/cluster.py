@@ -1,17 +1,23 @@
 #!/usr/bin/env python2
 
-from .base import BaseCheck
+from .base import BaseCheck, rule
 
 
 class ClusterState(BaseCheck):
 
-    def __init__(self, hosts, mode='dev', install_source='community'):
+    # the only combination of roles that is not treated as collocation
+    allowed_collocation = {'mon', 'mgr'}
+
+    def __init__(self, hosts, mode='dev', install_source='community',
+                 inventory=None):
         """
         Check the host membership within a cluster do not violate best
         practice rules. The checks are all _check prefixed and invoked by the
         parent classes 'run' method
         :param host_list: (dict) dict of Host objects, indexed by hostname
         :param mode: (str) either dev or prod
+        :param inventory: (ClusterInventory) optional columnar view of the
+                          hosts, used to derive the role membership
         """
 
         self.hosts = hosts
@@ -19,8 +25,15 @@ class ClusterState(BaseCheck):
         self.installation_source = install_source
         self.hosts_by_role = dict()
         self.selected_hosts = set()
+        self.collocated_hosts = set()
+        self.error_hosts = set()
+        self.inventory = inventory
+        self._members = dict()          # hostname -> roles counted
 
-        self._analyse_roles()
+        if self.inventory is not None:
+            self._analyse_inventory()
+        else:
+            self._analyse_roles()
 
         assert isinstance(hosts, dict), \
             "ClusterCheck requires a dict of hosts, indexed by hostname"
@@ -36,29 +49,117 @@ class ClusterState(BaseCheck):
             if not host.selected:
                 continue
 
-            self.selected_hosts.add(hostname)
+            self.add_host(host)
+
+    def _analyse_inventory(self):
+
+        self.inventory.update_selection(self.hosts)
+
+        self.selected_hosts = set(self.inventory.selected_hostnames())
+        self.collocated_hosts = set(
+            self.inventory.collocated_hostnames(self.allowed_collocation))
+
+        for role in self.inventory.role_bits:
+            members = self.inventory.hosts_with_role(role)
+            if members:
+                self.hosts_by_role[role] = set(members)
+
+        for hostname in self.selected_hosts:
+            host = self.hosts[hostname]
+            self._members[hostname] = tuple(host.roles)
+            if self._has_errors(host):
+                self.error_hosts.add(hostname)
+
+    @staticmethod
+    def _has_errors(host):
+        return host.state_msg.lower().startswith('error')
+
+    def add_host(self, host):
+        """
+        Add a selected host to the role counters and error sets
+        :param host: (Host) host object
+        :return: None
+        """
+
+        hostname = host.hostname
+        if hostname in self._members:
+            self.remove_host(hostname)
+
+        roles = tuple(host.roles)
+        self._members[hostname] = roles
+        self.selected_hosts.add(hostname)
+
+        for role in roles:
+            self.hosts_by_role.setdefault(role, set()).add(hostname)
+
+        if len(roles) > 1 and set(roles) != self.allowed_collocation:
+            self.collocated_hosts.add(hostname)
+
+        if self._has_errors(host):
+            self.error_hosts.add(hostname)
+
+    def remove_host(self, hostname):
+        """
+        Remove a host from the role counters and error sets, using the roles
+        it was added with
+        :param hostname: (str) name of the host
+        :return: None
+        """
+
+        roles = self._members.pop(hostname, ())
+        for role in roles:
+            members = self.hosts_by_role.get(role)
+            if members:
+                members.discard(hostname)
+
+        self.selected_hosts.discard(hostname)
+        self.collocated_hosts.discard(hostname)
+        self.error_hosts.discard(hostname)
+
+    def update_host(self, host):
+        """
+        Apply the current state of a host (selected, deselected or re-probed)
+        to the cluster counters. Only the host's own contribution is changed,
+        so the cost is independent of the cluster size
+        :param host: (Host) host object
+        :return: None
+        """
 
-            for role in host.roles:
-                if role in self.hosts_by_role:
-                    self.hosts_by_role[role].append(host.hostname)
-                else:
-                    self.hosts_by_role[role] = list([host.hostname])
+        if host.selected:
+            self.add_host(host)
+        else:
+            self.remove_host(host.hostname)
+
+    @property
+    def summary(self):
+        """ one line description of the cluster membership and state """
+        verdict = self.state_long if self.state_long else self.state
+        return "MONs:{} OSDs:{} RGWs:{} MDSs:{} - {}".format(self.mons,
+                                                            self.osds,
+                                                            self.rgws,
+                                                            self.mdss,
+                                                            verdict)
 
     @property
     def mons(self):
-        return len(self.hosts_by_role.get('mon', list()))
+        return len(self.hosts_by_role.get('mon', set()))
 
     @property
     def mdss(self):
-        return len(self.hosts_by_role.get('mds', list()))
+        return len(self.hosts_by_role.get('mds', set()))
 
     def mgrs(self):
-        return len(self.hosts_by_role.get('mgr', list()))
+        return len(self.hosts_by_role.get('mgr', set()))
+
+    @property
+    def rgws(self):
+        return len(self.hosts_by_role.get('rgw', set()))
 
     @property
     def osds(self):
-        return len(self.hosts_by_role.get('osd', list()))
+        return len(self.hosts_by_role.get('osd', set()))
 
+    @rule(severity='error', cost=1)
     def _check_mons(self):
         mon_count = self.mons
         if self.mode == 'prod':
@@ -75,42 +176,32 @@ class ClusterState(BaseCheck):
                 self._add_problem('error',
                                   '#MONs must be odd ({})'.format(mon_count))
 
+    @rule(severity='warning', cost=1)
     def _check_mds(self):
         if self.mode == 'prod':
             pass
         else:
             pass
 
+    @rule(severity='error', modes=['prod'], cost=1)
     def _check_osds(self):
         osd_host_count = self.osds
-        if self.mode == 'prod':
-            if osd_host_count < 3:
-                self._add_problem('error', 'too few OSD hosts'
-                                           '({})'.format(osd_host_count))
+        if osd_host_count < 3:
+            self._add_problem('error', 'too few OSD hosts'
+                                       '({})'.format(osd_host_count))
 
+    @rule(severity='error', modes=['prod'], cost=2)
     def _check_collocation(self):
-        if self.mode == 'prod':
 
-            for hostname in self.hosts:
-                host = self.hosts[hostname]
-                if len(host.roles) > 1:
-                    if set(host.roles) == {'mon', 'mgr'}:
-                        continue
-                    else:
-                        if self.installation_source == 'RH CDN':
-                            self._add_problem('error',
-                                              'collocation unsupported')
-                            break
-        else:
-            pass
+        if self.collocated_hosts and self.installation_source == 'RH CDN':
+            self._add_problem('error',
+                              'collocation unsupported')
 
+    @rule(severity='error', cost=2)
     def _check_host_states(self):
 
-        for hostname in self.selected_hosts:
-            host = self.hosts[hostname]
-            if host.state_msg.lower().startswith('error'):
-                self._add_problem('error',
-                                  "Selected hosts have errors. Resolve, "
-                                  "then click 'Next'")
-                break
+        if self.error_hosts:
+            self._add_problem('error',
+                              "Selected hosts have errors. Resolve, "
+                              "then click 'Next'")
 
@@ -1,12 +1,13 @@
 #!/usr/bin/env python2
 
-import math
-from .base import BaseCheck
+from collections import OrderedDict
 
+from .base import BaseCheck, rule
+from .inventory import ClusterInventory
+from ceph_ansible_copilot.utils import osd_media_mbps, NIC_MBPS_PER_GB
 
-class HostState(BaseCheck):
 
-    disks_per_10g = 12
+class HostState(BaseCheck):
 
     reqs = {
         "os": {"cpu": 2,
@@ -15,6 +16,11 @@ class HostState(BaseCheck):
                 "ram": 2048}
     }
 
+    # check results shared across instances, indexed by host fingerprint -
+    # (problems, state, state_long), least recently used first
+    _results = OrderedDict()
+    results_cache_size = 4096
+
     def __init__(self, host_object, mode='dev'):
         self.host = host_object
         self.mode = mode
@@ -22,6 +28,126 @@ class HostState(BaseCheck):
 
         BaseCheck.__init__(self)
 
+    @classmethod
+    def bulk_check(cls, hosts, mode='dev', inventory=None):
+        """
+        Check a group of hosts in one pass. When numpy is available the
+        checks are evaluated against a columnar inventory, and each distinct
+        combination of problems is summarised once. Otherwise each host is
+        checked individually
+        :param hosts: (dict) Host objects, indexed by hostname
+        :param mode: (str) either dev or prod
+        :param inventory: (ClusterInventory) prebuilt inventory to reuse
+        :return: (ClusterInventory) the inventory used, or None
+        """
+
+        if inventory is None and ClusterInventory.available():
+            inventory = ClusterInventory(hosts)
+
+        if inventory is None:
+            for hostname in hosts:
+                hosts[hostname].check()
+            return None
+
+        codes = dict(zip(inventory.hostnames,
+                         inventory.host_problem_codes(cls.reqs).tolist()))
+        summaries = dict((code, cls.summarise(inventory.problems(code)))
+                         for code in set(codes.values()))
+        for hostname in hosts:
+            hosts[hostname].state, hosts[hostname].state_msg = \
+                summaries[codes[hostname]]
+
+        return inventory
+
+    @classmethod
+    def required_bandwidth(cls, host, osd_scenario='non-collocated'):
+        """
+        Network bandwidth needed to keep up with the host's OSD devices
+        (hdd ~100MB/s, ssd ~450MB/s, nvme ~2000MB/s)
+        :param host: (Host) host object
+        :param osd_scenario: (str) cluster wide osd scenario, once decided
+        :return: (float) bandwidth in Gb
+        """
+        return osd_media_mbps(host, osd_scenario) / float(NIC_MBPS_PER_GB)
+
+    @property
+    def roles(self):
+        return self.host.roles
+
+    @staticmethod
+    def host_fingerprint(host, mode='dev'):
+        """
+        Summary of the host attributes the rules depend on. Hosts with the
+        same fingerprint will always produce the same check result
+        :param host: (Host) host object
+        :param mode: (str) either dev or prod
+        :return: (tuple) fingerprint
+        """
+        bandwidth = sum(nic['nic_gb'] for nic in host.nics.values())
+        return (mode,
+                tuple(sorted(host.roles)),
+                host.core_count,
+                host.ram,
+                host.hdd_count,
+                host.ssd_count,
+                osd_media_mbps(host),
+                bandwidth)
+
+    @property
+    def fingerprint(self):
+        return HostState.host_fingerprint(self.host, self.mode)
+
+    @classmethod
+    def _cached(cls, key):
+        """ cached result for a fingerprint, or None """
+
+        result = cls._results.pop(key, None)
+        if result is not None:
+            # most recently used go last
+            cls._results[key] = result
+        return result
+
+    def _run(self, key):
+        """ run the rules, and cache the result against the fingerprint """
+
+        BaseCheck.check(self)
+        result = ({severity: list(msgs)
+                   for severity, msgs in self.problems.items()},) + \
+            self.summarise(self.problems)
+        if len(HostState._results) >= HostState.results_cache_size:
+            HostState._results.popitem(last=False)
+        HostState._results[key] = result
+        return result
+
+    @classmethod
+    def summary(cls, host, mode='dev', key=None):
+        """
+        State of a host, from the cache when a host with the same
+        fingerprint has been checked
+        :param host: (Host) host object
+        :param mode: (str) either dev or prod
+        :param key: (tuple) the host's fingerprint, when already known
+        :return: (tuple) state and state_long
+        """
+
+        if key is None:
+            key = cls.host_fingerprint(host, mode)
+        result = cls._cached(key)
+        if result is None:
+            result = cls(host, mode=mode)._run(key)
+        return result[1:]
+
+    def check(self):
+
+        key = self.fingerprint
+        cached = HostState._cached(key)
+        if cached is None:
+            self._run(key)
+        else:
+            self.problems = {severity: list(msgs) for severity, msgs
+                             in cached[0].items()}
+
+    @rule(severity='warning', cost=2)
     def _check_cpu_ram(self):
         available_cpu = self.host.core_count
         available_ram = self.host.ram
@@ -36,19 +162,16 @@ class HostState(BaseCheck):
         if available_ram < HostState.reqs['os']['ram']:
             self._add_problem('warning', 'RAM low')
 
+    @rule(severity='warning', roles=['osd'], cost=3)
     def _check_network(self):
-        if 'osd' in self.host.roles:
-            bandwidth = sum([self.host.nics[nic]['nic_gb']
-                             for nic in self.host.nics])
+        bandwidth = sum([self.host.nics[nic]['nic_gb']
+                         for nic in self.host.nics])
 
-            # 12 disks per 10g link - throughput optimised check
-            multiplier = int(math.ceil(self.disk_count / float(self.disks_per_10g)))
-            if bandwidth < (multiplier * 10):
-                self._add_problem('warning', 'Network bandwidth low')
+        if bandwidth < self.required_bandwidth(self.host):
+            self._add_problem('warning', 'Network bandwidth low')
 
+    @rule(severity='error', roles=['osd'], cost=1)
     def _check_role_prereq(self):
 
-        if 'osd' in self.host.roles:
-
-            if self.disk_count == 0:
-                self._add_problem('error', 'OSD without disks')
+        if self.disk_count == 0:
+            self._add_problem('error', 'OSD without disks')
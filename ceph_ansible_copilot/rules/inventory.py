@@ -0,0 +1,157 @@
+#!/usr/bin/env python2
+
+from ceph_ansible_copilot.utils import osd_media_mbps, NIC_MBPS_PER_GB
+
+# numpy is optional - without it the rules fall back to walking the Host
+# objects one at a time
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ClusterInventory(object):
+    """
+    Columnar view of the probed hosts. Each host attribute used by the rules
+    is held in a numpy array (one element per host, in hostname order), so
+    role membership and the host sanity checks are computed as vectorized
+    operations instead of python loops over Host objects. Subnet membership
+    is handled by utils.NetworkIndex
+    """
+
+    role_bits = {
+        "mon": 1,
+        "osd": 2,
+        "rgw": 4,
+        "mds": 8,
+        "mgr": 16
+    }
+
+    # problems reported by host_problem_codes, one bit each. Messages are in
+    # the order the HostState rules raise them
+    problem_bits = (
+        (1, "error", "OSD without disks"),
+        (2, "warning", "#CPU's low"),
+        (4, "warning", "RAM low"),
+        (8, "warning", "Network bandwidth low")
+    )
+
+    def __init__(self, hosts):
+        """
+        Build the columns from a dict of Host objects
+        :param hosts: (dict) Host objects, indexed by hostname
+        """
+
+        if np is None:
+            raise ImportError("ClusterInventory requires numpy")
+
+        self.hostnames = sorted(hosts.keys())
+
+        num_hosts = len(self.hostnames)
+
+        self.cores = np.zeros(num_hosts, dtype=np.float64)
+        self.ram = np.zeros(num_hosts, dtype=np.float64)
+        self.hdd = np.zeros(num_hosts, dtype=np.int32)
+        self.ssd = np.zeros(num_hosts, dtype=np.int32)
+        self.nic_gb = np.zeros(num_hosts, dtype=np.float64)
+        self.media_mbps = np.zeros(num_hosts, dtype=np.float64)
+        self.roles = np.zeros(num_hosts, dtype=np.uint8)
+        self.selected = np.zeros(num_hosts, dtype=bool)
+
+        for idx, hostname in enumerate(self.hostnames):
+            host = hosts[hostname]
+            self.cores[idx] = host.core_count
+            self.ram[idx] = host.ram
+            self.hdd[idx] = host.hdd_count
+            self.ssd[idx] = host.ssd_count
+            self.nic_gb[idx] = sum(host.nics[nic]['nic_gb']
+                                   for nic in host.nics)
+            self.media_mbps[idx] = osd_media_mbps(host)
+            self.roles[idx] = self._role_mask(host.roles)
+            self.selected[idx] = host.selected
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    @classmethod
+    def _role_mask(cls, roles):
+        mask = 0
+        for role in cls.role_bits:
+            if role in roles:
+                mask |= cls.role_bits[role]
+        return mask
+
+    def update_selection(self, hosts):
+        """
+        Refresh the selected column from the Host objects (the user may
+        toggle hosts after the inventory has been built)
+        :param hosts: (dict) Host objects, indexed by hostname
+        :return: None
+        """
+        self.selected = np.array([hosts[hostname].selected
+                                  for hostname in self.hostnames],
+                                 dtype=bool)
+
+    def selected_hostnames(self):
+        return [self.hostnames[idx] for idx in np.flatnonzero(self.selected)]
+
+    def has_role(self, role):
+        """ boolean column, True for hosts that have the given role """
+        return (self.roles & ClusterInventory.role_bits[role]) > 0
+
+    def hosts_with_role(self, role, selected_only=True):
+        mask = self.has_role(role)
+        if selected_only:
+            mask &= self.selected
+        return [self.hostnames[idx] for idx in np.flatnonzero(mask)]
+
+    def collocated_hostnames(self, allowed_roles):
+        """
+        Selected hosts with more than one role, unless the combination is
+        the allowed one (e.g. mon+mgr)
+        :param allowed_roles: (set) role combination that is permitted
+        :return: (list) hostnames
+        """
+        allowed = self._role_mask(allowed_roles)
+        role_count = sum(self.has_role(role).astype(np.int32)
+                         for role in ClusterInventory.role_bits)
+        mask = (role_count > 1) & (self.roles != allowed) & self.selected
+        return [self.hostnames[idx] for idx in np.flatnonzero(mask)]
+
+    def host_problem_codes(self, reqs):
+        """
+        Vectorized equivalent of the HostState checks
+        :param reqs: (dict) os and osd resource requirements (HostState.reqs)
+        :return: (ndarray) problem bits (see problem_bits) of each host, in
+                 hostname order
+        """
+
+        is_osd = self.has_role('osd')
+        disk_count = np.maximum(self.hdd, self.ssd)
+        osd_disks = np.where(is_osd, disk_count, 0)
+
+        available_cpu = self.cores - osd_disks * reqs['osd']['cpu']
+        available_ram = self.ram - osd_disks * reqs['osd']['ram']
+
+        codes = np.zeros(len(self.hostnames), dtype=np.uint8)
+        codes[is_osd & (disk_count == 0)] |= 1
+        codes[available_cpu < reqs['os']['cpu']] |= 2
+        codes[available_ram < reqs['os']['ram']] |= 4
+        codes[is_osd & (self.nic_gb * NIC_MBPS_PER_GB <
+                        self.media_mbps)] |= 8
+
+        return codes
+
+    @classmethod
+    def problems(cls, code):
+        """
+        :param code: (int) problem bits of a host
+        :return: (dict) problems dict (see BaseCheck)
+        """
+
+        problems = {"error": [], "warning": []}
+        for bit, severity, msg in cls.problem_bits:
+            if code & bit:
+                problems[severity].append(msg)
+        return problems
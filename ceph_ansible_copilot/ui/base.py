@@ -12,15 +12,18 @@ class TableRow(urwid.WidgetWrap):
 
     # inspired by https://repos.goffi.org/urwid-satext/file/tip/urwid_satext
 
-    def __init__(self, text, app, align='left'):
+    def __init__(self, text, app, align='left', on_toggle=None):
         """
         @param text: same as urwid.Text's text parameter
         @param align: same as urwid.Text's align parameter
+        @param on_toggle: function called with (hostname, selected) when the
+                          row changes the host's selected state
         """
 
         self._was_focused = False
         self.text = text
         self.app = app
+        self.on_toggle = on_toggle
         urwid.WidgetWrap.__init__(self, urwid.Text(text, align=align))
 
         if 'X' in self.text[:3]:
@@ -60,10 +63,13 @@ class TableRow(urwid.WidgetWrap):
 
         if self._selected:
             self.text = ' X ' + self.text[3:]
-            hosts[hostname].selected = True
         else:
             self.text = '   ' + self.text[3:]
-            hosts[hostname].selected = False
+
+        if hosts[hostname].selected != self._selected:
+            hosts[hostname].selected = self._selected
+            if self.on_toggle:
+                self.on_toggle(hostname, self._selected)
 
         self._w.base_widget.set_text(self.text)
 
@@ -127,11 +133,14 @@ class TableRow(urwid.WidgetWrap):
 
 
 class ProgressOverlay(urwid.WidgetWrap):
-    def __init__(self, bottom_w=None, complete=0):
+    def __init__(self, bottom_w=None, complete=0, title="Probing hosts"):
 
         self.bottom_w = bottom_w
         self.done = 0
-        self.complete = complete
+        # urwid's ProgressBar divides by the 'done' value
+        self.complete = max(complete, 1)
+        self.title = title
+        self.status = ''
 
         urwid.WidgetWrap.__init__(self,
                                   self.render_page)
@@ -142,17 +151,22 @@ class ProgressOverlay(urwid.WidgetWrap):
                urwid.AttrMap(
                  urwid.Filler(
                    urwid.LineBox(
-                     urwid.ProgressBar('pg_normal', 'pg_complete',
-                                       current=self.done, done=self.complete),
-                     title="Probing hosts")),
+                     urwid.Pile([
+                       urwid.ProgressBar('pg_normal', 'pg_complete',
+                                         current=min(self.done,
+                                                     self.complete),
+                                         done=self.complete),
+                       urwid.Text(self.status, align='center')]),
+                     title=self.title)),
                  'pg_normal')])
 
         w = urwid.Overlay(pb, self.bottom_w, align='center', valign='top',
-                          width=60, height=5, top=5)
+                          width=60, height=6, top=5)
         return w
 
-    def update(self, done):
+    def update(self, done, status=''):
         self.done = done
+        self.status = status
         return self.render_page
 
 
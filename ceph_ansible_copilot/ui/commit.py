@@ -2,13 +2,15 @@
 import urwid
 
 from .base import UIBaseClass, ui_button
+from ceph_ansible_copilot.utils import profiled
 
 
 class UI_Commit(UIBaseClass):
     title = "Commit Changes"
     hint = (
-        "Prior to updating files, the old version is saved with a "
-        "timestamp suffix"
+        "Files are only updated if every plugin succeeds. Prior to updating "
+        "files, the old version is saved to the backup store (copilot "
+        "--list-backups)"
     )
     seq_no = 7
 
@@ -29,6 +31,7 @@ class UI_Commit(UIBaseClass):
 
         UIBaseClass.__init__(self, parent)
 
+    @profiled()
     def validate(self, button):
         app = self.parent
 
@@ -38,9 +41,14 @@ class UI_Commit(UIBaseClass):
             # Attempt to run the plugins registered with the main App object
             status = app.execute_plugins()
 
-            if status['failed'] == 0:
+            if status['failed'] == 0 and status['committed']:
                 app.check_keys()
                 app.next_page()
+            elif status['failed'] == 0:
+                self.next_btn.base_widget[0].set_label("Quit")
+                app.show_message("Error: the configuration files could not "
+                                 "be updated, and have been left unchanged. "
+                                 "Please check the copilot log")
             else:
                 self.next_btn.base_widget[0].set_label("Quit")
                 app.show_message("Error: the commit process encountered "
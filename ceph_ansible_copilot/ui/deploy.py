@@ -1,8 +1,15 @@
 import urwid
 import os
+import time
+import string
 
-from .base import UIBaseClass, button_row, DataRow
-from ceph_ansible_copilot.ansible import ResultCallback, StaticPlaybook
+from .base import UIBaseClass, button_row, DataRow, FixedEdit
+from ceph_ansible_copilot.ansible import (ResultCallback, StaticPlaybook,
+                                          ReplayPlaybook, CoPilotInventory,
+                                          CoPilotPlaybookError, STRATEGIES,
+                                          write_run_report, strategy_summary,
+                                          prune_fact_cache)
+from ceph_ansible_copilot.utils import profiled, FACT_CACHE_DIR
 
 
 class UI_Deploy(UIBaseClass):
@@ -23,6 +30,8 @@ class UI_Deploy(UIBaseClass):
         self.failed = 0
         self.unreachable = 0
         self.task_info_w = urwid.Text("Waiting to start")
+        self.progress = None            # ProgressModel of the running deploy
+        self.progress_w = urwid.Text("")
         self.success_w = urwid.Text(str(self.success),
                                     align='center')
         self.skipped_w = urwid.Text(str(self.skipped),
@@ -34,12 +43,32 @@ class UI_Deploy(UIBaseClass):
 
         self.button_row = button_row([('Skip', self.skip_deploy),
                                       ('Deploy', self.deploy)])
+
+        # execution strategy and batch size for the rolling (osd) plays
+        defaults = parent.cfg.defaults
+        self.strategy_group = []
+        strategy_buttons = [urwid.RadioButton(self.strategy_group, txt,
+                                              state=False)
+                            for txt in STRATEGIES]
+        strategy_buttons[STRATEGIES.index(defaults.deploy_strategy)].state = \
+            True
+        self.strategy_options = urwid.GridFlow(strategy_buttons,
+                                               10, 4, 0, align='left')
+        self.serial_w = FixedEdit("Batch size : ", width=4,
+                                  valid_chars=string.digits + '%')
+        self.serial_w.edit_text = str(defaults.deploy_serial or '')
         self.failed_hosts = []
         self.failure_list_w = urwid.SimpleListWalker([])
         self.failure_walker_w = urwid.ListBox(self.failure_list_w)
 
         self.failure_title_w = urwid.Text("")
 
+        # rerun options, shown once a run has failed or unreachable hosts
+        self.problem_hosts = []
+        self.first_failed_task = ''
+        self.rerun_hosts_w = urwid.CheckBox("", state=True)
+        self.rerun_start_w = urwid.CheckBox("", state=False)
+
         UIBaseClass.__init__(self, parent)
 
     def skip_deploy(self, button):
@@ -89,6 +118,7 @@ class UI_Deploy(UIBaseClass):
                                                       len(self.failed_hosts))
             )
 
+    @profiled()
     def deploy(self, button):
 
         app = self.parent
@@ -101,32 +131,109 @@ class UI_Deploy(UIBaseClass):
             app.next_page()
             return
 
+        strategy = [btn.label for btn in self.strategy_group
+                    if btn.state][0]
+        serial = self.serial_w.get_edit_text().strip()
+        number = serial[:-1] if serial.endswith('%') else serial
+        if serial and (not number.isdigit() or int(number) < 1):
+            app.show_message("Error: batch size must be a host count or "
+                             "percentage")
+            return
+
+        limit = None
+        start_at_task = None
         if btn_text == 'Rerun':
+            if self.problem_hosts and self.rerun_hosts_w.get_state():
+                limit = ','.join(self.problem_hosts)
+            if self.first_failed_task and self.rerun_start_w.get_state():
+                start_at_task = self.first_failed_task
+            app.log.info("Rerun limited to {}, starting at task "
+                         "'{}'".format(limit if limit else 'all hosts',
+                                       start_at_task if start_at_task
+                                       else 'the first task'))
+
             # reset the failure table
             self.failure_title_w.set_text("")
             self.failure_list_w = urwid.SimpleListWalker([])
+            self.problem_hosts = []
 
             app.refresh_ui()
             app.loop.widget = app.top
 
         self.button_row.base_widget[1].set_label('Running')
 
-        host_list = '/etc/ansible/hosts'
+        # the inventory written to /etc/ansible/hosts by the commit
+        inventory = cfg.ansible_inventory or CoPilotInventory(app.hosts)
+        recorder = app.event_recorder('deploy')
         results = ResultCallback(pb_callout=self.page_update,
-                                 logger=app.log)
-
-        deploy_pb = StaticPlaybook(host_list=host_list, callback=results)
+                                 logger=app.log,
+                                 recorder=recorder)
+
+        deploy_pb = app.replay_playbook('deploy', limit, results)
+        if not deploy_pb:
+            # facts from a probe older than fact_cache_age are gathered again
+            fact_cache_age = cfg.defaults.fact_cache_age
+            expired = prune_fact_cache(fact_cache_age)
+            if expired:
+                app.log.info("Removed expired facts for {} host(s) from the "
+                             "fact cache".format(len(expired)))
+            deploy_pb = StaticPlaybook(host_list=inventory, callback=results,
+                                       limit=limit,
+                                       start_at_task=start_at_task,
+                                       forks=cfg.defaults.forks,
+                                       fact_cache_dir=FACT_CACHE_DIR,
+                                       fact_cache_age=fact_cache_age)
+
+        try:
+            deploy_pb.setup(pb_file=app.playbook,
+                            strategy=strategy,
+                            serial=serial,
+                            groups=cfg.defaults.rolling_groups)
+        except CoPilotPlaybookError as error:
+            app.log.error(error)
+            app.show_message("Error: {}".format(error))
+            if recorder:
+                recorder.close(1)
+            self.button_row.base_widget[1].set_label(btn_text)
+            return
 
-        deploy_pb.setup(pb_file=app.playbook)
-        app.log.info("Playbook starting, using {}".format(app.playbook))
+        self.progress = app.progress_model('deploy', deploy_pb)
+        app.log.info("Playbook starting, using {} ({} task results "
+                     "expected)".format(app.playbook,
+                                        self.progress.expected))
         app.show_message("Ceph deployment started "
                          "(using {})".format(os.path.basename(app.playbook)),
                          immediate=True)
 
+        start = time.time()
         deploy_pb.run()
+        elapsed = time.time() - start
+        self.progress.finish()
+        if recorder:
+            recorder.close(deploy_pb.rc)
+
+        self._report_run(deploy_pb, results.stats, elapsed,
+                         strategy=strategy,
+                         serial=serial,
+                         limit=limit,
+                         start_at_task=start_at_task)
 
         cfg.playbook_rc = deploy_pb.rc
         self.task_info_w.set_text('')           # remove task name from ui
+        self.progress_w.set_text(self.progress.status_text)
+
+        self.problem_hosts = sorted(set(results.stats['failures']) |
+                                    set(results.stats['unreachable']))
+        self.first_failed_task = results.stats['first_failed_task']
+        if self.problem_hosts:
+            self.rerun_hosts_w.set_label(
+                "Rerun the failed and unreachable hosts only "
+                "({})".format(len(self.problem_hosts)))
+            self.rerun_start_w.set_label(
+                "Start the rerun at the first failed task "
+                "({})".format(self.first_failed_task))
+            app.refresh_ui()
+            app.loop.widget = app.top
 
         if deploy_pb.rc == 0:
             self.button_row.base_widget[1].set_label('Next')
@@ -138,6 +245,45 @@ class UI_Deploy(UIBaseClass):
                              immediate=True)
             self.button_row.base_widget[1].set_label('Rerun')
 
+    def _report_run(self, deploy_pb, stats, elapsed, **settings):
+        """
+        Add the run to the deploy run reports, and log how each strategy has
+        performed so far
+        """
+
+        app = self.parent
+
+        hosts = (set(stats['successes']) | set(stats['failures']) |
+                 set(stats['unreachable']))
+        report = {
+            "timestamp": int(time.time()),
+            "playbook": app.playbook,
+            "replay": isinstance(deploy_pb, ReplayPlaybook),
+            "hosts": len(hosts),
+            "elapsed": round(elapsed, 2),
+            "rc": deploy_pb.rc,
+            "task_state": stats['task_state'],
+            "task_durations": self.progress.durations
+        }
+        report.update(settings)
+
+        try:
+            runs = write_run_report(report)
+        except (IOError, OSError) as error:
+            app.log.warning("Unable to save the run report : "
+                            "{}".format(error))
+            return
+
+        app.log.info("Deploy run took {:.0f}s over {} host(s) "
+                     "(strategy={}, serial={})".format(elapsed, len(hosts),
+                                                      settings['strategy'],
+                                                      settings['serial'] or
+                                                      'all'))
+        for key, entry in sorted(strategy_summary(runs).items()):
+            app.log.info("- {} : {:.1f}s per host over {} full "
+                         "run(s)".format(key, entry['seconds_per_host'],
+                                         entry['runs']))
+
     def page_update(self, stats):
         app = self.parent
 
@@ -151,6 +297,9 @@ class UI_Deploy(UIBaseClass):
         self.unreachable_w.set_text(str(self.unreachable))
         self.skipped_w.set_text(str(self.skipped))
         self.task_info_w.set_text(stats['task_name'])
+        if self.progress:
+            self.progress.update(stats)
+            self.progress_w.set_text(self.progress.status_text)
 
         self.failed_hosts = stats['failures'].keys()
         if self.failed_hosts:
@@ -205,12 +354,27 @@ class UI_Deploy(UIBaseClass):
 
         failure_lb = urwid.ListBox(self.failure_list_w)
 
+        rerun_options = []
+        if self.problem_hosts:
+            rerun_options.append(self.rerun_hosts_w)
+            if self.first_failed_task:
+                rerun_options.append(self.rerun_start_w)
+        rerun_w = [urwid.Padding(urwid.Pile(rerun_options),
+                                 left=2, right=2)] if rerun_options else []
+
         return urwid.AttrMap(
                  urwid.Filler(
                        urwid.Pile([
                          urwid.Padding(urwid.Text(self.text),
                                        left=2, right=2),
-                         self.button_row,
+                         urwid.Padding(
+                             urwid.Columns([
+                               (11, urwid.Text("Strategy :")),
+                               (24, self.strategy_options),
+                               self.serial_w]),
+                             left=2, right=2),
+                         self.button_row] +
+                         rerun_w + [
                          urwid.Divider(),
                          urwid.Padding(
                              urwid.Pile([
@@ -218,6 +382,10 @@ class UI_Deploy(UIBaseClass):
                                    (6, urwid.Text("Task:")),
                                    self.task_info_w
                                ]),
+                               urwid.Columns([
+                                   (6, urwid.Text("ETA:")),
+                                   self.progress_w
+                               ]),
                                urwid.Columns([
                                  urwid.Text("\nProgress", align='left'),
                                  urwid.Pile([
@@ -1,6 +1,7 @@
 import urwid
 from .base import UIBaseClass, FixedEdit, ui_button
-from ceph_ansible_copilot.utils import user_exists, get_selected_button
+from ceph_ansible_copilot.utils import (user_exists, get_selected_button,
+                                        profiled)
 
 
 class UI_Environment(UIBaseClass):
@@ -53,6 +54,7 @@ class UI_Environment(UIBaseClass):
 
         UIBaseClass.__init__(self, parent)
 
+    @profiled()
     def validate(self, button):
         app = self.parent
         cfg = app.cfg
@@ -75,10 +77,7 @@ class UI_Environment(UIBaseClass):
 
         cfg.sw_source = get_selected_button(self.sw_source_group)
 
-        if get_selected_button(self.dmcrypt_group) == 'encrypted':
-            cfg.dmcrypt = 'true'
-        else:
-            cfg.dmcrypt = 'false'
+        cfg.dmcrypt = get_selected_button(self.dmcrypt_group) == 'encrypted'
 
         app.next_page()
 
@@ -3,6 +3,8 @@ import urwid
 from .base import UIBaseClass, ui_button, FixedEdit, SelectableText
 import threading
 
+from ceph_ansible_copilot.utils import profiled
+
 
 class UI_Credentials(UIBaseClass):
     title = "Host Access"
@@ -82,6 +84,7 @@ class UI_Credentials(UIBaseClass):
 
             hosts[hostname].ssh.password = password
 
+    @profiled()
     def check_access(self, button):
         """
         User clicked 'check' or 'Next' so we update the hosts dict with the
@@ -113,6 +116,8 @@ class UI_Credentials(UIBaseClass):
         for _t in threads:
             _t.join()
 
+        app.report_requiretty()
+
         if len(self.pending_table_body) == 0:
             button.set_label('Next')
 
@@ -9,7 +9,8 @@ from .base import (UIBaseClass,
 from ceph_ansible_copilot.rules import ClusterState
 
 from ceph_ansible_copilot.utils import (expand_hosts,
-                                        check_dns)
+                                        check_dns,
+                                        profiled)
 
 from ceph_ansible_copilot import Host
 
@@ -154,6 +155,7 @@ class UI_Host_Definition(UIBaseClass):
         self.host_panels.focus_position = 3
         self._check_input(newtext, "mdss")
 
+    @profiled()
     def validate(self, button):
         app = self.parent
         cfg = app.cfg
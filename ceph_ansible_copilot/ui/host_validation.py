@@ -1,8 +1,12 @@
 import urwid
 
 from .base import UIBaseClass, ui_button, TableRow
-from ceph_ansible_copilot.ansible import ResultCallback, DynamicPlaybook
-from ceph_ansible_copilot.rules import ClusterState
+from ceph_ansible_copilot.ansible import (ResultCallback, DynamicPlaybook,
+                                          ReplayPlaybook, CoPilotInventory,
+                                          write_fact_cache)
+from ceph_ansible_copilot.rules import (ClusterState, HostState,
+                                        ClusterInventory)
+from ceph_ansible_copilot.utils import NetworkIndex, profiled
 
 
 class UI_Host_Validation(UIBaseClass):
@@ -30,36 +34,51 @@ class UI_Host_Validation(UIBaseClass):
 
         self.table_body = urwid.SimpleListWalker([])
         self.table = urwid.ListBox(self.table_body)
-        self.table_footer = urwid.Text(
-            "Use arrow keys to move, 'space' to toggle the use of a host")
+        self.footer_hint = ("Use arrow keys to move, 'space' to toggle the "
+                            "use of a host")
+        self.table_footer = urwid.Text(self.footer_hint)
         self.probed = False
+        self.inventory = None
+        self.cluster_state = None
+        self.probed_hosts = set()
 
         UIBaseClass.__init__(self, parent)
 
+    @profiled()
     def probe(self, button):
 
         app = self.parent
         cfg = app.cfg
         hosts = app.hosts
 
-        host_list = ','.join(sorted(hosts.keys()))
+        inventory = CoPilotInventory(hosts, selected_only=False)
         app.show_message("Probing hosts...")
 
         self.clear_table()
 
+        recorder = app.event_recorder('probe')
         probe_callback = ResultCallback(self.parent.progress_bar_update,
-                                        logger=self.parent.log)
-
-        probe_playbook = DynamicPlaybook(host_list=host_list,
-                                         callback=probe_callback)
+                                        logger=self.parent.log,
+                                        recorder=recorder)
+
+        probe_playbook = app.replay_playbook('probe', inventory.host_names,
+                                             probe_callback)
+        if not probe_playbook:
+            probe_playbook = DynamicPlaybook(host_list=inventory,
+                                             callback=probe_callback,
+                                             forks=cfg.defaults.forks)
         probe_playbook.setup(pb_name='Probe Hosts',
                              pb_tasks=self.pb_tasks
                              )
 
-        # turn the progress bar on
-        app.progress_bar(complete=len(host_list))
+        # turn the progress bar on - one setup result is expected per host
+        progress = app.progress_model('probe', probe_playbook)
+        app.progress_bar(progress=progress)
 
         rc = probe_playbook.run()
+        progress.finish()
+        if recorder:
+            recorder.close(probe_playbook.rc)
 
         # turn the progress bar off
         app.progress_bar()
@@ -72,11 +91,49 @@ class UI_Host_Validation(UIBaseClass):
                                        probe_callback.stats['task_state']
                                                            ['unreachable']))
 
+        probed_hosts = dict()
         for host in probe_callback.stats['successes']:
             # populate with ansible facts
             hosts[host].seed(probe_callback.stats['successes'][host])
-            # validate the hosts config against the required roles
-            hosts[host].check()
+            probed_hosts[host] = hosts[host]
+
+        # keep the facts for the deploy, unless they're from a recording
+        if cfg.defaults.fact_cache_age and \
+                not isinstance(probe_playbook, ReplayPlaybook):
+            try:
+                cached = write_fact_cache(probe_callback.stats['successes'])
+            except (IOError, OSError) as error:
+                app.log.warning("Unable to cache the probe facts : "
+                                "{}".format(error))
+            else:
+                app.log.info("Facts for {} host(s) added to the fact "
+                             "cache".format(cached))
+
+        # validate the hosts config against the required roles, using a
+        # columnar inventory of the hosts when numpy is available
+        if ClusterInventory.available():
+            self.inventory = ClusterInventory(hosts)
+        HostState.bulk_check(probed_hosts, inventory=self.inventory)
+
+        # index the subnets/NICs once, for the network page and plugins
+        app.network_index = NetworkIndex(hosts)
+
+        # maintain the cluster state incrementally from here on, so the
+        # verdict can be shown as the user toggles hosts. A re-probe that
+        # reaches a different set of hosts, or that built a new inventory,
+        # starts the cluster state afresh
+        if self.cluster_state is None or \
+                self.cluster_state.inventory is not self.inventory or \
+                set(probed_hosts) != self.probed_hosts:
+            self.cluster_state = ClusterState(hosts,
+                                              mode=app.opts.mode,
+                                              install_source=cfg.sw_source,
+                                              inventory=self.inventory)
+        else:
+            for host in probed_hosts:
+                self.cluster_state.update_host(hosts[host])
+        self.probed_hosts = set(probed_hosts)
+        self._update_verdict()
 
         # self.validate()
         self.probed = True
@@ -106,7 +163,8 @@ class UI_Host_Validation(UIBaseClass):
             # establish column field defaults
             if app.hosts[hostname]._facts:
                 this_host = app.hosts[hostname]
-                w = urwid.AttrMap(TableRow(this_host.info(), app),
+                w = urwid.AttrMap(TableRow(this_host.info(), app,
+                                           on_toggle=self.host_toggled),
                                   'body',
                                   'reverse')
                 table_rows.append(w)
@@ -115,6 +173,25 @@ class UI_Host_Validation(UIBaseClass):
 
         return
 
+    def host_toggled(self, hostname, selected):
+        """
+        Callback from a TableRow when the user changes a host's selection
+        :param hostname: (str) host toggled
+        :param selected: (bool) new selection state
+        :return: None
+        """
+
+        if self.cluster_state is None:
+            return
+
+        self.cluster_state.update_host(self.parent.hosts[hostname])
+        self._update_verdict()
+
+    def _update_verdict(self):
+        self.cluster_state.check()
+        self.table_footer.set_text("{}\n{}".format(self.footer_hint,
+                                                   self.cluster_state.summary))
+
     def next_page(self, button):
 
         app = self.parent
@@ -123,11 +200,9 @@ class UI_Host_Validation(UIBaseClass):
 
         if self.probed:
 
-            # The results of the probe must leace us with a valid cluster,
-            # so check the hosts again
-            c_state = ClusterState(hosts,
-                                   mode=app.opts.mode,
-                                   install_source=cfg.sw_source)
+            # The results of the probe must leave us with a valid cluster -
+            # the cluster state has been kept current as hosts were toggled
+            c_state = self.cluster_state
             c_state.check()
             if c_state.state != 'OK':
                 app.show_message(c_state.state_long)
@@ -137,8 +212,11 @@ class UI_Host_Validation(UIBaseClass):
                          if hosts[h].selected and 'osd' in hosts[h].roles
                          and hosts[h].state.lower().startswith('ok')]
 
-            journals_available = all(hosts[h].ssd_count > 0
-                                     for h in osd_hosts)
+            # all-flash hosts don't use journals, so they don't decide the
+            # scenario (see utils.host_scenario)
+            hdd_hosts = [h for h in osd_hosts if hosts[h].hdd_count > 0]
+            journals_available = hdd_hosts and all(hosts[h].ssd_count > 0
+                                                   for h in hdd_hosts)
             if not journals_available:
                 cfg.osd_scenario = 'collocated'
             else:
@@ -1,5 +1,7 @@
 import urwid
 from .base import UIBaseClass, ui_button
+from ceph_ansible_copilot.utils import NetworkIndex, profiled
+from ceph_ansible_copilot.rules import HostState
 
 class UI_Network(UIBaseClass):
     title = "Network"
@@ -15,7 +17,10 @@ class UI_Network(UIBaseClass):
             "{}\n\nDuring the host probes, the available "
             "networks have been autodetected. Networks that are common to all "
             "hosts appear on the left, and networks common to all OSD hosts "
-            "are shown on the right.".format(self.title)
+            "are shown on the right. Networks are listed fastest first "
+            "(slowest host link/total bandwidth), and a '!' marks a network "
+            "where an OSD host's link is too slow for its disks.".format(
+                self.title)
         )
 
         self.public_grp = []
@@ -32,48 +37,44 @@ class UI_Network(UIBaseClass):
 
         self.next_btn = ui_button(callback=self.validate)
 
+        self.network_labels = dict()        # radio button label -> subnet
+
         UIBaseClass.__init__(self, parent)
 
     def _get_public_networks(self):
-        """ subnets shared by ALL hosts """
-        app = self.parent
-        cfg = app.cfg
-        hosts = app.hosts
+        """ subnets shared by ALL hosts, fastest first """
+        index = self.parent.network_index
+        mask = index.host_mask()
 
-        # get a list of all networks
-        all_subnets = set()
-        candidate_subnets = []
-        for host_name in hosts:
-            all_subnets.update(hosts[host_name].subnets)
+        return index.rank_subnets(index.common_subnets(mask), mask)
 
-        # process each one
-        for net in all_subnets:
-            if all(net in hosts[host_name].subnets for host_name in hosts):
-                candidate_subnets.append(net)
+    def _get_cluster_networks(self, osd_mask):
+        """ subnets shared by OSD hosts, fastest first """
+        index = self.parent.network_index
 
-        return candidate_subnets
+        return index.rank_subnets(index.common_subnets(osd_mask), osd_mask)
 
-    def _get_cluster_networks(self):
-        """ subnets shared by OSD hosts """
+    def _bottlenecked(self, subnet, osd_hosts):
+        """ True if any OSD host's link into the subnet is slower than its
+        disks need """
         app = self.parent
-        cfg = app.cfg
-        hosts = app.hosts
-
-        # get a list of all networks
-        osd_subnets = set()
-        candidate_subnets = []
-        osd_hosts = [host_name for host_name in hosts
-                     if 'osd' in hosts[host_name].roles]
-        for host_name in osd_hosts:
-            osd_subnets.update(hosts[host_name].subnets)
-
-        # process each one
-        for net in osd_subnets:
-            if all(net in hosts[host_name].subnets for host_name in osd_hosts):
-                candidate_subnets.append(net)
-
-        return candidate_subnets
-
+        index = app.network_index
+
+        for hostname in osd_hosts:
+            if (index.link_speed(subnet, hostname) <
+                    HostState.required_bandwidth(app.hosts[hostname],
+                                                 app.cfg.osd_scenario)):
+                return True
+        return False
+
+    def _label(self, ranked_subnet, osd_hosts):
+        subnet, min_gb, total_gb = ranked_subnet
+        flag = '!' if self._bottlenecked(subnet, osd_hosts) else ' '
+        label = "{}{:<18s} {:>3}/{}Gb".format(flag, subnet, min_gb, total_gb)
+        self.network_labels[label] = subnet
+        return label
+
+    @profiled()
     def validate(self, button):
         # get and set the selected networks based on the radio button settings
         app = self.parent
@@ -86,8 +87,8 @@ class UI_Network(UIBaseClass):
                    if btn.state is True]
 
         if public:
-            cfg.public_network = public[0]
-            cfg.cluster_network = cluster[0]
+            cfg.public_network = self.network_labels[public[0]]
+            cfg.cluster_network = self.network_labels[cluster[0]]
             app.next_page()
         else:
             app.show_message("Error: public network selection unavailable")
@@ -97,8 +98,17 @@ class UI_Network(UIBaseClass):
         """ populate the UI elements from the gathered host data """
         app = self.parent
 
+        if app.network_index is None:
+            app.network_index = NetworkIndex(app.hosts)
+
+        # the OSD hosts are looked up once, for the ranking and the
+        # bottleneck flag of every subnet
+        index = app.network_index
+        osd_mask = index.host_mask(role='osd')
+        osd_hosts = index.hostnames_in(osd_mask)
+
         public_networks = self._get_public_networks()
-        cluster_networks = self._get_cluster_networks()
+        cluster_networks = self._get_cluster_networks(osd_mask)
         if not public_networks:
             app.show_message("Error: Hosts do not share a common subnet "
                              "for the public network")
@@ -107,13 +117,23 @@ class UI_Network(UIBaseClass):
         if not cluster_networks:
             cluster_networks = public_networks
 
+        # networks are ranked fastest first, so the first button in each
+        # group (selected by default) is the recommendation
+        self.public_grp = []
+        self.cluster_grp = []
+        self.network_labels = dict()
+
         self.public_buttons = urwid.Pile([
-                                  urwid.RadioButton(self.public_grp, txt)
-                                  for txt in public_networks])
+                                  urwid.RadioButton(self.public_grp,
+                                                    self._label(net,
+                                                                osd_hosts))
+                                  for net in public_networks])
 
         self.cluster_buttons = urwid.Pile([
-                                 urwid.RadioButton(self.cluster_grp, txt)
-                                 for txt in cluster_networks])
+                                 urwid.RadioButton(self.cluster_grp,
+                                                   self._label(net,
+                                                               osd_hosts))
+                                 for net in cluster_networks])
 
     @property
     def render_page(self):
@@ -1,5 +1,6 @@
 import urwid
 from .base import UIBaseClass, ui_button
+from ceph_ansible_copilot.utils import profiled
 
 class UI_Welcome(UIBaseClass):
     title = "Welcome"
@@ -23,6 +24,7 @@ class UI_Welcome(UIBaseClass):
 
         UIBaseClass.__init__(self, parent)
 
+    @profiled()
     def validate(self, button):
         app = self.parent
         # nothing to validate in the welcome screen!
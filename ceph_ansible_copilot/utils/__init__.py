@@ -8,13 +8,35 @@ from .utils import (bytes2human,
                     netmask_to_cidr,
                     dns_ok,
                     expand_hosts,
+                    compress_hosts,
                     check_dns,
                     get_selected_button,
                     valid_yaml,
+                    ordered_load,
+                    ordered_dump,
                     setup_ansible_cfg,
                     restore_ansible_cfg,
-                    get_used_roles,
-                    get_pgnum
+                    ANSIBLE_CFG_SETTINGS,
+                    FACT_CACHE_DIR,
+                    get_used_roles
                     )
 
 from .ssh import SSHsession, SSHConfig
+
+from .network import NetworkIndex
+
+from .yml import YmlDocument
+
+from .devices import (DEVICE_MBPS, JOURNAL_RATIO, NIC_MBPS_PER_GB,
+                      device_class, disk_class, host_scenario, osd_devices,
+                      osd_tiers, bulk_tier, fast_tier, crush_rule_name,
+                      osd_media_mbps, allocate_journals, journal_report)
+
+from .pgcalc import (plan_pgs, plan_cluster_pgs, pgs_per_osd, osd_count,
+                     nearest_power_of_two, pool_tiers, METADATA_POOLS)
+
+from .commit import CommitTransaction, CommitError
+
+from .backup import BackupStore, BackupError, STATE_DIR
+
+from .profiler import Profiler, enable_profiling, get_profiler, profiled
@@ -0,0 +1,175 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+STATE_DIR = '/var/lib/ceph-ansible-copilot'
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupStore(object):
+    """
+    Content addressed store for copies of the files copilot replaces. Each
+    unique version of a file is held once, gzip compressed, under its sha1
+    digest. A small json index maps (file, timestamp) to the digest, so
+    repeated commits of near-identical configuration don't fill up the
+    ceph-ansible directories with full copies
+    """
+
+    def __init__(self, store_dir=os.path.join(STATE_DIR, 'backups'),
+                 keep=10, max_age_days=None):
+        """
+        :param store_dir: (str) directory holding the index and blobs
+        :param keep: (int) versions to retain for each file
+        :param max_age_days: (int) discard versions older than this
+        """
+
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, 'objects')
+        self.index_file = os.path.join(store_dir, 'index.json')
+        self.keep = keep
+        self.max_age_days = max_age_days
+
+        if not os.path.exists(self.objects_dir):
+            os.makedirs(self.objects_dir, 0o700)
+
+        self.versions = self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_file):
+            return []
+
+        with open(self.index_file, 'r') as f:
+            return json.load(f).get('versions', [])
+
+    def _save_index(self):
+        fd, tmp_file = tempfile.mkstemp(dir=self.store_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"versions": self.versions}, f, indent=2)
+        os.rename(tmp_file, self.index_file)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2],
+                            '{}.gz'.format(digest[2:]))
+
+    def history(self, filename=None):
+        """
+        :param filename: (str) only return versions of this file
+        :return: (list) version dicts (file, timestamp, digest), oldest first
+        """
+        return [v for v in self.versions
+                if filename is None or v['file'] == filename]
+
+    def save(self, filename, timestamp=None):
+        """
+        Add the current content of a file to the store
+        :param filename: (str) file to back up
+        :param timestamp: (int) time to record the version against
+        :return: (str) digest of the stored content
+        """
+
+        filename = os.path.abspath(filename)
+        timestamp = int(timestamp if timestamp else time.time())
+
+        with open(filename, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+
+        blob = self._blob_path(digest)
+        if not os.path.exists(blob):
+            blob_dir = os.path.dirname(blob)
+            if not os.path.exists(blob_dir):
+                os.mkdir(blob_dir, 0o700)
+            fd, tmp_file = tempfile.mkstemp(dir=blob_dir)
+            os.close(fd)
+            gz = gzip.open(tmp_file, 'wb')
+            try:
+                gz.write(content)
+            finally:
+                gz.close()
+            os.rename(tmp_file, blob)
+
+        previous = self.history(filename)
+        if not previous or previous[-1]['digest'] != digest:
+            self.versions.append({"file": filename,
+                                  "timestamp": timestamp,
+                                  "digest": digest})
+            self._save_index()
+
+        return digest
+
+    def restore(self, filename, timestamp=None):
+        """
+        Put back a stored version of a file
+        :param filename: (str) file to restore
+        :param timestamp: (int) version to restore (default is the latest)
+        :return: (dict) the version restored
+        """
+
+        filename = os.path.abspath(filename)
+        candidates = self.history(filename)
+        if timestamp is not None:
+            candidates = [v for v in candidates
+                          if v['timestamp'] == int(timestamp)]
+        if not candidates:
+            raise BackupError("No backup of {} found".format(filename))
+
+        version = candidates[-1]
+
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(filename))
+        gz = gzip.open(self._blob_path(version['digest']), 'rb')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(gz, f)
+        finally:
+            gz.close()
+
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmp_file)
+        os.rename(tmp_file, filename)
+
+        return version
+
+    def prune(self):
+        """
+        Apply the retention policy, and remove blobs that are no longer
+        referenced by any version
+        :return: (int) number of versions removed
+        """
+
+        cutoff = None
+        if self.max_age_days:
+            cutoff = time.time() - (self.max_age_days * 86400)
+
+        retained = []
+        for filename in set(v['file'] for v in self.versions):
+            file_versions = self.history(filename)[-self.keep:]
+            if cutoff:
+                # always keep the latest version of a file
+                file_versions = ([v for v in file_versions[:-1]
+                                  if v['timestamp'] >= cutoff] +
+                                 file_versions[-1:])
+            retained.extend(file_versions)
+
+        retained.sort(key=lambda v: v['timestamp'])
+        removed = len(self.versions) - len(retained)
+        if removed:
+            self.versions = retained
+            self._save_index()
+
+        in_use = set(v['digest'] for v in self.versions)
+        for blob_dir, _dirs, blobs in os.walk(self.objects_dir):
+            for blob in blobs:
+                digest = os.path.basename(blob_dir) + blob[:-3]
+                if blob.endswith('.gz') and digest not in in_use:
+                    os.remove(os.path.join(blob_dir, blob))
+            if blob_dir != self.objects_dir and not os.listdir(blob_dir):
+                os.rmdir(blob_dir)
+
+        return removed
@@ -0,0 +1,169 @@
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+
+class CommitError(Exception):
+    pass
+
+
+class CommitTransaction(object):
+    """
+    Stage the files generated by the plugins, and install them together.
+    Each file is written to a staging directory on the same filesystem as its
+    target, then all files are moved into place with atomic renames and the
+    target directories are fsync'd. If any rename fails, the files already
+    installed are put back, so the installer never sees a mix of old and new
+    configuration files. Files whose content is unchanged are left alone
+    """
+
+    # copilot's header line includes a timestamp, so it's ignored when
+    # deciding whether a file has changed
+    header_marker = '# created by copilot'
+
+    def __init__(self, backup=None, logger=None):
+        """
+        :param backup: (function) called with the target filename before an
+                       existing file is replaced
+        :param logger: (logger) logger to use
+        """
+
+        self.backup = backup
+        self.logger = logger if logger else logging.getLogger('copilot')
+
+        self.staged = dict()            # target file -> staged file
+        self.unchanged = list()
+        self._stage_dirs = dict()       # target dir -> staging dir
+        self._lock = threading.Lock()
+
+    @classmethod
+    def content_hash(cls, content):
+        """
+        :param content: (str) file content
+        :return: (str) hash of the content, excluding copilot's header line
+        """
+
+        body = '\n'.join([line for line in content.split('\n')
+                          if not line.startswith(cls.header_marker)])
+        return hashlib.sha1(body).hexdigest()
+
+    def _unchanged(self, target, content):
+
+        if not os.path.exists(target):
+            return False
+
+        with open(target, 'r') as f:
+            current = f.read()
+
+        return self.content_hash(current) == self.content_hash(content)
+
+    def _stage_dir(self, target_dir):
+
+        with self._lock:
+            if target_dir not in self._stage_dirs:
+                self._stage_dirs[target_dir] = tempfile.mkdtemp(
+                    prefix='.copilot-', dir=target_dir)
+            return self._stage_dirs[target_dir]
+
+    def stage(self, target, content):
+        """
+        Write the content to the staging area for the target file
+        :param target: (str) filename to be updated on commit
+        :param content: (str) file content
+        :return: (bool) True if the file was staged, False if unchanged
+        """
+
+        if self._unchanged(target, content):
+            self.logger.info("{} unchanged, skipped".format(target))
+            with self._lock:
+                self.unchanged.append(target)
+            return False
+
+        target_dir = os.path.dirname(os.path.abspath(target))
+        with self._lock:
+            if not os.path.isdir(target_dir):
+                # e.g. the first host_vars file
+                os.makedirs(target_dir)
+
+        staged_file = os.path.join(self._stage_dir(target_dir),
+                                   os.path.basename(target))
+
+        with open(staged_file, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if os.path.exists(target):
+            shutil.copymode(target, staged_file)
+
+        with self._lock:
+            self.staged[target] = staged_file
+
+        return True
+
+    def commit(self):
+        """
+        Install all staged files
+        :return: (list) target files updated
+        """
+
+        if self.backup:
+            for target in sorted(self.staged):
+                if os.path.exists(target):
+                    self.backup(target)
+
+        installed = list()
+        try:
+            for target in sorted(self.staged):
+                staged_file = self.staged[target]
+                if os.path.exists(target):
+                    # keep the current version within the staging dir, so it
+                    # can be put back if a later rename fails
+                    os.link(target, '{}.orig'.format(staged_file))
+                os.rename(staged_file, target)
+                installed.append(target)
+
+        except OSError as error:
+            self.logger.error("Commit failed ({}), restoring "
+                              "{} file(s)".format(error, len(installed)))
+            self._rollback(installed)
+            self._sync_dirs()
+            self._cleanup()
+            raise CommitError("Unable to install {}".format(target))
+
+        self._sync_dirs()
+        self._cleanup()
+
+        return installed
+
+    def abort(self):
+        """ discard the staged files """
+        self._cleanup()
+
+    def _rollback(self, installed):
+
+        for target in installed:
+            orig = '{}.orig'.format(self.staged[target])
+            if os.path.exists(orig):
+                os.rename(orig, target)
+            else:
+                # the file didn't exist before the commit
+                os.remove(target)
+
+    def _sync_dirs(self):
+
+        for target_dir in self._stage_dirs:
+            fd = os.open(target_dir, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _cleanup(self):
+
+        for stage_dir in self._stage_dirs.values():
+            shutil.rmtree(stage_dir, ignore_errors=True)
+        self._stage_dirs = dict()
@@ -0,0 +1,213 @@
+import heapq
+
+from .utils import bytes2human
+
+# sustained write throughput (MB/s) assumed for each class of device
+DEVICE_MBPS = {
+    "hdd": 100,
+    "ssd": 450,
+    "nvme": 2000
+}
+
+# flash device classes, fastest first
+FLASH_CLASSES = ['nvme', 'ssd']
+
+# throughput (MB/s) of 1Gb of network bandwidth
+NIC_MBPS_PER_GB = 125
+
+# data devices a journal/db device should serve, before it's likely to
+# become the write bottleneck for the hdds behind it
+JOURNAL_RATIO = {
+    "ssd": 5,
+    "nvme": 10
+}
+
+
+def device_class(dev_name, rotational):
+    """
+    :param dev_name: (str) kernel device name e.g. sdb, nvme0n1
+    :param rotational: (int|bool) rotational flag from the device facts
+    :return: (str) hdd, ssd or nvme
+    """
+
+    if int(rotational):
+        return 'hdd'
+    elif dev_name.startswith('nvme'):
+        return 'nvme'
+    else:
+        return 'ssd'
+
+
+def disk_class(host, dev_name):
+    """ device class of one of a host's free disks """
+    if dev_name in host.disks:
+        return host.disks[dev_name]['class']
+    return device_class(dev_name, dev_name in host.hdd_list)
+
+
+def host_scenario(host, osd_scenario):
+    """
+    osd scenario a host can use - a host without hdds has nothing to put
+    journals in front of, so its flash devices are collocated OSDs
+    :param host: (Host) host object
+    :param osd_scenario: (str) cluster wide osd scenario
+    :return: (str) collocated or non-collocated
+    """
+    return osd_scenario if host.hdd_list else 'collocated'
+
+
+def osd_devices(host, osd_scenario):
+    """
+    Split a host's free disks into OSD data devices and journal devices
+    :param host: (Host) host object
+    :param osd_scenario: (str) cluster wide osd scenario
+    :return: (tuple) sorted data device list, sorted journal device list
+    """
+
+    hdds = sorted(host.hdd_list)
+    flash = sorted(host.ssd_list)
+
+    if host_scenario(host, osd_scenario) == 'non-collocated':
+        return hdds, flash
+
+    return sorted(hdds + flash), []
+
+
+def osd_tiers(config):
+    """
+    Summarise the OSDs of the selected hosts by device class
+    :param config: (object) config object with hosts and osd_scenario
+    :return: (dict) device class -> {"osds": int, "capacity": int bytes}
+    """
+
+    tiers = dict()
+    for hostname in config.hosts:
+        host = config.hosts[hostname]
+        if not host.selected or 'osd' not in host.roles:
+            continue
+        data_devices, _journals = osd_devices(host, config.osd_scenario)
+        for dev in data_devices:
+            tier = tiers.setdefault(disk_class(host, dev),
+                                    {"osds": 0, "capacity": 0})
+            tier['osds'] += 1
+            tier['capacity'] += host.disks.get(dev, {}).get('size', 0)
+    return tiers
+
+
+def bulk_tier(tiers):
+    """ device class holding the most capacity (then the most OSDs) """
+    if not tiers:
+        return None
+    return max(sorted(tiers),
+               key=lambda cls: (tiers[cls]['capacity'], tiers[cls]['osds']))
+
+
+def fast_tier(tiers):
+    """
+    flash device class to place metadata pools on, when the cluster has
+    a flash tier separate from its bulk tier
+    """
+    bulk = bulk_tier(tiers)
+    for cls in FLASH_CLASSES:
+        if cls in tiers and cls != bulk:
+            return cls
+    return None
+
+
+def crush_rule_name(dev_class):
+    return 'replicated_{}'.format(dev_class)
+
+
+def osd_media_mbps(host, osd_scenario='non-collocated'):
+    """
+    Aggregate throughput of the devices a host will run OSDs on - every
+    data device of the host's layout, the journal devices are not counted
+    :param host: (Host) host object
+    :param osd_scenario: (str) cluster wide osd scenario. Until it is
+                         decided, a host with hdds and flash devices is
+                         assumed to use the flash devices as journals
+    :return: (int) throughput in MB/s
+    """
+
+    if not host.hdd_list and not host.ssd_list:
+        # only the device counts are known
+        mbps = host.hdd_count * DEVICE_MBPS['hdd']
+        if not host.hdd_count or osd_scenario != 'non-collocated':
+            mbps += host.ssd_count * DEVICE_MBPS['ssd']
+        return mbps
+
+    data_devices, _journals = osd_devices(host, osd_scenario)
+    return sum(DEVICE_MBPS[disk_class(host, dev)] for dev in data_devices)
+
+
+def allocate_journals(devices, journals):
+    """
+    Assign each data device to a journal/db device. Journal devices take a
+    share of the data devices in proportion to their write throughput
+    (device class). Within a class, smaller devices have their share reduced
+    by up to half, relative to the largest device of that class, so db space
+    is not exhausted on the small devices first
+    :param devices: (list) data device names, in osd order
+    :param journals: (dict) journal device name -> {"class": str,
+                     "size": int bytes}
+    :return: (list) journal device for each data device, in the same order
+             as devices (the dedicated_devices list for ceph-ansible)
+    """
+
+    if not journals:
+        return []
+
+    largest = dict()
+    for jrnl in journals.values():
+        largest[jrnl['class']] = max(largest.get(jrnl['class'], 0),
+                                     jrnl['size'])
+
+    weights = dict()
+    for name, jrnl in journals.items():
+        mbps = DEVICE_MBPS.get(jrnl['class'], DEVICE_MBPS['ssd'])
+        if largest[jrnl['class']]:
+            capacity = float(jrnl['size']) / largest[jrnl['class']]
+        else:
+            capacity = 1.0
+        weights[name] = mbps * (0.5 + 0.5 * capacity)
+
+    # min-heap of (load after one more device, name, devices assigned)
+    heap = [(1.0 / weights[name], name, 0) for name in sorted(journals)]
+    heapq.heapify(heap)
+
+    allocation = list()
+    for _dev in devices:
+        _load, name, assigned = heapq.heappop(heap)
+        allocation.append(name)
+        assigned += 1
+        heapq.heappush(heap, ((assigned + 1) / weights[name], name, assigned))
+
+    return allocation
+
+
+def journal_report(allocation, journals):
+    """
+    Summarise an allocation as the hdd:flash ratio of each journal device
+    :param allocation: (list) journal device for each data device
+    :param journals: (dict) journal device name -> {"class": str,
+                     "size": int bytes}
+    :return: (list) of report lines, one per journal device
+    """
+
+    report = list()
+    for name in sorted(journals):
+        jrnl = journals[name]
+        count = allocation.count(name)
+        line = "{} ({} {}) {}:1, ~{}MB/s from hdds".format(
+            name,
+            jrnl['class'],
+            bytes2human(jrnl['size']) if jrnl['size'] else '?',
+            count,
+            count * DEVICE_MBPS['hdd'])
+
+        limit = JOURNAL_RATIO.get(jrnl['class'])
+        if limit and count > limit:
+            line += " - exceeds the recommended {}:1".format(limit)
+        report.append(line)
+
+    return report
@@ -0,0 +1,139 @@
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+class NetworkIndex(object):
+    """
+    Index of the networks seen by the host probe. Each host is assigned a
+    bit, so membership of a subnet (or of a NIC name on a subnet) is held as
+    an integer bitset. Questions like 'which subnets are common to all OSD
+    hosts' then become a handful of bitwise operations per subnet, instead of
+    list scans across every host
+    """
+
+    def __init__(self, hosts):
+        """
+        :param hosts: (dict) Host objects, indexed by hostname
+        """
+
+        self.hosts = hosts
+        self.hostnames = sorted(hosts.keys())
+        self.host_bit = {hostname: 1 << idx
+                         for idx, hostname in enumerate(self.hostnames)}
+
+        self.subnet_hosts = dict()          # subnet -> host bitset
+        self.subnet_nics = dict()           # subnet -> {nic: host bitset}
+        self.subnet_bandwidth = dict()      # subnet -> aggregate Gb
+        self.subnet_links = dict()          # subnet -> {hostname: Gb}
+
+        for hostname in self.hostnames:
+            host = hosts[hostname]
+            bit = self.host_bit[hostname]
+
+            for net in host.subnets:
+                self.subnet_hosts[net] = self.subnet_hosts.get(net, 0) | bit
+
+            for nic_id in host.nics:
+                nic = host.nics[nic_id]
+                net = nic.get('network')
+                if not net:
+                    continue
+                nics = self.subnet_nics.setdefault(net, dict())
+                nics[nic_id] = nics.get(nic_id, 0) | bit
+                self.subnet_bandwidth[net] = (self.subnet_bandwidth.get(net, 0)
+                                              + nic['nic_gb'])
+                links = self.subnet_links.setdefault(net, dict())
+                links[hostname] = links.get(hostname, 0) + nic['nic_gb']
+
+    @property
+    def subnets(self):
+        return sorted(self.subnet_hosts.keys())
+
+    def host_mask(self, role=None, selected_only=False):
+        """
+        Build the bitset for a group of hosts
+        :param role: (str) only include hosts with this role
+        :param selected_only: (bool) only include hosts selected for install
+        :return: (int) host bitset
+        """
+
+        mask = 0
+        for hostname in self.hostnames:
+            host = self.hosts[hostname]
+            if selected_only and not host.selected:
+                continue
+            if role and role not in host.roles:
+                continue
+            mask |= self.host_bit[hostname]
+        return mask
+
+    def hostnames_in(self, mask):
+        return [hostname for hostname in self.hostnames
+                if self.host_bit[hostname] & mask]
+
+    def common_subnets(self, mask):
+        """
+        Subnets that every host in the mask is attached to
+        :param mask: (int) host bitset
+        :return: (list) subnets in cidr notation
+        """
+
+        if not mask:
+            return []
+
+        return [net for net in self.subnets
+                if self.subnet_hosts[net] & mask == mask]
+
+    def nic_counts(self, subnet, mask=None):
+        """
+        Number of hosts using each NIC name to reach a subnet
+        :param subnet: (str) subnet in cidr notation
+        :param mask: (int) only count these hosts (default is all hosts)
+        :return: (dict) nic name -> host count
+        """
+
+        counts = dict()
+        for nic_id, bits in self.subnet_nics.get(subnet, {}).items():
+            if mask is not None:
+                bits &= mask
+            if bits:
+                counts[nic_id] = popcount(bits)
+        return counts
+
+    def link_speed(self, subnet, hostname):
+        """ bandwidth (Gb) a host has into a subnet """
+        return self.subnet_links.get(subnet, {}).get(hostname, 0)
+
+    def link_speeds(self, subnet, mask):
+        """
+        Link speeds of a group of hosts into a subnet
+        :param subnet: (str) subnet in cidr notation
+        :param mask: (int) host bitset
+        :return: (tuple) minimum and aggregate bandwidth in Gb
+        """
+
+        speeds = [self.link_speed(subnet, hostname)
+                  for hostname in self.hostnames_in(mask)]
+        if not speeds:
+            return 0, 0
+        return min(speeds), sum(speeds)
+
+    def rank_subnets(self, subnets, mask):
+        """
+        Order subnets fastest first, by the slowest host link and then by the
+        aggregate bandwidth of the hosts in the mask
+        :param subnets: (list) candidate subnets
+        :param mask: (int) host bitset
+        :return: (list) of (subnet, min Gb, aggregate Gb) tuples
+        """
+
+        ranked = []
+        for net in subnets:
+            min_gb, total_gb = self.link_speeds(net, mask)
+            ranked.append((net, min_gb, total_gb))
+
+        return sorted(ranked, key=lambda r: (-r[1], -r[2], r[0]))
+
+    def __repr__(self):
+        return "NetworkIndex({} hosts, {} subnets)".format(
+            len(self.hostnames), len(self.subnet_hosts))
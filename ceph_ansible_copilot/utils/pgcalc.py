@@ -0,0 +1,143 @@
+from collections import OrderedDict
+
+from .utils import get_used_roles
+from .devices import osd_devices, osd_tiers, bulk_tier, fast_tier
+
+# expected share of the cluster's data held by the pools each role creates
+ROLE_POOLS = OrderedDict([
+    ("mds", [("cephfs_data", 0.95),
+             ("cephfs_metadata", 0.05)]),
+    ("rgw", [("default.rgw.buckets.data", 0.95),
+             ("default.rgw.buckets.index", 0.05)])
+])
+
+# pools that are latency sensitive, and belong on flash when available
+METADATA_POOLS = ['cephfs_metadata', 'default.rgw.buckets.index']
+
+
+def nearest_power_of_two(value):
+    """
+    Round a pg count to a power of two, as recommended by pgcalc - the
+    nearest power of two is used, unless it is more than 25% below the
+    value, in which case the next power of two up is used
+    :param value: (float) raw pg count
+    :return: (int) power of two pg count
+    """
+
+    power = 1
+    while power * 2 <= value:
+        power *= 2
+
+    if power < value * 0.75:
+        power *= 2
+
+    return power
+
+
+def plan_pgs(osd_count, pool_shares, size=3, target_per_osd=100):
+    """
+    Calculate pg_num for a set of pools, so the placement groups of all the
+    pools are spread evenly over the OSDs
+    :param osd_count: (int) number of OSDs in the cluster
+    :param pool_shares: (list) of (pool name, expected share of the data)
+                        tuples. Shares are relative, and are normalised
+    :param size: (int) replica count of the pools
+    :param target_per_osd: (int) placement groups wanted on each OSD
+    :return: (OrderedDict) pool name -> pg_num
+    """
+
+    if not pool_shares:
+        return OrderedDict()
+
+    osd_count = max(osd_count, 1)
+    total_share = float(sum(share for _pool, share in pool_shares))
+    # a pool should still span all the OSDs
+    min_pgs = float(osd_count) / size
+
+    plan = OrderedDict()
+    for pool, share in pool_shares:
+        raw = (target_per_osd * osd_count * (share / total_share)) / size
+        plan[pool] = nearest_power_of_two(max(raw, min_pgs))
+
+    return plan
+
+
+def pgs_per_osd(plan, osd_count, size=3):
+    """ average number of pg copies each OSD holds for a plan """
+    if osd_count < 1:
+        return 0
+    return sum(plan.values()) * size / float(osd_count)
+
+
+def osd_count(config):
+    """
+    Number of OSDs the selected hosts will provide
+    :param config: (object) config object containing host objects
+    :return: (int) osd count
+    """
+
+    count = 0
+    for host_name in config.hosts:
+        host = config.hosts[host_name]
+        if host.selected and 'osd' in host.roles:
+            count += len(osd_devices(host, config.osd_scenario)[0])
+    return count
+
+
+def pool_tiers(pools, tiers):
+    """
+    Choose the device class for each pool, when the cluster has more than
+    one class of OSD. Metadata pools go to the fastest flash tier, and
+    everything else to the bulk (largest) tier
+    :param pools: (list) pool names
+    :param tiers: (dict) osd tiers (see osd_tiers)
+    :return: (dict) pool name -> device class, empty for a single tier
+    """
+
+    if len(tiers) < 2:
+        return dict()
+
+    bulk = bulk_tier(tiers)
+    fast = fast_tier(tiers)
+
+    return {pool: fast if fast and pool in METADATA_POOLS else bulk
+            for pool in pools}
+
+
+def plan_cluster_pgs(config):
+    """
+    Plan the pg counts of every pool copilot defines, based on the roles in
+    use. The pools of each role are given an equal share of the cluster.
+    When pools are pinned to device classes, each class is planned against
+    its own OSD count
+    :param config: (object) config object with hosts and defaults
+    :return: (OrderedDict) pool name -> pg_num
+    """
+
+    used_roles = get_used_roles(config)
+    roles = [role for role in ROLE_POOLS if role in used_roles]
+
+    pool_shares = list()
+    for role in roles:
+        pool_shares.extend([(pool, share / len(roles))
+                            for pool, share in ROLE_POOLS[role]])
+
+    size = config.defaults.pool_size
+    target = config.defaults.target_pgs_per_osd
+
+    tiers = osd_tiers(config)
+    placement = pool_tiers([pool for pool, _share in pool_shares], tiers)
+    if not placement:
+        return plan_pgs(osd_count(config), pool_shares,
+                        size=size, target_per_osd=target)
+
+    tier_plans = dict()
+    for dev_class in set(placement.values()):
+        tier_plans.update(plan_pgs(tiers[dev_class]['osds'],
+                                   [(pool, share)
+                                    for pool, share in pool_shares
+                                    if placement[pool] == dev_class],
+                                   size=size, target_per_osd=target))
+
+    return OrderedDict([(pool, tier_plans[pool])
+                        for pool, _share in pool_shares])
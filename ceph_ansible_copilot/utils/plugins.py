@@ -13,9 +13,18 @@ class Plugin(object):
         self.module = module
         self.executed = False
 
+        # optional declarations - names of the items the plugin produces and
+        # the items it needs before it can run
+        self.provides = list(getattr(module, 'provides', []))
+        self.requires = list(getattr(module, 'requires', []))
+
 
 class PluginMgr(object):
 
+    # items a plugin may require that come from the config rather than from
+    # another plugin
+    config_provides = ['network', 'used_roles', 'devices']
+
     def __init__(self, plugin_dir='/usr/share/ceph-ansible-copilot/plugins',
                  logger=None):
 
@@ -44,11 +53,62 @@ class PluginMgr(object):
                 mod = self._load_plugin(full_path)
                 plugins[mod.__name__] = Plugin(mod)
             else:
-                self.logger.warning("{} signature invalid, skipped")
-                self.logger.warning(json.dumps(signature))
+                self.logger.warning("{} signature invalid, "
+                                    "skipped".format(os.path.basename(f)))
+                self.logger.warning(json.dumps(signature, default=str))
 
         return plugins
 
+    def schedule(self):
+        """
+        Group the plugins into waves based on their provides/requires
+        declarations. Plugins in the same wave have no dependency on each
+        other, so they can run concurrently. A requirement must be provided
+        by another plugin or by the config (config_provides) - any other
+        requirement is logged and ignored
+        :return: (list) of waves, each a sorted list of plugin names
+        """
+
+        providers = dict()
+        for plugin_name in self.plugins:
+            for item in self.plugins[plugin_name].provides:
+                providers.setdefault(item, set()).add(plugin_name)
+
+        depends_on = dict()
+        for plugin_name in self.plugins:
+            deps = set()
+            for item in self.plugins[plugin_name].requires:
+                if item not in providers and \
+                        item not in self.config_provides:
+                    self.logger.warning("Plugin {} requires '{}', which "
+                                        "nothing provides - "
+                                        "ignored".format(plugin_name, item))
+                    continue
+                deps |= providers.get(item, set())
+            deps.discard(plugin_name)
+            depends_on[plugin_name] = deps
+
+        waves = []
+        done = set()
+        pending = set(self.plugins.keys())
+        while pending:
+            wave = sorted(plugin_name for plugin_name in pending
+                          if depends_on[plugin_name] <= done)
+            if not wave:
+                # circular dependency - fall back to running the remaining
+                # plugins one at a time in name order
+                self.logger.warning("Circular plugin dependency between "
+                                    "{}".format(', '.join(sorted(pending))))
+                waves.extend([[plugin_name]
+                              for plugin_name in sorted(pending)])
+                break
+
+            waves.append(wave)
+            done.update(wave)
+            pending.difference_update(wave)
+
+        return waves
+
     def _load_plugin(self, plugin_module):
 
         mod_namespace = os.path.splitext(os.path.basename(plugin_module))[0]
@@ -66,7 +126,11 @@ class PluginMgr(object):
         if not all(v in signature['vars'] for v in var_names):
             return False
 
-        target_dir = os.path.split(signature['vars']['yml_file'])[0]
+        yml_file = signature['vars']['yml_file']
+        if not isinstance(yml_file, basestring):
+            return False
+
+        target_dir = os.path.split(yml_file)[0]
         if not os.path.exists(target_dir):
             return False
 
@@ -84,12 +148,14 @@ class PluginMgr(object):
             if isinstance(e, ast.FunctionDef):
                 functions.append(e.name)
             if isinstance(e, ast.Assign):
+                try:
+                    value = ast.literal_eval(e.value)
+                except ValueError:
+                    # not a literal e.g. a call - only the name is of use
+                    value = None
                 for t in e.targets:
-                    attr = getattr(e.value, 's', None)
-                    if attr:
-                        var_list[t.id] = e.value.s
-                    else:
-                        var_list[t.id] = e.value
+                    if isinstance(t, ast.Name):
+                        var_list[t.id] = value
 
         return {"functions": functions,
                 "vars": var_list}
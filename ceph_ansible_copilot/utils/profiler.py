@@ -0,0 +1,187 @@
+import os
+import time
+import json
+import pstats
+import cProfile
+import threading
+import functools
+
+# the active profiler - None unless copilot was started with --profile
+_profiler = None
+
+
+class Profiler(object):
+    """
+    Collects cProfile data for each phase of a copilot run (page callbacks,
+    plugins), and the wall clock time spent on each page of the wizard.
+    Only code run in copilot's own process is seen - the ansible workers
+    are forked, so the probe and deploy phases show the time spent driving
+    the playbook rather than the modules themselves
+    """
+
+    def __init__(self, output_dir, top=25):
+        """
+        :param output_dir: (str) directory for the pstats files and summary
+        :param top: (int) number of functions listed for each phase
+        """
+
+        self.output_dir = output_dir
+        self.top = top
+
+        self.stats = dict()             # phase -> pstats.Stats
+        self.phases = dict()            # phase -> {"calls", "elapsed"}
+        self.pages = list()             # [page title, seconds on page]
+        self._page = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def run(self, phase, func, *args, **kwargs):
+        """
+        Call a function under the profiler, adding its stats to a phase
+        :param phase: (str) phase name
+        :param func: (function) code to run
+        :return: the function's return value
+        """
+
+        if getattr(self._local, 'active', False):
+            # a profiler is already running on this thread - the nested
+            # phase is part of the outer one, so only its time is recorded
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._add_time(phase, time.time() - start)
+
+        prof = cProfile.Profile()
+        self._local.active = True
+        start = time.time()
+        try:
+            return prof.runcall(func, *args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            self._local.active = False
+            self._add_time(phase, elapsed)
+            self._add_stats(phase, prof)
+
+    def _add_time(self, phase, elapsed):
+        with self._lock:
+            entry = self.phases.setdefault(phase, {"calls": 0,
+                                                   "elapsed": 0.0})
+            entry['calls'] += 1
+            entry['elapsed'] += elapsed
+
+    def _add_stats(self, phase, prof):
+        with self._lock:
+            try:
+                if phase in self.stats:
+                    self.stats[phase].add(prof)
+                else:
+                    self.stats[phase] = pstats.Stats(prof)
+            except TypeError:
+                # nothing was recorded for this call
+                pass
+
+    def page_shown(self, title):
+        """
+        Start timing a wizard page, closing the timer of the previous page
+        :param title: (str) page title, or None when the UI has finished
+        """
+
+        now = time.time()
+        if self._page:
+            prev_title, started = self._page
+            self.pages.append([prev_title, now - started])
+
+        self._page = (title, now) if title else None
+
+    def write(self):
+        """
+        Write a pstats file per phase, a text summary and a json summary
+        :return: (list) files written
+        """
+
+        self.page_shown(None)
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        files = list()
+        for phase in sorted(self.stats):
+            pstats_file = os.path.join(self.output_dir,
+                                       '{}.pstats'.format(phase))
+            self.stats[phase].dump_stats(pstats_file)
+            files.append(pstats_file)
+
+        summary_file = os.path.join(self.output_dir, 'summary.txt')
+        with open(summary_file, 'w') as summary:
+            summary.write("Wall clock time per page\n")
+            for title, elapsed in self.pages:
+                summary.write("  {:<24s} {:>10.3f}s\n".format(title, elapsed))
+
+            summary.write("\nWall clock time per phase\n")
+            for phase in sorted(self.phases):
+                summary.write("  {:<40s} {:>4d} call(s) {:>10.3f}s\n".format(
+                    phase, self.phases[phase]['calls'],
+                    self.phases[phase]['elapsed']))
+
+            for phase in sorted(self.stats):
+                summary.write("\n{}\nTop {} functions of {} (by cumulative "
+                              "time)\n".format('=' * 79, self.top, phase))
+                stats = self.stats[phase]
+                stats.stream = summary
+                stats.sort_stats('cumulative').print_stats(self.top)
+        files.append(summary_file)
+
+        json_file = os.path.join(self.output_dir, 'summary.json')
+        with open(json_file, 'w') as f:
+            json.dump({"pages": self.pages,
+                       "phases": self.phases}, f, indent=2, sort_keys=True)
+        files.append(json_file)
+
+        return files
+
+
+def enable_profiling(output_dir):
+    """
+    Turn on profiling for the functions decorated with profiled
+    :param output_dir: (str) directory the profiler writes to
+    :return: (Profiler) the active profiler
+    """
+
+    global _profiler
+    _profiler = Profiler(output_dir)
+    return _profiler
+
+
+def get_profiler():
+    """ the active profiler, or None when profiling is off """
+    return _profiler
+
+
+def profiled(phase=None):
+    """
+    Decorator to profile a function when profiling is enabled. When it's off
+    the only overhead is a check of the module level profiler
+    :param phase: (str) phase name - defaults to <class>.<method> for
+                  methods, or the function name
+    """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+
+            name = phase
+            if not name:
+                if args and hasattr(args[0], func.__name__):
+                    name = '{}.{}'.format(type(args[0]).__name__,
+                                          func.__name__)
+                else:
+                    name = func.__name__
+            return _profiler.run(name, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
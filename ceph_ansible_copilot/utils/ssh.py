@@ -2,9 +2,11 @@ import os
 import socket
 import getpass
 import json
+import threading
 
 from paramiko.rsakey import RSAKey
-from paramiko import SSHClient, AutoAddPolicy
+from paramiko import SSHClient, MissingHostKeyPolicy
+from paramiko.hostkeys import HostKeys, HostKeyEntry
 from paramiko.ssh_exception import (AuthenticationException,
                                     NoValidConnectionsError, SSHException)
 
@@ -12,6 +14,73 @@ from paramiko.ssh_exception import (AuthenticationException,
 # 'install' command on the target ceph nodes
 
 
+class _KnownHosts(object):
+    """
+    known_hosts shared by the ssh sessions, which run a thread per host. The
+    file is parsed once, and a new host key is appended to it - paramiko's
+    own AutoAddPolicy re-reads and rewrites the whole file for every new
+    host, which is slow for a large cluster and unsafe across threads
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.path = None
+        self.keys = HostKeys()
+
+    def _load(self, path):
+        """ (re)load the keys when the file in use has changed """
+
+        if path == self.path:
+            return
+
+        self.keys = HostKeys()
+        if os.path.exists(path):
+            self.keys.load(path)
+        self.path = path
+
+    def lookup(self, path, hostname):
+        """
+        Return the known keys of a host
+        :param path: (str) known_hosts file
+        :param hostname: (str) host name, in known_hosts format
+        :return: (list) of PKey objects
+        """
+
+        with self.lock:
+            self._load(path)
+            keys = self.keys.lookup(hostname)
+            return keys.values() if keys else []
+
+    def add(self, path, hostname, key):
+        """
+        Record a new host key, appending it to the known_hosts file
+        :param path: (str) known_hosts file
+        :param hostname: (str) host name, in known_hosts format
+        :param key: (PKey) the host's key
+        :return: None
+        """
+
+        with self.lock:
+            self._load(path)
+            self.keys.add(hostname, key.get_name(), key)
+            with open(path, 'a') as known_hosts:
+                known_hosts.write(HostKeyEntry([hostname], key).to_line())
+
+
+_known_hosts = _KnownHosts()
+
+
+class _KnownHostsPolicy(MissingHostKeyPolicy):
+    """ accept a new host key, and add it to the shared known_hosts """
+
+    def __init__(self, path):
+        self.path = path
+
+    def missing_host_key(self, client, hostname, key):
+        client.get_host_keys().add(hostname, key.get_name(), key)
+        _known_hosts.add(self.path, hostname, key)
+
+
 class SSHConfig(object):
 
     def __init__(self, user=None, autoadd=True):
@@ -81,6 +150,8 @@ class SSHConfig(object):
 class SSHsession(object):
 
     connection_timeout = 2
+    ssh_port = 22
+    known_hosts = '~root/.ssh/known_hosts'
 
     ssh_status_codes = {
         0: ("OK", "ok"),
@@ -100,6 +171,7 @@ class SSHsession(object):
         self.username = username
         self.password = password
         self.status_code = 24
+        self.requiretty = False
 
     @property
     def ok(self):
@@ -110,6 +182,7 @@ class SSHsession(object):
         client = SSHClient()
         self.status_code = self._ssh_connect(client)
         if self.status_code == 0:
+            self.requiretty = self._requiretty(client)
             client.close()
 
     def setup(self, callback=None):
@@ -145,12 +218,20 @@ class SSHsession(object):
 
     def _ssh_connect(self, client, use_password=False):
 
-        client.set_missing_host_key_policy(AutoAddPolicy())
-        client.load_host_keys(
-            os.path.expanduser('~root/.ssh/known_hosts'))
+        # only this host's keys are given to the client
+        path = os.path.expanduser(SSHsession.known_hosts)
+        if SSHsession.ssh_port == 22:
+            hostname = self.hostname
+        else:
+            hostname = "[{}]:{}".format(self.hostname, SSHsession.ssh_port)
+        host_keys = client.get_host_keys()
+        for key in _known_hosts.lookup(path, hostname):
+            host_keys.add(hostname, key.get_name(), key)
+        client.set_missing_host_key_policy(_KnownHostsPolicy(path))
 
         conn_args = {
             "hostname": self.hostname,
+            "port": SSHsession.ssh_port,
             "username": self.username,
             "timeout": SSHsession.connection_timeout
         }
@@ -179,6 +260,22 @@ class SSHsession(object):
 
         return 0
 
+    def _requiretty(self, client):
+        """
+        Check whether sudo on the host insists on a tty, which rules out
+        ansible's pipelining
+        :param client: (SSHClient) connected client
+        :return: (bool) True if sudo requires a tty
+        """
+
+        if self.username == 'root':
+            # ansible doesn't use sudo when the remote user is the become user
+            return False
+
+        # exec_command runs without a pty, just as a pipelined module would
+        stdin, stdout, stderr = client.exec_command("sudo -n true")
+        return 'tty' in stderr.read()
+
     def _copy_key(self):
 
         if not self.password:
@@ -216,6 +313,7 @@ class SSHsession(object):
                 client.exec_command("echo -e {} > {}".format(local_key,
                                                              auth_key_file))
 
+            self.requiretty = self._requiretty(client)
             client.close()
         else:
             # connection with password failed
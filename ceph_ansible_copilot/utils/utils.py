@@ -1,17 +1,55 @@
 
+import re
 import shutil
 import ConfigParser
 import os
+import sys
 import pwd
 import socket
+import signal
+import atexit
 import threading
 import Queue
+from collections import OrderedDict
 import yaml
-from yaml.scanner import ScannerError
+
+from .backup import STATE_DIR
+
+# use the libyaml (C) based loader/dumper when pyyaml has been built with it,
+# falling back to the pure python implementation
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
 
 
 TCP_TIMEOUT = 2
 
+# facts gathered by ansible are cached here (jsonfile cache plugin)
+FACT_CACHE_DIR = os.path.join(STATE_DIR, 'facts')
+
+# ansible.cfg settings applied for the duration of a copilot run. A
+# multiplexed ssh connection is kept open to each host, under a short control
+# path (ssh limits socket paths to 108 characters), modules are pipelined
+# over that connection, and facts are cached between plays. How long cached
+# facts are used for is set by the deploy (Config fact_cache_age), not here.
+# ansible reads the file when it's imported - before the hosts are checked -
+# so the hosts whose sudo requires a tty (which rules out pipelining) have
+# pipelining turned off in the inventory instead (see CoPilotInventory)
+ANSIBLE_CFG_SETTINGS = [
+    ('defaults', 'deprecation_warnings', 'False'),
+    ('defaults', 'fact_caching', 'jsonfile'),
+    ('defaults', 'fact_caching_connection', FACT_CACHE_DIR),
+    ('ssh_connection', 'ssh_args',
+     '-o ControlMaster=auto -o ControlPersist=600s'),
+    ('ssh_connection', 'control_path_dir', '/tmp/.copilot-cp'),
+    ('ssh_connection', 'control_path', '%(directory)s/%%C'),
+    ('ssh_connection', 'pipelining', 'True')
+]
+
+# ansible.cfg files changed by setup_ansible_cfg, that are put back on exit
+_ansible_cfg_dirs = set()
+
 
 def bytes2human(in_bytes, target_unit=None):
     """
@@ -110,6 +148,55 @@ def expand_hosts(host_text):
     return hosts
 
 
+def compress_hosts(host_names, min_run=3):
+    """
+    Compress host names into ansible's inventory range patterns, the reverse
+    of ansible's range expansion e.g. osd-01, osd-02, osd-03 -> osd-[01:03].
+    The last number in a name is the one ranged, and only names with the
+    same number of digits share a range, so zero padding is kept intact
+    :param host_names: (list) host names
+    :param min_run: (int) fewest consecutive hosts written as a range
+    :return: (list) host names and range patterns, in natural order
+    """
+
+    numbered = dict()           # (prefix, digits, suffix) -> [numbers]
+    patterns = list()           # (sort key, pattern)
+
+    for host_name in set(host_names):
+        match = re.match(r'^(.*?)(\d+)(\D*)$', host_name)
+        if not match:
+            patterns.append(((host_name, -1, ''), host_name))
+            continue
+        prefix, number, suffix = match.groups()
+        numbered.setdefault((prefix, len(number), suffix),
+                            []).append(int(number))
+
+    for (prefix, width, suffix), numbers in numbered.items():
+        numbers.sort()
+        runs = [[numbers[0], numbers[0]]]
+        for number in numbers[1:]:
+            if number == runs[-1][1] + 1:
+                runs[-1][1] = number
+            else:
+                runs.append([number, number])
+
+        for first, last in runs:
+            if last - first + 1 >= min_run:
+                patterns.append(((prefix, first, suffix),
+                                 "{}[{}:{}]{}".format(prefix,
+                                                      str(first).zfill(width),
+                                                      str(last).zfill(width),
+                                                      suffix)))
+            else:
+                for number in range(first, last + 1):
+                    host_name = "{}{}{}".format(prefix,
+                                                str(number).zfill(width),
+                                                suffix)
+                    patterns.append(((prefix, number, suffix), host_name))
+
+    return [pattern for _key, pattern in sorted(patterns)]
+
+
 def check_dns(host_list):
     return sorted([host for host in host_list if not dns_ok(host)])
 
@@ -128,18 +215,62 @@ def valid_yaml(yml_data):
 
     yml_stream = '\n'.join(yml_data)
     try:
-        _yml_ok = yaml.safe_load(yml_stream)
-    except ScannerError:
+        _yml_ok = yaml.load(yml_stream, Loader=SafeLoader)
+    except yaml.YAMLError:
         return False
     else:
         return True
 
 
+def ordered_load(stream, Loader=SafeLoader, object_pairs_hook=OrderedDict):
+    """
+    Load yaml, preserving the order of the keys in mappings
+    :param stream: (str|file) yaml content
+    :param Loader: (class) yaml loader to extend (default is the C based
+                   SafeLoader when available)
+    :param object_pairs_hook: (class) type used for mappings
+    :return: the loaded yaml data
+    """
+
+    class OrderedLoader(Loader):
+        pass
+
+    def construct_mapping(loader, node):
+        loader.flatten_mapping(node)
+        return object_pairs_hook(loader.construct_pairs(node))
+    OrderedLoader.add_constructor(
+        yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+        construct_mapping)
+    return yaml.load(stream, OrderedLoader)
+
+
+def ordered_dump(data, stream=None, Dumper=SafeDumper, **kwds):
+    """
+    Dump yaml, writing OrderedDict's as normal mappings in key order
+    :param data: data to dump
+    :param stream: (file) stream to write to, or None to return a string
+    :param Dumper: (class) yaml dumper to extend (default is the C based
+                   SafeDumper when available)
+    :return: (str) yaml, when stream is None
+    """
+
+    class OrderedDumper(Dumper):
+        pass
+
+    def _dict_representer(dumper, data):
+        return dumper.represent_mapping(
+            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+            data.items())
+    OrderedDumper.add_representer(OrderedDict, _dict_representer)
+    return yaml.dump(data, stream, OrderedDumper, **kwds)
+
+
 def setup_ansible_cfg(ceph_ansible_dir='/usr/share/ceph-ansible'):
     """
-    update the ansible.cfg file in the ceph-ansible directory to turn off
-    deprecation warnings. The original file is saved, for restoration after
-    copilot completes
+    update the ansible.cfg file in the ceph-ansible directory with copilot's
+    settings (see ANSIBLE_CFG_SETTINGS). The original file is saved, and
+    restored when copilot exits - a backup left behind by a run that was
+    killed is restored before the settings are applied
     :param ceph_ansible_dir : (str) path to the ceph-ansible root directory
     :return: None
     """
@@ -147,9 +278,8 @@ def setup_ansible_cfg(ceph_ansible_dir='/usr/share/ceph-ansible'):
     ansible_cfg = os.path.join(ceph_ansible_dir, 'ansible.cfg')
     ansible_cfg_bkup = '{}_bak'.format(ansible_cfg)
 
-    cfg_changes = [
-        ('defaults', 'deprecation_warnings', 'False')
-    ]
+    # changes are always made to the original file
+    restore_ansible_cfg(ceph_ansible_dir)
 
     if not os.path.exists(ansible_cfg):
         raise EnvironmentError("ansible.cfg is not in the ceph-ansible"
@@ -158,10 +288,12 @@ def setup_ansible_cfg(ceph_ansible_dir='/usr/share/ceph-ansible'):
     cfg_file = ConfigParser.SafeConfigParser()
     cfg_file.readfp(open(ansible_cfg, 'r'))
     changes_made = False
-    for setting in cfg_changes:
+    for setting in ANSIBLE_CFG_SETTINGS:
         section, variable, required_value = setting
+        if not cfg_file.has_section(section):
+            cfg_file.add_section(section)
         try:
-            current_value = cfg_file.get(section, variable)
+            current_value = cfg_file.get(section, variable, raw=True)
             if current_value != required_value:
                 cfg_file.set(section, variable, required_value)
                 changes_made = True
@@ -169,15 +301,49 @@ def setup_ansible_cfg(ceph_ansible_dir='/usr/share/ceph-ansible'):
             cfg_file.set(section, variable, required_value)
             changes_made = True
 
-    if changes_made:
-        shutil.copy2(ansible_cfg,
-                     ansible_cfg_bkup)
+    if not changes_made:
+        return
+
+    shutil.copy2(ansible_cfg,
+                 ansible_cfg_bkup)
+    _restore_on_exit(ceph_ansible_dir)
 
     # use unbuffered I/O to commit the change
     with open(ansible_cfg, 'w', 0) as c:
         cfg_file.write(c)
 
 
+def _restore_on_exit(ceph_ansible_dir):
+    """
+    Put back the original ansible.cfg when copilot exits - normally, on an
+    unhandled exception, or when it's terminated
+    :param ceph_ansible_dir: (str) installation directory of ceph-ansible
+    :return: None
+    """
+
+    if not _ansible_cfg_dirs:
+        atexit.register(_restore_all_ansible_cfg)
+
+        def _terminated(signum, frame):
+            # raising SystemExit runs the atexit handlers
+            sys.exit(128 + signum)
+
+        for signum in (signal.SIGTERM, signal.SIGHUP):
+            try:
+                if signal.getsignal(signum) == signal.SIG_DFL:
+                    signal.signal(signum, _terminated)
+            except ValueError:
+                # handlers can only be set from the main thread
+                pass
+
+    _ansible_cfg_dirs.add(ceph_ansible_dir)
+
+
+def _restore_all_ansible_cfg():
+    for ceph_ansible_dir in _ansible_cfg_dirs:
+        restore_ansible_cfg(ceph_ansible_dir)
+
+
 def restore_ansible_cfg(ceph_ansible_dir='/usr/share/ceph-ansible'):
     """
     if a backup copy exists, restore the ansible.cfg file in the ceph-ansible
@@ -223,30 +389,3 @@ def get_used_roles(config):
 
     return list(used_roles)
 
-
-def get_pgnum(config):
-    """
-    simplistic pgnum calculation based on
-    http://docs.ceph.com/docs/master/rados/operations/placement-groups/
-    :param config: (config object) contains a hosts dict, with all gathered
-                   specs
-    :return: (int) pg number to use for a pool
-    """
-
-    hdd_total = 0
-    ssd_total = 0
-    for host_name in config.hosts:
-        host = config.hosts[host_name]
-        if host.selected:
-            hdd_total += host.hdd_count
-            ssd_total += host.ssd_count
-
-    total_drives = max(hdd_total, ssd_total)
-    if total_drives < 5:
-        return 64
-    elif total_drives < 10:
-        return 128
-    elif total_drives < 50:
-        return 512
-    else:
-        return 1024
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from StringIO import StringIO
+
+from .utils import ordered_dump
+
+
+class YmlDocument(object):
+    """
+    Structured output for a yml plugin. Variables are held as python data
+    (ordered, with real booleans, ints and lists) alongside the comments and
+    blank lines that lay out the file. The document is serialized once, by
+    the yaml emitter, when the file is written - so there is no need to
+    re-parse the output to prove it's valid
+    """
+
+    def __init__(self):
+        self.entries = list()           # ('var'|'comment'|'blank', text)
+        self.data = OrderedDict()
+
+    def __setitem__(self, key, value):
+        if key not in self.data:
+            self.entries.append(('var', key))
+        self.data[key] = value
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def add(self, key, value):
+        """
+        Add (or replace) a variable
+        :param key: (str) variable name
+        :param value: variable value - any type the yaml dumper handles
+        :return: None
+        """
+        self[key] = value
+
+    def comment(self, text):
+        self.entries.append(('comment', text))
+
+    def blank(self):
+        self.entries.append(('blank', None))
+
+    def write(self, stream, header=None):
+        """
+        Emit the document to a stream
+        :param stream: (file) file like object to write to
+        :param header: (list) comment lines to place after the document
+                       start marker
+        :return: None
+        """
+
+        stream.write('---\n')
+        for line in (header or []):
+            stream.write('{}\n'.format(line))
+
+        for entry_type, text in self.entries:
+            if entry_type == 'var':
+                ordered_dump(OrderedDict([(text, self.data[text])]),
+                             stream=stream,
+                             default_flow_style=False)
+            elif entry_type == 'comment':
+                stream.write('# {}\n'.format(text))
+            else:
+                stream.write('\n')
+
+    def dumps(self, header=None):
+        """ return the document as a string """
+        out = StringIO()
+        self.write(out, header)
+        return out.getvalue()
+
+    def __repr__(self):
+        return "YmlDocument({} vars)".format(len(self.data))
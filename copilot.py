@@ -5,15 +5,19 @@ import inspect
 import sys
 import os
 import traceback
-import shutil
 import time
 import logging
 import argparse
+from multiprocessing.pool import ThreadPool
 
 import ceph_ansible_copilot
 
 from ceph_ansible_copilot.utils import (PluginMgr, restore_ansible_cfg,
-                                        SSHConfig)
+                                        SSHConfig, CommitTransaction,
+                                        CommitError, BackupStore, BackupError,
+                                        YmlDocument, STATE_DIR,
+                                        enable_profiling, get_profiler,
+                                        profiled)
 
 from ceph_ansible_copilot.ui import (UI_Welcome,
                                      UI_Environment,
@@ -29,6 +33,10 @@ from ceph_ansible_copilot.ui import (UI_Welcome,
 
 from ceph_ansible_copilot.ui.palette import palette
 
+from ceph_ansible_copilot.ansible import (EventRecorder, ReplayPlaybook,
+                                          ProgressModel, TaskHistory,
+                                          STRATEGIES)
+
 CEPH_ANSIBLE_ROOT = '/usr/share/ceph-ansible'
 
 
@@ -66,8 +74,19 @@ class Config(Settings):
         self.defaults.sw_src = 'RH CDN'
         self.defaults.dmcrypt = 'standard'
         self.defaults.playbook = '/usr/share/ceph-ansible/site.yml'
+        self.defaults.plugin_workers = 8
+        self.defaults.backup_versions = 10     # versions kept for each file
+        self.defaults.backup_max_age = None    # days, None = no age limit
+        self.defaults.pool_size = 3            # replicas, used for pg sizing
+        self.defaults.target_pgs_per_osd = 100
+        self.defaults.deploy_strategy = 'linear'
+        self.defaults.deploy_serial = None     # batch size, None = all hosts
+        self.defaults.rolling_groups = ['osds']  # plays strategy/serial apply
+        self.defaults.fact_cache_age = 3600    # secs, 0 = deploy regathers
+        self.defaults.forks = 100              # hosts ansible runs in parallel
 
         self.hosts = None
+        self.ansible_inventory = None   # CoPilotInventory, from the commit
 
 
 def get_ui_sections():
@@ -115,9 +134,13 @@ class App(object):
         self.pb_active = False
         self.pb_complete = 0
         self.pb = None
+        self.progress = None        # ProgressModel behind the progress bar
         self.debug = None           # used to check state during debugging
 
         self.plugin_mgr = None
+        self.task_history = None    # task durations of earlier runs
+        self.transaction = None
+        self.backup_store = None
         self.ssh = None
 
         self.msg = None
@@ -130,14 +153,23 @@ class App(object):
         self.cfg = Config()
         self.opts = opts
         self.hosts = dict()
+        self.network_index = None   # subnet/NIC index built after the probe
 
         if opts.playbook:
             self.playbook = opts.playbook
         else:
             self.playbook = self.cfg.defaults.playbook
 
+        if opts.strategy:
+            self.cfg.defaults.deploy_strategy = opts.strategy
+        if opts.serial:
+            self.cfg.defaults.deploy_serial = opts.serial
+        if opts.forks:
+            self.cfg.defaults.forks = opts.forks
+
         self.ansible_cfg = os.path.join(CEPH_ANSIBLE_ROOT, 'ansible.cfg')
         self.ansible_cfg_bkup = '{}_bak'.format(self.ansible_cfg)
+        self.ansible_cfg_tuned = ceph_ansible_copilot.ansible_cfg_tuned
 
     def refresh_ui(self, left=None, right=None):
         if not left:
@@ -158,6 +190,10 @@ class App(object):
         if self.pagenum < len(self.page) - 1:
             self.pagenum += 1
 
+        profiler = get_profiler()
+        if profiler:
+            profiler.page_shown(self.page[self.pagenum].title)
+
         copilot.left_pane.update()
         self.msg_text = self.page[self.pagenum].hint
         self.show_message(self.msg_text)
@@ -170,9 +206,11 @@ class App(object):
 
         self.loop.widget = self.top
 
+    @profiled('execute_plugins')
     def execute_plugins(self):
 
         self.cfg.hosts = self.hosts
+        self.cfg.network_index = self.network_index
         self.cfg.ceph_version = opts.ceph_version
         self.cfg.cluster_name = opts.cluster_name
 
@@ -183,47 +221,62 @@ class App(object):
 
         plugin_status = {
             "successful": 0,
-            "failed": 0
+            "failed": 0,
+            "committed": False
         }
 
+        # plugin output is staged, and only installed once every plugin has
+        # run successfully
+        self.transaction = CommitTransaction(backup=self.bkup_yml,
+                                             logger=self.log)
+
         num_plugins = len(self.plugin_mgr.plugins)
         if num_plugins > 0:
             self.log.info("Plugin execution starting..")
 
-        srtd_names = sorted(self.plugin_mgr.plugins.keys())
-
-        plugins = self.plugin_mgr.plugins
+        # plugins are run in dependency order - each wave holds plugins that
+        # don't depend on each other, so they are run on a worker pool
+        waves = self.plugin_mgr.schedule()
+        workers = max(1, min(self.cfg.defaults.plugin_workers,
+                             max([len(wave) for wave in waves] + [1])))
+        pool = ThreadPool(workers)
+
+        try:
+            for wave in waves:
+                self.log.info("Plugin wave: {}".format(', '.join(wave)))
+                for plugin_name, ok in pool.map(self.run_plugin, wave):
+                    if ok:
+                        plugin_status['successful'] += 1
+                    else:
+                        plugin_status['failed'] += 1
 
-        for plugin_name in srtd_names:
-            mod = plugins[plugin_name].module
-            yml_file = mod.yml_file
+                if plugin_status['failed'] > 0:
+                    # plugins in later waves may depend on the failed one, so
+                    # stop here and leave them as skipped
+                    break
+        finally:
+            pool.close()
+            pool.join()
 
+        if plugin_status['failed'] == 0:
             try:
-                self.log.info("Plugin: {}".format(plugin_name))
-                plugin_data = mod.plugin_main(self.cfg)
-
-                plugins[plugin_name].executed = True
-
-            except BaseException as error:
-                # Use BaseException as a catch-all from the plugins
-                plugin_status['failed'] += 1
-                self.log.error("Plugin '{}' failed : "
-                               "{}".format(plugin_name,
-                                           sys.exc_info()[0]))
-                self.log.debug(traceback.format_exc())
-                break
+                updated = self.transaction.commit()
+            except CommitError as error:
+                self.log.error("Commit of plugin output failed : "
+                               "{}".format(error))
             else:
-                plugin_status['successful'] += 1
-                if isinstance(plugin_data, tuple):
-                    f_type, contents = plugin_data
-                    if contents:
-                        self.write_yml(yml_file, contents, f_type)
-                        self.log.info("Plugin updated {}".format(yml_file))
-                    else:
-                        self.log.info("Plugin - no data written to "
-                                      "{}".format(yml_file))
-                elif not plugin_data:
-                    self.log.info("backup and update handled by plugin")
+                plugin_status['committed'] = True
+                self.log.info("{} file(s) updated, {} unchanged".format(
+                    len(updated), len(self.transaction.unchanged)))
+            finally:
+                removed = self.backup_store.prune()
+                if removed:
+                    self.log.info("{} old backup version(s) "
+                                  "removed".format(removed))
+        else:
+            self.transaction.abort()
+            self.log.warning("Plugin output discarded - no configuration "
+                             "files have been changed")
 
         skipped = num_plugins - (plugin_status['successful'] +
                                  plugin_status['failed'])
@@ -236,30 +289,85 @@ class App(object):
 
         return plugin_status
 
+    @profiled('plugins')
+    def run_plugin(self, plugin_name):
+        """
+        Run a plugin and write its output (called from the plugin worker pool)
+        :param plugin_name: (str) name of the plugin to run
+        :return: (tuple) plugin name and whether it completed successfully
+        """
+
+        plugin = self.plugin_mgr.plugins[plugin_name]
+        mod = plugin.module
+        yml_file = mod.yml_file
+
+        try:
+            self.log.info("Plugin: {}".format(plugin_name))
+            plugin_data = mod.plugin_main(self.cfg)
+
+            plugin.executed = True
+
+            if isinstance(plugin_data, tuple):
+                # single file output - (file type, contents)
+                plugin_data = [(yml_file,) + plugin_data]
+
+            if isinstance(plugin_data, list):
+                # multi file output - [(filename, file type, contents)...]
+                for out_file, f_type, contents in plugin_data:
+                    if contents:
+                        self.write_yml(out_file, contents, f_type)
+                        self.log.info("Plugin staged {}".format(out_file))
+                    else:
+                        self.log.info("Plugin - no data written to "
+                                      "{}".format(out_file))
+            elif not plugin_data:
+                self.log.info("backup and update handled by plugin")
+
+        except BaseException as error:
+            # Use BaseException as a catch-all from the plugins
+            self.log.error("Plugin '{}' failed : "
+                           "{}".format(plugin_name,
+                                       sys.exc_info()[0]))
+            self.log.debug(traceback.format_exc())
+            return plugin_name, False
+
+        return plugin_name, True
+
     def write_yml(self, yml_file, contents, file_type='yml'):
-        self.bkup_yml(yml_file)
-        contents.insert(0, ' ')
-        contents.insert(0, "# created by copilot - only overrides from"
-                           " defaults shown {}".format(self.file_timestamp))
-        if file_type == 'yml':
-            contents.insert(0, '---')
+        """
+        Add copilot's header to the plugin output and stage it in the
+        current commit transaction
+        :param yml_file: (str) target filename
+        :param contents: (YmlDocument|list|str) structured yml document, the
+                         lines of the file, or the file content for raw files
+        :param file_type: (str) yml, ini, or raw - content staged as is
+                          e.g. a copy of a sample file
+        """
+
+        if file_type == 'raw':
+            self.transaction.stage(yml_file, contents)
+            return
+
+        header = ["# created by copilot - only overrides from"
+                  " defaults shown {}".format(self.file_timestamp),
+                  '']
 
-        # unbuffered write
-        with open(yml_file, 'w', 0) as f:
-            f.write("\n".join(contents))
+        if isinstance(contents, YmlDocument):
+            content = contents.dumps(header=header)
+        else:
+            lines = header + contents
+            if file_type == 'yml':
+                lines = ['---'] + lines
+            content = "\n".join(lines)
 
-        # read it back
-        with open(yml_file, 'r') as f:
-            contents = f.readlines()
+        self.transaction.stage(yml_file, content)
 
     def bkup_yml(self, yml_file):
 
         if os.path.exists(yml_file):
-            yml_file_bkup = '{}_{}'.format(yml_file,
-                                           self.timestamp)
-            shutil.copy2(yml_file, yml_file_bkup)
-            self.log.info("YML file {}, copied to {}".format(yml_file,
-                                                             yml_file_bkup))
+            digest = self.backup_store.save(yml_file, self.timestamp)
+            self.log.info("YML file {}, backed up as version {} "
+                          "({})".format(yml_file, self.timestamp, digest[:12]))
         else:
             self.log.warning("Existing file {}, not found".format(yml_file))
 
@@ -278,10 +386,92 @@ class App(object):
         if immediate:
             self.loop.draw_screen()
 
-    def progress_bar(self, complete=0):
+    def event_recorder(self, phase):
+        """
+        Recorder for the callback events of a playbook run (--record)
+        :param phase: (str) probe or deploy
+        :return: (EventRecorder) recorder, or None when not recording
+        """
+
+        if not self.opts.record:
+            return None
+
+        event_file = os.path.join(self.opts.record,
+                                  '{}.jsonl'.format(phase))
+        self.log.info("Recording {} events to {}".format(phase, event_file))
+        return EventRecorder(event_file, phase=phase)
+
+    def replay_playbook(self, phase, host_list, callback):
+        """
+        Playbook stand-in that replays a recorded run (--replay)
+        :param phase: (str) probe or deploy
+        :param host_list: (str|list) hosts the events are replayed for
+        :param callback: (ResultCallback) callback to feed the events to
+        :return: (ReplayPlaybook) replay, or None when there's no recording
+                 of this phase to use
+        """
+
+        if not self.opts.replay:
+            return None
+
+        event_file = os.path.join(self.opts.replay,
+                                  '{}.jsonl'.format(phase))
+        if not os.path.exists(event_file):
+            self.log.info("No {} recording in {}, running the "
+                          "playbook".format(phase, self.opts.replay))
+            return None
+
+        self.log.info("Replaying {} events from {} at {}x".format(
+            phase, event_file, self.opts.replay_speed))
+        return ReplayPlaybook(event_file, callback=callback,
+                              speed=self.opts.replay_speed,
+                              host_list=host_list)
+
+    def report_requiretty(self):
+        """
+        Once ssh access to the hosts has been checked, log the hosts whose
+        sudo setup needs a tty. The inventory turns ansible's pipelining off
+        for them (see CoPilotInventory)
+        :return: None
+        """
+
+        tty_hosts = sorted([hostname for hostname in self.hosts
+                            if self.hosts[hostname].ssh.ok and
+                            self.hosts[hostname].ssh.requiretty])
+        if tty_hosts:
+            self.log.warning("sudo requires a tty on {} host(s), so ansible "
+                             "pipelining is disabled for them : "
+                             "{}".format(len(tty_hosts), ','.join(tty_hosts)))
+
+    def progress_model(self, phase, playbook):
+        """
+        Progress model for a playbook run. Replayed runs don't reflect real
+        task durations, so they're left out of the task history
+        :param phase: (str) probe or deploy
+        :param playbook: (object) playbook, or ReplayPlaybook, to be run
+        :return: (ProgressModel) model of the run
+        """
+
+        replay = isinstance(playbook, ReplayPlaybook)
+        forks = playbook.options.forks if not replay else 100
+        return ProgressModel(playbook.task_list(), phase,
+                             history=self.task_history,
+                             forks=forks,
+                             save_history=not replay)
+
+    def progress_bar(self, complete=0, progress=None):
+        """
+        Toggle the progress bar overlay
+        :param complete: (int) results expected, when there's no model
+        :param progress: (ProgressModel) model used for the bar and ETA
+        """
+
         if not self.pb_active:
             # turn on a progress bar
             self.pb_active = True
+            self.progress = progress
+            if progress:
+                complete = progress.expected
 
             self.pb = ProgressOverlay(bottom_w=self.top, complete=complete)
             self.loop.widget = self.pb
@@ -290,6 +480,7 @@ class App(object):
             # turn the progress bar off
             self.pb_active = False
             self.pb = None
+            self.progress = None
             self.loop.widget = self.top
             self.loop.draw_screen()
 
@@ -297,7 +488,11 @@ class App(object):
         if self.pb_active:
             task_state = stats['task_state']
             done = sum([task_state[item] for item in task_state])
-            self.loop.widget = self.pb.update(done)
+            status = ''
+            if self.progress:
+                self.progress.update(stats)
+                status = self.progress.status_text
+            self.loop.widget = self.pb.update(done, status)
             self.loop.draw_screen()
 
         else:
@@ -320,6 +515,16 @@ class App(object):
 
         self._setup_dirs()
 
+        if self.ansible_cfg_tuned:
+            self.log.info("ansible.cfg tuned for the run (original restored "
+                          "on exit)")
+
+        self.task_history = TaskHistory()
+
+        self.backup_store = BackupStore(
+            keep=self.cfg.defaults.backup_versions,
+            max_age_days=self.cfg.defaults.backup_max_age)
+
         self.plugin_mgr = PluginMgr(logger=self.log)
         self.log.info("{} plugin(s) "
                       "loaded".format(len(self.plugin_mgr.plugins)))
@@ -374,6 +579,10 @@ class App(object):
         self.right_pane = self.page[self.pagenum]
         self.msg_text = self.page[self.pagenum].hint
 
+        profiler = get_profiler()
+        if profiler:
+            profiler.page_shown(self.right_pane.title)
+
         self.msg = urwid.AttrMap(
                      urwid.Text(self.msg_text), 'message')
 
@@ -389,7 +598,17 @@ class App(object):
             self.log.info("running site_yml again to remove "
                           "the include_vars task for all.yml")
             mod = self.plugin_mgr.plugins['site_yml'].module
-            mod.plugin_main(config=self.cfg, mode='delete')
+            plugin_data = mod.plugin_main(config=self.cfg, mode='delete')
+            if plugin_data:
+                file_type, contents = plugin_data
+                self.transaction = CommitTransaction(backup=self.bkup_yml,
+                                                     logger=self.log)
+                self.write_yml(mod.yml_file, contents, file_type)
+                try:
+                    self.transaction.commit()
+                except CommitError as error:
+                    self.log.error("Unable to update {} : "
+                                   "{}".format(mod.yml_file, error))
 
         # if we have a _bak version of the ansible.cfg, restore it to it's
         # previous state
@@ -413,6 +632,42 @@ def setup_logging():
     return logger
 
 
+def manage_backups(opts):
+    """
+    List or restore file versions held in the backup store
+    :param opts: (argparse.Namespace) command line options
+    :return: (int) return code
+    """
+
+    store = BackupStore()
+
+    if opts.restore:
+        try:
+            version = store.restore(opts.restore, timestamp=opts.timestamp)
+        except BackupError as error:
+            print("-> {}".format(error))
+            return 4
+        print("{} restored from the backup taken at {}".format(
+            version['file'], time.ctime(version['timestamp'])))
+        return 0
+
+    for version in store.history():
+        print("{:<12d} {:<26s} {:<12s} {}".format(
+            version['timestamp'], time.ctime(version['timestamp']),
+            version['digest'][:12], version['file']))
+    return 0
+
+
+def serial_value(value):
+    """ argparse type for a serial (batch size) - a count or percentage """
+
+    number = value[:-1] if value.endswith('%') else value
+    if not number.isdigit() or int(number) < 1:
+        raise argparse.ArgumentTypeError("'{}' is not a host count or "
+                                         "percentage".format(value))
+    return value
+
+
 def parse_cli_options():
 
     modes = ['dev', 'prod']                     # 1st entry is the default!
@@ -436,6 +691,47 @@ def parse_cli_options():
                         default=12, choices=[10, 12],
                         help="ceph version to install")
 
+    parser.add_argument("--strategy", type=str, choices=STRATEGIES,
+                        help="ansible strategy for the OSD plays of the "
+                             "deploy (default is linear)")
+
+    parser.add_argument("--serial", type=serial_value,
+                        help="batch size for the OSD plays of the deploy, "
+                             "as a host count or percentage e.g. 10, 25%%")
+
+    parser.add_argument("--forks", type=int,
+                        help="number of hosts ansible works on in parallel "
+                             "(default is 100)")
+
+    parser.add_argument("--list-backups", action="store_true",
+                        help="list the backup versions of the files copilot "
+                             "has updated, then exit")
+
+    parser.add_argument("--restore", type=str, metavar="FILE",
+                        help="restore a file from the backup store, then exit")
+
+    parser.add_argument("--timestamp", type=int,
+                        help="backup version to restore (default is the "
+                             "latest)")
+
+    parser.add_argument("--record", type=str, metavar="DIR",
+                        help="record the probe and deploy playbook events "
+                             "to DIR, for replay")
+
+    parser.add_argument("--replay", type=str, metavar="DIR",
+                        help="replay recorded probe/deploy events from DIR "
+                             "instead of running the playbooks")
+
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="replay speed multiplier, 0 for no delay "
+                             "(default is 1)")
+
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the page actions and plugins, and "
+                             "time each page (output is written to "
+                             "{})".format(os.path.join(STATE_DIR,
+                                                       'profiles')))
+
     parser.add_argument('--version', action='version',
                         version='{} {}'.format(parser.prog,
                                                copilot_version))
@@ -448,6 +744,9 @@ if __name__ == "__main__":
 
     opts = parse_cli_options()
 
+    if opts.list_backups or opts.restore:
+        sys.exit(manage_backups(opts))
+
     # check that the cwd is /usr/share/ceph-ansible to pick up the correct
     # environment (cfg, plugins, actions etc)
     if os.getcwd() != CEPH_ANSIBLE_ROOT:
@@ -460,10 +759,31 @@ if __name__ == "__main__":
             print("-> playbook file not found. Is it fully qualified?")
             sys.exit(4)
 
+    if opts.replay and not os.path.isdir(opts.replay):
+        print("-> replay directory not found")
+        sys.exit(4)
+
+    if opts.record and not os.path.isdir(opts.record):
+        os.makedirs(opts.record)
+
+    if opts.profile:
+        enable_profiling(os.path.join(STATE_DIR, 'profiles',
+                                      time.strftime('%Y%m%d-%H%M%S')))
+
     copilot = App()
     copilot.setup()
-    copilot.loop.run()
-    copilot.cleanup()
+    try:
+        copilot.loop.run()
+        copilot.cleanup()
+    finally:
+        profiler = get_profiler()
+        if profiler:
+            profile_files = profiler.write()
+            copilot.log.info("Profile data written to "
+                             "{}".format(profiler.output_dir))
+            print("Profile data written to {}".format(profiler.output_dir))
+            for profile_file in profile_files:
+                print("- {}".format(os.path.basename(profile_file)))
 
     print("--- DEBUG STUFF ---")
     print("Config:")
@@ -3,10 +3,12 @@
 import os
 import platform
 
-from ceph_ansible_copilot.utils import valid_yaml
+from ceph_ansible_copilot.utils import YmlDocument, NetworkIndex
 
 description = "define the base variables"
 yml_file = '/usr/share/ceph-ansible/group_vars/all.yml'
+provides = ['all_yml']
+requires = ['network']
 
 
 def plugin_main(config=None):
@@ -14,12 +16,7 @@ def plugin_main(config=None):
     if not config:
         raise ValueError("Config object not received from caller")
 
-    yml = create_yml(config)
-
-    if valid_yaml(yml):
-        return ('yml', yml)
-    else:
-        raise SyntaxError("Invalid yml generated for {}".format(yml_file))
+    return ('yml', create_yml(config))
 
 
 def create_yml(config):
@@ -48,60 +45,59 @@ def create_yml(config):
         }
     }
 
-    out = list()
-    out.append('fetch_directory: ~/ceph-ansible-keys')
-    out.append('cluster: {}'.format(config.cluster_name))
-    out.append(' ')
+    out = YmlDocument()
+    out['fetch_directory'] = '~/ceph-ansible-keys'
+    out['cluster'] = config.cluster_name
+    out.blank()
 
     sw_src = config.sw_source
     ceph_repo = repo[sw_src]['repo']
 
-    out.append('ceph_origin: {}'.format(repo[sw_src]['type']))
+    out['ceph_origin'] = repo[sw_src]['type']
     if ceph_repo:
-        out.append('ceph_repository: {}'.format(ceph_repo))
+        out['ceph_repository'] = ceph_repo
         if ceph_repo == 'rhcs':
-            out.append('ceph_rhcs_version: '
-                       '{}'.format(ceph_to_rhcs[config.ceph_version]))
-            out.append('ceph_repository_type: cdn')
+            out['ceph_rhcs_version'] = ceph_to_rhcs[config.ceph_version]
+            out['ceph_repository_type'] = 'cdn'
         else:
             # community deployment
             if platform.dist()[0] in ['redhat']:
-                out.append('ceph_stable_redhat_distro: el7')
-                out.append('ceph_stable_release: '
-                           '{}'.format(ceph_name[config.ceph_version]))
-            else:
-                out.append('ceph_stable_release: '
-                           '{}'.format(ceph_name[config.ceph_version]))
+                out['ceph_stable_redhat_distro'] = 'el7'
+            out['ceph_stable_release'] = ceph_name[config.ceph_version]
+
+    out.blank()
+    out['osd_objectstore'] = config.osd_objectstore
+    out.blank()
 
-    out.append(' ')
-    out.append('osd_objectstore: {}'.format(config.osd_objectstore))
-    out.append(' ')
+    index = getattr(config, 'network_index', None)
+    if index is None:
+        index = NetworkIndex(config.hosts)
 
     mon_nic = get_common_nic('mon',
-                             config.hosts,
+                             index,
                              config.public_network)
 
-    out.append('monitor_interface: {}'.format(mon_nic))
-    out.append('public_network: {}'.format(config.public_network))
-    out.append('cluster_network: {}'.format(config.cluster_network))
-    out.append(' ')
-    out.append('# General ceph options')
-    out.append("generate_fsid: true")
-    out.append("cephx: true")
-    out.append(' ')
+    out['monitor_interface'] = mon_nic
+    out['public_network'] = config.public_network
+    out['cluster_network'] = config.cluster_network
+    out.blank()
+    out.comment('General ceph options')
+    out['generate_fsid'] = True
+    out['cephx'] = True
+    out.blank()
 
     rgws = get_hosts(config.hosts, 'rgw')
     if rgws:
         dns_tld = '.'.join(os.environ['HOSTNAME'].split('.')[1:])
-        out.append('# radosgw options')
-        out.append('radosgw_dns_name: {}'.format(dns_tld))
+        out.comment('radosgw options')
+        out['radosgw_dns_name'] = dns_tld
 
         # default to use the public network as the i/f for radosgw instance
         rgw_nic = get_common_nic('rgw',
-                                 config.hosts,
+                                 index,
                                  config.public_network)
-        out.append('radosgw_interface: {}'.format(rgw_nic))
-        out.append(' ')
+        out['radosgw_interface'] = rgw_nic
+        out.blank()
 
     return out
 
@@ -111,27 +107,18 @@ def get_hosts(host_data, host_type):
             if host_data[h].selected and host_type in host_data[h].roles]
 
 
-def get_common_nic(role, host_data, public_network):
+def get_common_nic(role, index, public_network):
 
     role_txt = '{}s'.format(role.upper())
-    nics_on_public = set()
-    host_group = get_hosts(host_data, role)
-    on_public = []
-
-    for h in host_group:
-        host = host_data[h]
-        for nic in host.nics.keys():
-            print("processing host {} nic {}".format(host, nic))
-            if host.nics[nic]['network'] == public_network:
-                nics_on_public.add(nic)
-                on_public.append(h)
-    print("nics on public {}".format(nics_on_public))
-    print("on public {}".format(on_public))
-    if len(on_public) != len(host_group):
+    host_group = index.host_mask(role=role, selected_only=True)
+
+    on_public = index.subnet_hosts.get(public_network, 0) & host_group
+    if on_public != host_group:
         raise EnvironmentError("{} must connect to the public "
                                "subnet ({})".format(role_txt,
                                                     public_network))
 
+    nics_on_public = index.nic_counts(public_network, mask=host_group)
     if len(nics_on_public) != 1:
         raise EnvironmentError("You have {} on a common subnet, but access it "
                                "using different NIC's - copilot uses a common "
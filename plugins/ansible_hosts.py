@@ -1,14 +1,17 @@
 #!/usr/bin/env python2
 
-from collections import OrderedDict
 import json
 
 from ansible.parsing.dataloader import DataLoader
 from ansible.inventory.manager import InventoryManager
 
+from ceph_ansible_copilot.ansible import CoPilotInventory
+
 
 description = 'Create /etc/ansible/hosts'
 yml_file = '/etc/ansible/hosts'
+provides = ['inventory']
+requires = ['used_roles']
 
 
 def plugin_main(config=None):
@@ -16,53 +19,22 @@ def plugin_main(config=None):
     if not config:
         raise ValueError("Config object not received from caller")
 
-    role_to_group = {
-        "mon": "mons",
-        "osd": "osds",
-        "rgw": "rgws",
-        "mds": "mdss"
-    }
-
-    groups = OrderedDict([
-        ("mons", []),
-        ("osds", []),
-        ("rgws", []),
-        ("mdss", [])
-    ])
-
-    # for host_name in sorted(config['hosts'].keys()):
-    #     host_obj = config['hosts'][host_name]
-    for host_name in sorted(config.hosts.keys()):
-        host_obj = config.hosts[host_name]
-        if host_obj.selected:
-            for role in host_obj.roles:
-                groups[role_to_group.get(role)].append(host_name)
-
-    return ('ini', format_groups(groups))
-
-
-def format_groups(groups):
-
-    def write_group(group_name, group_hosts):
-        grp = []
-        grp.append("[{}]".format(group_name))
-        for _h in group_hosts:
-            grp.append(_h)
-        grp.append(" ")
-        return grp
-
-    contents = []
-    for group in groups:
-        hosts = groups[group]
-        if hosts:
-            contents.extend(write_group(group, hosts))
-            if group == 'mons':
-                contents.extend(write_group('mgrs', hosts))
-
-    return contents
-
-
-def dump_hosts():
+    # the deploy uses this inventory directly, rather than parsing the file
+    config.ansible_inventory = CoPilotInventory(config.hosts)
+
+    return ('ini', config.ansible_inventory.ini_lines())
+
+
+def dump_hosts(inventory=None):
+    """
+    Show the hosts in each group
+    :param inventory: (CoPilotInventory) inventory to show - by default the
+                      inventory file is read
+    :return: (str) json of the group -> host names mapping
+    """
+
+    if inventory:
+        return json.dumps(inventory.to_dict(), indent=4)
 
     loader = DataLoader()
     inventory = InventoryManager(
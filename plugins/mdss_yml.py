@@ -1,11 +1,12 @@
 #!/usr/bin/env python2
 
 import os
-import shutil
 from ceph_ansible_copilot.utils import get_used_roles
 
 description = "use the existing mdss.yml, or create one from the sample"
 yml_file = '/usr/share/ceph-ansible/group_vars/mdss.yml'
+provides = ['mdss_yml']
+requires = ['used_roles']
 
 
 def plugin_main(config=None):
@@ -21,7 +22,9 @@ def plugin_main(config=None):
         # create a copy from the sample file
         sample = '{}.sample'.format(yml_file)
         if os.path.exists(sample):
-            shutil.copy2(sample, yml_file)
+            # staged with the rest of the plugin output
+            with open(sample, 'r') as f:
+                return ('raw', f.read())
         else:
             raise EnvironmentError("sample file for mdss.yml not found")
 
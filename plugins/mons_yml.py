@@ -1,12 +1,17 @@
 #!/usr/bin/env python2
 
 import os
-import shutil
+from collections import OrderedDict
 
-from ceph_ansible_copilot.utils import get_used_roles, valid_yaml, get_pgnum
+from ceph_ansible_copilot.utils import (get_used_roles, plan_cluster_pgs,
+                                        osd_tiers, pool_tiers,
+                                        crush_rule_name, YmlDocument)
 
-description = "use the existing mons.yml, or create one from the sample"
+description = ("use the existing mons.yml, or create one with crush rules "
+               "and cephfs pools")
 yml_file = '/usr/share/ceph-ansible/group_vars/mons.yml'
+provides = ['mons_yml']
+requires = ['used_roles', 'devices']
 
 
 def plugin_main(config=None):
@@ -17,41 +22,69 @@ def plugin_main(config=None):
     if not os.path.exists(yml_file):
 
         used_roles = get_used_roles(config)
-        if 'mds' in used_roles:
-            pgcount = get_pgnum(config)
-            yaml_data = create_yaml(pgcount)
-
-            if valid_yaml(yaml_data):
-                return ('yml', yaml_data)
+        tiers = osd_tiers(config)
+        if 'mds' in used_roles or len(tiers) > 1:
+            return ('yml', create_yaml(plan_cluster_pgs(config),
+                                       tiers,
+                                       'mds' in used_roles))
         else:
             # create a copy from the sample file
             sample = '{}.sample'.format(yml_file)
             if os.path.exists(sample):
-                shutil.copy2(sample, yml_file)
+                # staged with the rest of the plugin output
+                with open(sample, 'r') as f:
+                    return ('raw', f.read())
             else:
                 raise EnvironmentError("sample file for mons.yml not found")
 
     return None
 
 
-def create_yaml(pgcount):
+def create_yaml(pg_plan, tiers, cephfs=True):
+
+    placement = pool_tiers(pg_plan.keys(), tiers)
+
+    out = YmlDocument()
+    out['mon_group_name'] = 'mons'
+
+    if placement:
+        out.blank()
+        out.comment('crush rules for each class of OSD device')
+        out['crush_rule_config'] = True
+        for dev_class in sorted(tiers):
+            out['crush_rule_{}'.format(dev_class)] = OrderedDict([
+                ('name', crush_rule_name(dev_class)),
+                ('root', 'default'),
+                ('type', 'host'),
+                ('class', dev_class),
+                ('default', False)
+            ])
+        out['crush_rules'] = ['{{{{ crush_rule_{} }}}}'.format(dev_class)
+                              for dev_class in sorted(tiers)]
+        out.blank()
+
+    if cephfs:
+        out['cephfs'] = 'cephfs'
+        out['cephfs_data'] = 'cephfs_data'
+        out['cephfs_metadata'] = 'cephfs_metadata'
+        out['cephfs_pools'] = [
+            cephfs_pool('{{ cephfs_data }}', pg_plan['cephfs_data'],
+                        placement.get('cephfs_data')),
+            cephfs_pool('{{ cephfs_metadata }}', pg_plan['cephfs_metadata'],
+                        placement.get('cephfs_metadata'))
+        ]
+    out.blank()
 
-    num_cephfs_pools = 2
+    return out
 
-    out = list()
-    out.append("mon_group_name: mons")
-    out.append("cephfs: cephfs")
-    out.append("cephfs_data: cephfs_data")
-    out.append("cephfs_metadata: cephfs_metadata")
-    out.append("cephfs_pools:")
-    out.append('  - {{ name: "{{{{ cephfs_data }}}}", '
-               'pgs: {} }}'.format(int(pgcount/num_cephfs_pools)))
-    out.append('  - {{ name: "{{{{ cephfs_metadata }}}}", '
-               'pgs: {} }}'.format(int(pgcount/num_cephfs_pools)))
-    out.append(' ')
 
+def cephfs_pool(name, pgs, dev_class=None):
 
-    return out
+    pool = OrderedDict([('name', name),
+                        ('pgs', pgs)])
+    if dev_class:
+        pool['rule_name'] = crush_rule_name(dev_class)
+    return pool
 
 
 if __name__ == '__main__':
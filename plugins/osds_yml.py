@@ -1,9 +1,19 @@
 #!/usr/bin/env python2
 
-from ceph_ansible_copilot.utils import valid_yaml
+import os
+import glob
+import logging
+from collections import OrderedDict
+
+from ceph_ansible_copilot.utils import (YmlDocument, disk_class,
+                                        host_scenario, osd_devices,
+                                        allocate_journals, journal_report)
 
 description = "Create a osds.yml file to control osd creation"
 yml_file = '/usr/share/ceph-ansible/group_vars/osds.yml'
+host_vars_dir = '/usr/share/ceph-ansible/host_vars'
+provides = ['osds_yml']
+requires = ['devices']
 
 
 def plugin_main(config=None):
@@ -11,83 +21,172 @@ def plugin_main(config=None):
     if not config:
         raise ValueError("Config object not received from caller")
 
-    yml_data = create_yml(config)
+    layouts = group_layouts(config)
+
+    # the most common layout is defined in group_vars, the other layouts
+    # become per host overrides in host_vars
+    common, members = layouts[0] if layouts else (None, [])
+    output = [(yml_file, 'yml', create_yml(config, common, members))]
+
+    written = set()
+    for layout, hostnames in layouts[1:]:
+        for hostname in hostnames:
+            output.append((host_vars_file(hostname),
+                           'yml',
+                           create_host_yml(config, layout, hostname)))
+            written.add(hostname)
+
+    # an override copilot wrote on a previous run is reset, when its host
+    # now matches the common layout, is deselected or is no longer an osd
+    for filename in stale_host_vars(written):
+        out = YmlDocument()
+        out.comment('devices defined by group_vars/osds.yml')
+        output.append((filename, 'yml', out))
+
+    return output
+
+
+def host_vars_file(hostname):
+    return os.path.join(host_vars_dir, '{}.yml'.format(hostname))
+
+
+def stale_host_vars(written):
+    """
+    :param written: (set) host names given an override by this run
+    :return: (list) copilot's host_vars files for every other host
+    """
+
+    stale = list()
+    for filename in sorted(glob.glob(os.path.join(host_vars_dir, '*.yml'))):
+        hostname = os.path.splitext(os.path.basename(filename))[0]
+        if hostname not in written and copilot_file(filename):
+            stale.append(filename)
+
+    return stale
+
+
+def copilot_file(filename):
+    """ True if the file exists, and was written by copilot """
+
+    if not os.path.exists(filename):
+        return False
 
-    if valid_yaml(yml_data):
-        return ('yml', yml_data)
-    else:
-        raise SyntaxError("Invalid yml created in osds_yml.py plugin")
+    with open(filename, 'r') as f:
+        head = [f.readline() for _n in range(2)]
 
+    return any(line.startswith('# created by copilot') for line in head)
 
-def create_yml(config):
 
-    out = []
+def get_layout(host, osd_scenario):
+    """
+    Fingerprint of a host's device layout - hosts with the same fingerprint
+    can share the same devices definition
+    :param host: (Host) host object
+    :param osd_scenario: (str) collocated or non-collocated
+    :return: (tuple) the host's osd scenario, sorted data devices, and
+             sorted journal devices as (name, class, size) tuples
+    """
 
-    keys = ['osd_objectstore', 'osd_scenario', 'dmcrypt']
-    for config_key in keys:
-        out.append('{}: {}'.format(config_key,
-                                   getattr(config, config_key)))
-    out.append('')
+    devices, journal_devs = osd_devices(host, osd_scenario)
+    journals = tuple((dev,
+                      disk_class(host, dev),
+                      host.disks.get(dev, {}).get('size', 0))
+                     for dev in journal_devs)
+    return host_scenario(host, osd_scenario), tuple(devices), journals
 
-    devices = get_devs(config.hosts)
 
-    if devices:
-        out.append('# devices common to all osd hosts')
-        out.append("devices:")
-        for dev in sorted(devices):
-            out.append("  - /dev/{}".format(dev))
+def group_layouts(config):
+    """
+    Group the selected osd hosts by device layout, in a single pass
+    :param config: (object) config object containing host objects
+    :return: (list) of (layout, hostnames) tuples, largest group first
+    """
 
-        if config.osd_scenario == 'non-collocated':
-            journals = get_devs(config.hosts, dev_type='journal')
+    groups = OrderedDict()
+    for hostname in sorted(config.hosts):
+        host = config.hosts[hostname]
+        if not host.selected or 'osd' not in host.roles:
+            continue
+        layout = get_layout(host, config.osd_scenario)
+        if not layout[1]:
+            continue
+        groups.setdefault(layout, list()).append(hostname)
 
-            # Assumption is the main app validates the ssd count is correct
-            if journals:
-                out.append('dedicated_devices:')
-                tgt = len(devices)
-                done = False
-                for jrnl in sorted(list(journals)):
-                    if jrnl.startswith('nvme'):
-                        max_journals = 10
-                    else:
-                        max_journals = 5
-                    for _n in range(0, max_journals, 1):
-                        out.append("  - /dev/{}".format(jrnl))
-                        tgt -= 1
-                        if tgt == 0:
-                            done = True
-                            break
-                    if done:
-                        break
+    return sorted(groups.items(), key=lambda g: (-len(g[1]), g[1][0]))
 
-    out.append(' ')
+
+def create_yml(config, layout, hostnames=None):
+
+    out = YmlDocument()
+
+    # the scenario is part of the layout - an all-flash host is collocated,
+    # even in a cluster using hdds with journals
+    out['osd_objectstore'] = config.osd_objectstore
+    out['osd_scenario'] = layout[0] if layout else config.osd_scenario
+    out['dmcrypt'] = config.dmcrypt
+    out.blank()
+
+    if layout:
+        out.comment('devices common to most osd hosts, other layouts are '
+                    'defined in host_vars')
+        add_devices(out, config, layout, hostnames)
+
+    out.blank()
+
+    return out
+
+
+def create_host_yml(config, layout, hostname):
+
+    out = YmlDocument()
+    out.comment('device layout differs from group_vars/osds.yml')
+    out['osd_scenario'] = layout[0]
+    add_devices(out, config, layout, [hostname])
+    out.blank()
 
     return out
 
 
-def get_devs(host_data, dev_type='hdd'):
-    dev_lists = []
-    for h in host_data:
-        if dev_type == 'hdd':
-            dev_lists.append(set(host_data[h].hdd_list))
-        else:
-            dev_lists.append(set(host_data[h].ssd_list))
+def add_devices(out, config, layout, hostnames):
+
+    osd_scenario, devices, journals = layout
+    out['devices'] = ["/dev/{}".format(dev) for dev in devices]
 
-    return set.intersection(*dev_lists)
+    # Assumption is the main app validates the ssd count is correct
+    if osd_scenario == 'non-collocated' and journals:
+        journal_devs = {name: {"class": dev_class, "size": size}
+                        for name, dev_class, size in journals}
+        allocation = allocate_journals(devices, journal_devs)
+        out['dedicated_devices'] = ["/dev/{}".format(jrnl)
+                                    for jrnl in allocation]
+
+        logger = logging.getLogger('copilot')
+        out.comment('hdd:flash ratio by journal device')
+        for line in journal_report(allocation, journal_devs):
+            out.comment('  {}'.format(line))
+            logger.info("Journal allocation for {} ({} host(s)) : "
+                        "{}".format(hostnames[0], len(hostnames), line))
 
 
 def test():
-    hosts = {}
-    class Host(object):
-        pass
-    hosts['a'] = Host
-    hosts['b'] = Host
-    hosts['c'] = Host
 
-    hosts['a'].hdd_list = set(['a', 'b', 'c'])
-    hosts['b'].hdd_list = set(['a', 'b', 'c'])
-    hosts['c'].hdd_list = set(['a', 'b', 'c'])
+    class Config(object):
+        osd_scenario = 'collocated'
+        hosts = {}
 
-    print get_devs(hosts)
+    class Host(object):
+        selected = True
+        roles = ['osd']
+        ssd_list = []
+        disks = {}
+
+    for hostname, disks in [('a', ['sdb', 'sdc', 'sdd']),
+                            ('b', ['sdb', 'sdc', 'sdd']),
+                            ('c', ['sdb', 'sdc'])]:
+        Config.hosts[hostname] = Host()
+        Config.hosts[hostname].hdd_list = disks
+
+    print group_layouts(Config)
 
 
 if __name__ == '__main__':
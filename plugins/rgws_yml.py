@@ -1,11 +1,16 @@
 #!/usr/bin/env python2
 
 import os
-import shutil
-from ceph_ansible_copilot.utils import get_used_roles
+from collections import OrderedDict
 
-description = "use the existing rgws.yml, or create one from the sample"
+from ceph_ansible_copilot.utils import (get_used_roles, plan_cluster_pgs,
+                                        osd_tiers, pool_tiers,
+                                        crush_rule_name, YmlDocument)
+
+description = "use the existing rgws.yml, or create one with sized pools"
 yml_file = '/usr/share/ceph-ansible/group_vars/rgws.yml'
+provides = ['rgws_yml']
+requires = ['used_roles', 'devices']
 
 
 def plugin_main(config=None):
@@ -18,15 +23,31 @@ def plugin_main(config=None):
         return None
 
     if not os.path.exists(yml_file):
-        # create a copy from the sample file
-        sample = '{}.sample'.format(yml_file)
-        if os.path.exists(sample):
-            shutil.copy2(sample, yml_file)
-        else:
-            raise EnvironmentError("sample file for rgws.yml not found")
+        return ('yml', create_yml(plan_cluster_pgs(config),
+                                  osd_tiers(config)))
 
     return None
 
 
+def create_yml(pg_plan, tiers):
+
+    placement = pool_tiers(pg_plan.keys(), tiers)
+
+    out = YmlDocument()
+    out.comment('rgw pools, with pg counts from the cluster pg plan')
+    pools = OrderedDict()
+    for pool in pg_plan:
+        if not pool.startswith('default.rgw.'):
+            continue
+        pools[pool] = OrderedDict([('pg_num', pg_plan[pool])])
+        if pool in placement:
+            # crush rules are defined in mons.yml
+            pools[pool]['rule_name'] = crush_rule_name(placement[pool])
+    out['rgw_create_pools'] = pools
+    out.blank()
+
+    return out
+
+
 if __name__ == '__main__':
     pass
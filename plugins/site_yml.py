@@ -1,13 +1,15 @@
 #!/usr/bin/env python2
 
 import os
-import yaml
 from collections import OrderedDict
 
-from ceph_ansible_copilot.utils import get_used_roles
+from ceph_ansible_copilot.utils import (get_used_roles, ordered_load,
+                                        ordered_dump)
 
 description = "use the existing site.yml, or create one from the sample"
 yml_file = '/usr/share/ceph-ansible/site.yml'
+provides = ['site_yml']
+requires = ['used_roles']
 
 # The sample file includes a host entry for each role, but if the role isn't
 # supported by copilot, the playbook generates warning messages that disrupt
@@ -17,33 +19,6 @@ yml_file = '/usr/share/ceph-ansible/site.yml'
 # adds a task to use include_vars to ensure all.yml is included in the play.
 
 
-def ordered_load(stream, Loader=yaml.Loader, object_pairs_hook=OrderedDict):
-
-    class OrderedLoader(Loader):
-        pass
-
-    def construct_mapping(loader, node):
-        loader.flatten_mapping(node)
-        return object_pairs_hook(loader.construct_pairs(node))
-    OrderedLoader.add_constructor(
-        yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-        construct_mapping)
-    return yaml.load(stream, OrderedLoader)
-
-
-def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
-
-    class OrderedDumper(Dumper):
-        pass
-
-    def _dict_representer(dumper, data):
-        return dumper.represent_mapping(
-            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-            data.items())
-    OrderedDumper.add_representer(OrderedDict, _dict_representer)
-    return yaml.dump(data, stream, OrderedDumper, **kwds)
-
-
 def plugin_main(config=None, mode='add'):
 
     if not config:
@@ -64,7 +39,7 @@ def plugin_main(config=None, mode='add'):
             updated_yaml = process_yaml(yml_data, used_roles)
             updated_yaml = manage_all_yml(updated_yaml, mode=mode)
 
-            write_yaml(yml_file, updated_yaml)
+            return ('raw', dump_yaml(updated_yaml))
         else:
             raise EnvironmentError("sample file for site.yml not found")
     else:
@@ -73,7 +48,7 @@ def plugin_main(config=None, mode='add'):
         yaml_data = load_yaml(yml_file)
         updated_yaml_data = manage_all_yml(yaml_data, mode=mode)
         if updated_yaml_data:
-            write_yaml(yml_file, updated_yaml_data)
+            return ('raw', dump_yaml(updated_yaml_data))
 
     return None
 
@@ -103,7 +78,7 @@ def manage_all_yml(yaml_data, mode):
 
 def load_yaml(yml_filename):
     with open(yml_filename, "r") as stream:
-        yaml_data = ordered_load(stream, yaml.SafeLoader)
+        yaml_data = ordered_load(stream)
 
     return yaml_data
 
@@ -143,16 +118,14 @@ def process_yaml(yaml_data, used_roles):
     return [item for item in yaml_data if not item.get('deleteme')]
 
 
-def write_yaml(yaml_file, yaml_data):
+def dump_yaml(yaml_data):
+    """ site.yml content - the caller stages it in the commit transaction """
 
-    with open(yaml_file, "w", 0) as out:
-        ordered_dump(yaml_data,
-                     Dumper=yaml.SafeDumper,
-                     stream=out,
-                     default_flow_style=False,
-                     explicit_start=True)
+    return ordered_dump(yaml_data,
+                        default_flow_style=False,
+                        explicit_start=True)
 
 
 if __name__ == '__main__':
-    plugin_main(config=['mon', 'osd', 'rgw', 'mds'])
+    print(plugin_main(config=['mon', 'osd', 'rgw', 'mds']))
 
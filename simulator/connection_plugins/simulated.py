@@ -0,0 +1,127 @@
+# Ansible connection plugin for the copilot fleet simulator. Nothing is
+# executed - modules are always pipelined, so the module payload arrives in
+# exec_command, and a canned result is returned in its place. The setup
+# module returns the facts generated for the host in the fleet manifest
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    connection: simulated
+    short_description: answer tasks for a simulated copilot fleet
+    description:
+        - Returns generated facts for the setup module, and an unchanged
+          result for every other module, without running anything.
+        - The fleet manifest is read from the file named by the
+          COPILOT_SIM_MANIFEST environment variable.
+    author: ceph-ansible-copilot
+    version_added: "2.4"
+'''
+
+import os
+import re
+import json
+import time
+
+from ansible.errors import AnsibleConnectionFailure, AnsibleError
+from ansible.plugins.connection import ConnectionBase
+
+MANIFEST_ENV = 'COPILOT_SIM_MANIFEST'
+
+MODULE_NAME = re.compile(r'ansible_module_(\w+)\.py')
+BECOME_MARKER = re.compile(r'BECOME-SUCCESS-\w+')
+
+_manifest = None
+
+
+def load_manifest():
+    """ the fleet manifest, read once per worker process """
+
+    global _manifest
+    if _manifest is None:
+        manifest_file = os.environ.get(MANIFEST_ENV)
+        if not manifest_file or not os.path.exists(manifest_file):
+            raise AnsibleError("simulated connection needs a fleet manifest "
+                               "- set {}".format(MANIFEST_ENV))
+        with open(manifest_file, 'r') as f:
+            _manifest = json.load(f)
+    return _manifest
+
+
+class Connection(ConnectionBase):
+    ''' Simulated connection '''
+
+    transport = 'simulated'
+    has_pipelining = True
+    # new style modules are sent through exec_command, so there's no remote
+    # tmp dir to create, and no files to transfer
+    always_pipeline_modules = True
+
+    def __init__(self, *args, **kwargs):
+        super(Connection, self).__init__(*args, **kwargs)
+        self.sim_host = None
+
+    def _connect(self):
+
+        if self._connected:
+            return self
+
+        address = self._play_context.remote_addr
+        sim_host = load_manifest().get(address)
+        if sim_host is None:
+            raise AnsibleConnectionFailure("{} is not part of the simulated "
+                                           "fleet".format(address))
+
+        time.sleep(sim_host['latency'])
+        if sim_host['state'] == 'down':
+            raise AnsibleConnectionFailure(
+                "ssh: connect to host {} port 22: "
+                "Connection refused".format(address))
+        elif sim_host['state'] == 'timeout':
+            raise AnsibleConnectionFailure(
+                "ssh: connect to host {} port 22: "
+                "Connection timed out".format(address))
+        elif sim_host['state'] == 'authfail':
+            raise AnsibleConnectionFailure("Permission denied (publickey,"
+                                           "password).")
+
+        self.sim_host = sim_host
+        self._connected = True
+        return self
+
+    def exec_command(self, cmd, in_data=None, sudoable=True):
+
+        super(Connection, self).exec_command(cmd, in_data=in_data,
+                                             sudoable=sudoable)
+
+        time.sleep(self.sim_host['latency'])
+
+        # a become wrapper echoes a marker before running the module, which
+        # the action plugin expects to strip from the output
+        marker = BECOME_MARKER.search(cmd)
+        prefix = marker.group(0) + '\n' if marker else ''
+
+        if not in_data:
+            # housekeeping commands (tmp dirs, python discovery)
+            return 0, prefix, ''
+
+        module = MODULE_NAME.search(in_data)
+        if module and module.group(1) == 'setup':
+            result = {"ansible_facts": self.sim_host['facts'],
+                      "changed": False}
+        else:
+            result = {"changed": False,
+                      "rc": 0,
+                      "stdout": "",
+                      "stderr": "",
+                      "simulated": True}
+
+        return 0, prefix + json.dumps(result), ''
+
+    def put_file(self, in_path, out_path):
+        super(Connection, self).put_file(in_path, out_path)
+
+    def fetch_file(self, in_path, out_path):
+        super(Connection, self).fetch_file(in_path, out_path)
+
+    def close(self):
+        self._connected = False
@@ -0,0 +1,351 @@
+#!/usr/bin/env python2
+
+# A fleet of simulated ssh servers, one per loopback address (127.x.y.z all
+# route to lo on linux, so no interface aliases need to be created). A
+# single epoll loop accepts connections for every host, and each accepted
+# connection is served by a paramiko Transport
+
+import json
+import time
+import errno
+import random
+import select
+import socket
+import logging
+import threading
+
+import paramiko
+from paramiko import ServerInterface
+from paramiko.common import (AUTH_SUCCESSFUL, AUTH_FAILED,
+                             OPEN_SUCCEEDED,
+                             OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED)
+
+logger = logging.getLogger('copilot.simulator')
+logging.getLogger('copilot.simulator.transport').setLevel(logging.CRITICAL)
+
+HOST_STATES = ['ok', 'authfail', 'timeout', 'down']
+
+# sudo's answer to a command run without a tty, when requiretty is set
+REQUIRETTY_MSG = "sudo: sorry, you must have a tty to run sudo\n"
+
+
+class SimHost(object):
+    """ state of one simulated host """
+
+    def __init__(self, address, state, latency=0.0, requiretty=False):
+        self.address = address
+        self.state = state              # one of HOST_STATES
+        self.latency = latency          # seconds added to each response
+        self.requiretty = requiretty    # sudo insists on a tty
+        self.authorized_keys = list()
+        self.lock = threading.Lock()
+
+    def key_authorized(self, key):
+        with self.lock:
+            if self.state == 'ok':
+                return True
+            return key.get_base64() in ' '.join(self.authorized_keys)
+
+    def add_key(self, key_line):
+        with self.lock:
+            self.authorized_keys.append(key_line.strip())
+
+    @property
+    def ansible_state(self):
+        """ state seen by ansible - a copied key fixes an auth failure """
+        if self.state == 'authfail' and self.authorized_keys:
+            return 'ok'
+        return self.state
+
+
+class SimServer(ServerInterface):
+    """ paramiko server behaviour for a simulated host """
+
+    def __init__(self, host, password):
+        self.host = host
+        self.password = password
+        self.exec_threads = list()
+
+    def get_allowed_auths(self, username):
+        return 'publickey,password'
+
+    def check_auth_publickey(self, username, key):
+        time.sleep(self.host.latency)
+        if self.host.key_authorized(key):
+            return AUTH_SUCCESSFUL
+        return AUTH_FAILED
+
+    def check_auth_password(self, username, password):
+        time.sleep(self.host.latency)
+        if password == self.password:
+            return AUTH_SUCCESSFUL
+        return AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return OPEN_SUCCEEDED
+        return OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        t = threading.Thread(target=self._exec, args=(channel, command))
+        t.daemon = True
+        t.start()
+        self.exec_threads.append(t)
+        return True
+
+    def run_command(self, command):
+        """
+        Just enough of a shell for the commands SSHsession sends - reading,
+        creating and appending to authorized_keys, and the sudo requiretty
+        probe
+        :param command: (str) command line
+        :return: (tuple) stdout, stderr, exit status
+        """
+
+        command = command.strip()
+        if command.startswith('cat '):
+            if not self.host.authorized_keys:
+                return '', 'cat: {}: No such file or directory\n'.format(
+                    command[len('cat '):]), 1
+            return '\n'.join(self.host.authorized_keys) + '\n', '', 0
+        elif command.startswith('echo -e '):
+            # the key is stored straight away, since the client may close
+            # the session without waiting for the command to finish
+            key_line = command[len('echo -e '):].rsplit('>', 1)[0]
+            self.host.add_key(key_line.rstrip('>').strip())
+            return '', '', 0
+        elif command.startswith('install '):
+            return '', '', 0
+        elif command == 'sudo -n true':
+            if self.host.requiretty:
+                return '', REQUIRETTY_MSG, 1
+            return '', '', 0
+
+        return '', 'sh: {}: command not found\n'.format(
+            command.split(' ', 1)[0]), 127
+
+    def _exec(self, channel, command):
+
+        stdout, stderr, status = self.run_command(command)
+
+        time.sleep(self.host.latency)
+        try:
+            if stdout:
+                channel.sendall(stdout)
+            if stderr:
+                channel.sendall_stderr(stderr)
+            channel.send_exit_status(status)
+            # end the output with an eof, and leave the close to the client.
+            # Closing here can overtake the server's reply to the exec
+            # request, and the client then sees 'Channel closed'
+            channel.shutdown_write()
+        except (EOFError, socket.error, paramiko.SSHException):
+            pass
+
+
+class SimulatedFleet(object):
+    """
+    Start ssh endpoints for a number of hosts
+    """
+
+    def __init__(self, num_hosts, base_address='127.1.0.1', port=2222,
+                 latency=0.0, auth_fail_rate=0.0, timeout_rate=0.0,
+                 down_rate=0.0, requiretty_rate=0.0, password='simulated',
+                 seed=0):
+        """
+        :param num_hosts: (int) number of hosts to simulate
+        :param base_address: (str) first loopback address to use
+        :param port: (int) port each host listens on
+        :param latency: (float) seconds added to each auth/exec response
+        :param auth_fail_rate: (float) share of hosts without our public key
+                               (they accept the password, so the key can be
+                               copied)
+        :param timeout_rate: (float) share of hosts whose ssh connect times
+                             out
+        :param down_rate: (float) share of hosts that refuse connections, and
+                          are unreachable for ansible
+        :param requiretty_rate: (float) share of hosts whose sudo requires a
+                                tty
+        :param password: (str) root password of the hosts
+        :param seed: (int) random seed, so a fleet is repeatable
+        """
+
+        self.port = port
+        self.password = password
+        self.host_key = paramiko.RSAKey.generate(2048)
+
+        rnd = random.Random(seed)
+        first = ip_to_int(base_address)
+
+        # each rate becomes an exact number of hosts, picked by the seed, so
+        # a small fleet still has the problems asked for
+        states = ['ok'] * num_hosts
+        order = range(num_hosts)
+        rnd.shuffle(order)
+        for state, rate in [('down', down_rate),
+                            ('timeout', timeout_rate),
+                            ('authfail', auth_fail_rate)]:
+            for idx in order[:share(rate, num_hosts)]:
+                states[idx] = state
+            order = order[share(rate, num_hosts):]
+
+        tty_hosts = set(rnd.sample(range(num_hosts),
+                                   share(requiretty_rate, num_hosts)))
+
+        self.hosts = dict()
+        for idx in range(num_hosts):
+            address = int_to_ip(first + idx)
+            self.hosts[address] = SimHost(address, states[idx], latency,
+                                          requiretty=idx in tty_hosts)
+
+        self.listeners = dict()         # fd -> (socket, SimHost)
+        self.backlog_fillers = list()
+        self.epoll = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def addresses(self):
+        return sorted(self.hosts, key=ip_to_int)
+
+    def start(self):
+
+        self.epoll = select.epoll()
+
+        for address in self.addresses:
+            host = self.hosts[address]
+            if host.state == 'down':
+                # nothing listening - connection refused
+                continue
+
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((address, self.port))
+
+            if host.state == 'timeout':
+                # a full accept queue means new SYNs are dropped, so clients
+                # see their connect attempt time out
+                sock.listen(0)
+                self._fill_backlog(address)
+                self.listeners[sock.fileno()] = (sock, host)
+                continue
+
+            sock.listen(128)
+            sock.setblocking(0)
+            self.listeners[sock.fileno()] = (sock, host)
+            self.epoll.register(sock.fileno(), select.EPOLLIN)
+
+        self._thread = threading.Thread(target=self._accept_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+        logger.info("Fleet of {} hosts started on port {}".format(
+            len(self.hosts), self.port))
+
+    def _fill_backlog(self, address):
+
+        for _n in range(2):
+            filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            filler.setblocking(0)
+            try:
+                filler.connect((address, self.port))
+            except socket.error as error:
+                if error.errno != errno.EINPROGRESS:
+                    raise
+            self.backlog_fillers.append(filler)
+
+    def _accept_loop(self):
+
+        while not self._stop.is_set():
+            try:
+                events = self.epoll.poll(0.5)
+            except IOError as error:
+                # interrupted by a signal e.g. SIGCHLD from ansible's workers
+                if error.errno == errno.EINTR:
+                    continue
+                raise
+
+            for fd, _event in events:
+                sock, host = self.listeners[fd]
+                try:
+                    conn, _addr = sock.accept()
+                except socket.error as error:
+                    if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        continue
+                    raise
+                conn.setblocking(1)
+                t = threading.Thread(target=self._serve, args=(conn, host))
+                t.daemon = True
+                t.start()
+
+    def _serve(self, conn, host):
+
+        transport = paramiko.Transport(conn)
+        # clients drop the connection after a failed auth, which paramiko
+        # logs as an error - expected here, so that logger is kept quiet
+        transport.set_log_channel('copilot.simulator.transport')
+        transport.add_server_key(self.host_key)
+        try:
+            transport.start_server(server=SimServer(host, self.password))
+            # keep the transport open until the client has finished
+            while transport.is_active() and not self._stop.is_set():
+                time.sleep(0.1)
+        except (paramiko.SSHException, EOFError, socket.error):
+            pass
+        finally:
+            transport.close()
+
+    def stop(self):
+
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        for sock, _host in self.listeners.values():
+            sock.close()
+        for filler in self.backlog_fillers:
+            filler.close()
+        if self.epoll:
+            self.epoll.close()
+
+    def summary(self):
+        counts = dict((state, 0) for state in HOST_STATES)
+        for host in self.hosts.values():
+            counts[host.state] += 1
+        return counts
+
+    def write_manifest(self, filename, facts):
+        """
+        Write the fleet description used by the simulated ansible connection
+        :param filename: (str) json file to create
+        :param facts: (dict) address -> setup facts
+        :return: None
+        """
+
+        manifest = dict()
+        for address, host in self.hosts.items():
+            manifest[address] = {
+                "state": host.ansible_state,
+                "latency": host.latency,
+                "facts": facts.get(address, {})
+            }
+
+        with open(filename, 'w') as f:
+            json.dump(manifest, f)
+
+
+def share(rate, num_hosts):
+    """ number of hosts for a rate, at least one for a non-zero rate """
+
+    if rate <= 0:
+        return 0
+    return min(num_hosts, max(1, int(round(rate * num_hosts))))
+
+
+def ip_to_int(address):
+    return reduce(lambda n, octet: (n << 8) + int(octet),
+                  address.split('.'), 0)
+
+
+def int_to_ip(value):
+    return '.'.join(str((value >> shift) & 0xff)
+                    for shift in (24, 16, 8, 0))
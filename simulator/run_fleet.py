@@ -0,0 +1,251 @@
+#!/usr/bin/env python2
+
+# Run copilot's ssh setup, host probe and deployment against a simulated
+# fleet on this machine - ssh endpoints on loopback addresses, and an ansible
+# connection plugin that answers tasks with generated facts. As in the
+# wizard, the playbooks are given an in memory inventory of the reachable
+# hosts (CoPilotInventory) - no inventory file is written
+#
+# usage: python simulator/run_fleet.py [--hosts 1000] [--latency 0.05]
+#                                      [--auth-fail-rate 0.1]
+#                                      [--timeout-rate 0.01]
+#                                      [--down-rate 0.01]
+#                                      [--requiretty-rate 0.05]
+#                                      [--forks 20]
+#
+# Like copilot, this expects to run as root (the ssh key in ~root/.ssh is
+# used, and created when missing)
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import threading
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SIM_DIR, '..'))
+sys.path.insert(0, os.path.join(SIM_DIR, '..', 'benchmarks'))
+
+from ansible.plugins.loader import connection_loader
+
+from ceph_ansible_copilot import Host
+from ceph_ansible_copilot.ansible import (ResultCallback, DynamicPlaybook,
+                                          StaticPlaybook, CoPilotPlayBook,
+                                          CoPilotInventory)
+from ceph_ansible_copilot.ui import UI_Host_Validation
+from ceph_ansible_copilot.utils import SSHsession, SSHConfig
+
+from facts import generate_facts
+from fleet import SimulatedFleet, HOST_STATES
+
+PLUGIN_DIR = os.path.join(SIM_DIR, 'connection_plugins')
+MANIFEST_ENV = 'COPILOT_SIM_MANIFEST'
+
+
+def raise_file_limit():
+    """ every simulated host holds a listening socket, plus a socket per
+        connection, so the default 1024 descriptors is not enough """
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def ssh_phase(hosts, password):
+    """ passwordless ssh setup, a thread per host like the credentials page """
+
+    for host in hosts.values():
+        host.ssh.password = password
+
+    start = time.time()
+    threads = []
+    for address in sorted(hosts):
+        _t = threading.Thread(target=hosts[address].ssh.setup)
+        _t.start()
+        threads.append(_t)
+
+    for _t in threads:
+        _t.join()
+    elapsed = time.time() - start
+
+    status = dict()
+    for host in hosts.values():
+        status[host.ssh.shortmsg] = status.get(host.ssh.shortmsg, 0) + 1
+
+    return elapsed, status
+
+
+def playbook_stats(callback, elapsed):
+    stats = dict(callback.stats['task_state'])
+    stats['elapsed'] = elapsed
+    stats['failed_hosts'] = len(callback.stats['failures'])
+    return stats
+
+
+def probe_phase(hosts, logger, forks):
+    """ run the host validation probe, and seed the hosts from the facts """
+
+    probe_callback = ResultCallback(logger=logger)
+    probe_playbook = DynamicPlaybook(host_list=CoPilotInventory(hosts),
+                                     callback=probe_callback,
+                                     forks=forks)
+    probe_playbook.setup(pb_name='Probe Hosts',
+                         pb_tasks=UI_Host_Validation.pb_tasks)
+
+    start = time.time()
+    probe_playbook.run()
+
+    for address in probe_callback.stats['successes']:
+        hosts[address].seed(probe_callback.stats['successes'][address])
+        hosts[address].check()
+    elapsed = time.time() - start
+
+    return playbook_stats(probe_callback, elapsed)
+
+
+def deploy_phase(hosts, playbook, logger, forks):
+
+    deploy_callback = ResultCallback(logger=logger)
+    deploy_pb = StaticPlaybook(host_list=CoPilotInventory(hosts),
+                               callback=deploy_callback,
+                               forks=forks)
+    deploy_pb.setup(pb_file=playbook)
+
+    start = time.time()
+    deploy_pb.run()
+    elapsed = time.time() - start
+
+    return playbook_stats(deploy_callback, elapsed)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="copilot fleet simulator")
+    parser.add_argument("--hosts", type=int, default=1000,
+                        help="number of hosts to simulate")
+    parser.add_argument("--base-address", type=str, default="127.1.0.1",
+                        help="first loopback address of the fleet")
+    parser.add_argument("--port", type=int, default=2222,
+                        help="ssh port the simulated hosts listen on")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to each ssh/ansible response")
+    parser.add_argument("--auth-fail-rate", type=float, default=0.0,
+                        help="share of hosts that need their key copied")
+    parser.add_argument("--timeout-rate", type=float, default=0.0,
+                        help="share of hosts whose ssh connect times out")
+    parser.add_argument("--down-rate", type=float, default=0.0,
+                        help="share of hosts that are offline")
+    parser.add_argument("--requiretty-rate", type=float, default=0.0,
+                        help="share of hosts whose sudo requires a tty")
+    # each ansible worker is a fork of this process, which holds the whole
+    # fleet, so the workers are much larger than copilot's own
+    parser.add_argument("--forks", type=int, default=20,
+                        help="parallel ansible processes for the playbooks")
+    parser.add_argument("--playbook", type=str,
+                        default=os.path.join(SIM_DIR, 'playbooks',
+                                             'sim_site.yml'),
+                        help="playbook run in the deploy phase")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed for the fleet and its facts")
+    parser.add_argument("--output", type=str,
+                        help="write the results as json to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger('copilot')
+
+    raise_file_limit()
+    SSHConfig()                     # creates the local key if needed
+
+    fleet = SimulatedFleet(args.hosts,
+                           base_address=args.base_address,
+                           port=args.port,
+                           latency=args.latency,
+                           auth_fail_rate=args.auth_fail_rate,
+                           timeout_rate=args.timeout_rate,
+                           down_rate=args.down_rate,
+                           requiretty_rate=args.requiretty_rate,
+                           seed=args.seed)
+
+    # generated hosts are matched to the fleet's addresses in order
+    generated = generate_facts(args.hosts, seed=args.seed)
+    hosts = dict()
+    facts = dict()
+    for idx, address in enumerate(fleet.addresses):
+        host_facts, roles = generated["sim-{}".format(idx)]
+        hosts[address] = Host(address, roles)
+        facts[address] = host_facts['ansible_facts']
+
+    work_dir = tempfile.mkdtemp(prefix='copilot-sim-')
+    manifest = os.path.join(work_dir, 'fleet.json')
+    os.environ[MANIFEST_ENV] = manifest
+    # the fleet's host keys are kept out of the user's known_hosts
+    known_hosts = os.path.join(work_dir, 'known_hosts')
+    open(known_hosts, 'w').close()
+
+    connection_loader.add_directory(PLUGIN_DIR)
+
+    report = {
+        "hosts": args.hosts,
+        "latency": args.latency,
+        "fleet": fleet.summary()
+    }
+
+    fleet.start()
+
+    # point copilot at the fleet, for the duration of the run
+    ssh_port = SSHsession.ssh_port
+    user_known_hosts = SSHsession.known_hosts
+    connection = CoPilotPlayBook.connection
+    SSHsession.ssh_port = args.port
+    SSHsession.known_hosts = known_hosts
+    CoPilotPlayBook.connection = 'simulated'
+    try:
+        print("Fleet of {} hosts: {}".format(
+            args.hosts, ', '.join("{} {}".format(report['fleet'][state], state)
+                                  for state in HOST_STATES)))
+
+        elapsed, status = ssh_phase(hosts, fleet.password)
+        report['ssh'] = {"elapsed": elapsed, "status": status}
+        print("ssh setup      {:>8.2f}s  {}".format(
+            elapsed, ', '.join("{} {}".format(count, code)
+                               for code, count in sorted(status.items()))))
+
+        # the manifest reflects the keys copied during the ssh setup
+        fleet.write_manifest(manifest, facts)
+
+        reachable = dict((address, host) for address, host in hosts.items()
+                         if host.ssh.ok)
+
+        report['probe'] = probe_phase(reachable, logger, args.forks)
+        print("host probe     {:>8.2f}s  {} ok, {} unreachable".format(
+            report['probe']['elapsed'], report['probe']['success'],
+            report['probe']['unreachable']))
+
+        report['deploy'] = deploy_phase(reachable, args.playbook, logger,
+                                        args.forks)
+        print("deploy         {:>8.2f}s  {} ok, {} failed, {} unreachable"
+              "".format(report['deploy']['elapsed'],
+                        report['deploy']['success'],
+                        report['deploy']['failed'],
+                        report['deploy']['unreachable']))
+    finally:
+        SSHsession.ssh_port = ssh_port
+        SSHsession.known_hosts = user_known_hosts
+        CoPilotPlayBook.connection = connection
+        fleet.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("Results written to {}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import unittest
+import sys
+
+sys.path.insert(0, '../')
+
+from ceph_ansible_copilot import Host
+from ceph_ansible_copilot.utils import (allocate_journals, journal_report,
+                                        osd_media_mbps)
+
+
+class JournalChecks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("JournalChecks")
+        cls.hdds = ['sd{}'.format(c) for c in 'bcdefghijklm']
+
+    def test_equal_ssds_balanced(self):
+        """Identical SSDs share the hdds evenly"""
+        journals = {
+            "sdn": {"class": "ssd", "size": 480 * 1024**3},
+            "sdo": {"class": "ssd", "size": 480 * 1024**3}
+        }
+        allocation = allocate_journals(self.hdds, journals)
+        self.assertEqual(len(allocation), len(self.hdds))
+        self.assertEqual(allocation.count('sdn'), allocation.count('sdo'))
+
+    def test_nvme_preferred(self):
+        """An NVMe device takes more hdds than a SATA SSD"""
+        journals = {
+            "nvme0n1": {"class": "nvme", "size": 800 * 1024**3},
+            "sdn": {"class": "ssd", "size": 800 * 1024**3}
+        }
+        allocation = allocate_journals(self.hdds, journals)
+        self.assertGreater(allocation.count('nvme0n1'),
+                           allocation.count('sdn'))
+
+    def test_capacity_weighting(self):
+        """A larger device of the same class takes more hdds"""
+        journals = {
+            "sdn": {"class": "ssd", "size": 960 * 1024**3},
+            "sdo": {"class": "ssd", "size": 240 * 1024**3}
+        }
+        allocation = allocate_journals(self.hdds, journals)
+        self.assertGreater(allocation.count('sdn'), allocation.count('sdo'))
+
+    def test_ratio_report(self):
+        """Report flags a journal device serving too many hdds"""
+        journals = {"sdn": {"class": "ssd", "size": 480 * 1024**3}}
+        allocation = allocate_journals(self.hdds, journals)
+        report = journal_report(allocation, journals)
+        self.assertEqual(len(report), 1)
+        self.assertIn('12:1', report[0])
+        self.assertIn('exceeds', report[0])
+
+    def shortDescription(self):
+        return None
+
+    def __str__(self):
+        return "(%s) : %s" % (self._testMethodName,
+                              self._testMethodDoc)
+
+
+class MediaChecks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("MediaChecks")
+        cls.host = Host('svr1', ['osd'])
+        cls.host.hdd_list = ['sdb', 'sdc', 'sdd', 'sde']
+        cls.host.hdd_count = 4
+        cls.host.ssd_list = ['sdf', 'nvme0n1']
+        cls.host.ssd_count = 2
+
+    def test_journals_not_counted(self):
+        """Flash journals in front of the hdds are not OSD media"""
+        self.assertEqual(osd_media_mbps(self.host, 'non-collocated'), 400)
+
+    def test_collocated_flash_counted(self):
+        """Collocated flash devices are OSDs alongside the hdds"""
+        self.assertEqual(osd_media_mbps(self.host, 'collocated'), 2850)
+
+    def shortDescription(self):
+        return None
+
+    def __str__(self):
+        return "(%s) : %s" % (self._testMethodName,
+                              self._testMethodDoc)
+
+
+if __name__ == '__main__':
+
+    journal_suite = unittest.TestLoader().loadTestsFromTestCase(JournalChecks)
+    unittest.TextTestRunner(verbosity=2).run(journal_suite)
+
+    media_suite = unittest.TestLoader().loadTestsFromTestCase(MediaChecks)
+    unittest.TextTestRunner(verbosity=2).run(media_suite)
@@ -0,0 +1,55 @@
+
+import unittest
+import sys
+
+sys.path.insert(0, '../')
+
+from ceph_ansible_copilot.utils import compress_hosts
+
+
+class InventoryChecks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("InventoryChecks")
+
+    def test_range(self):
+        """Consecutive hosts are written as a range"""
+        hosts = ["osd-{}".format(n) for n in range(1, 6)]
+        self.assertEqual(compress_hosts(hosts), ["osd-[1:5]"])
+
+    def test_zero_padding(self):
+        """Zero padded names keep their padding in the range"""
+        hosts = ["osd-{:02d}".format(n) for n in range(1, 13)]
+        self.assertEqual(compress_hosts(hosts), ["osd-[01:12]"])
+
+    def test_gaps_and_short_runs(self):
+        """Gaps split the range, and short runs stay as host names"""
+        hosts = ["osd-1", "osd-2", "osd-3", "osd-5", "osd-7", "osd-8"]
+        self.assertEqual(compress_hosts(hosts),
+                         ["osd-[1:3]", "osd-5", "osd-7", "osd-8"])
+
+    def test_suffix_and_names(self):
+        """Names with a domain, or without a number, are handled"""
+        hosts = ["rgw1.lab", "rgw2.lab", "rgw3.lab", "admin"]
+        self.assertEqual(compress_hosts(hosts), ["admin", "rgw[1:3].lab"])
+
+    def test_digit_widths(self):
+        """Numbers only share a range with numbers of the same width"""
+        hosts = ["mon{}".format(n) for n in range(8, 13)]
+        self.assertEqual(compress_hosts(hosts), ["mon8", "mon9",
+                                                 "mon[10:12]"])
+
+    def shortDescription(self):
+        return None
+
+    def __str__(self):
+        return "(%s) : %s" % (self._testMethodName,
+                              self._testMethodDoc)
+
+
+if __name__ == '__main__':
+
+    inventory_suite = unittest.TestLoader().loadTestsFromTestCase(
+        InventoryChecks)
+    unittest.TextTestRunner(verbosity=2).run(inventory_suite)
@@ -0,0 +1,51 @@
+import unittest
+import sys
+
+sys.path.insert(0, '../')
+
+from ceph_ansible_copilot.utils import (plan_pgs, pgs_per_osd,
+                                        nearest_power_of_two)
+
+
+class PGPlanChecks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("PGPlanChecks")
+        cls.cephfs = [("cephfs_data", 0.95), ("cephfs_metadata", 0.05)]
+
+    def test_power_of_two_rounding(self):
+        """pg counts round to a power of two, up when 25% below"""
+        self.assertEqual(nearest_power_of_two(1000), 1024)
+        self.assertEqual(nearest_power_of_two(700), 1024)
+        self.assertEqual(nearest_power_of_two(600), 512)
+
+    def test_pool_shares(self):
+        """The data pool gets most of the placement groups"""
+        plan = plan_pgs(30, self.cephfs, size=3, target_per_osd=100)
+        self.assertEqual(plan['cephfs_data'], 1024)
+        self.assertEqual(plan['cephfs_metadata'], 64)
+
+    def test_pgs_per_osd(self):
+        """The plan stays close to the target pgs per OSD"""
+        plan = plan_pgs(100, self.cephfs, size=3, target_per_osd=100)
+        per_osd = pgs_per_osd(plan, 100, size=3)
+        self.assertTrue(75 <= per_osd <= 150, msg=per_osd)
+
+    def test_small_pool_spans_osds(self):
+        """A small pool still has a pg for every OSD"""
+        plan = plan_pgs(200, self.cephfs, size=3, target_per_osd=100)
+        self.assertGreaterEqual(plan['cephfs_metadata'] * 3, 200)
+
+    def shortDescription(self):
+        return None
+
+    def __str__(self):
+        return "(%s) : %s" % (self._testMethodName,
+                              self._testMethodDoc)
+
+
+if __name__ == '__main__':
+
+    pg_suite = unittest.TestLoader().loadTestsFromTestCase(PGPlanChecks)
+    unittest.TextTestRunner(verbosity=2).run(pg_suite)
@@ -0,0 +1,81 @@
+
+import unittest
+import logging
+import shutil
+import tempfile
+import os
+import sys
+
+sys.path.insert(0, '../')
+
+from ceph_ansible_copilot.utils import PluginMgr
+
+PLUGIN = """
+import os
+
+description = "{name} plugin"
+yml_file = '{yml_file}'
+provides = {provides}
+requires = {requires}
+timestamp = os.path.getmtime('/')
+
+
+def plugin_main(config=None):
+    return None
+"""
+
+
+class PluginChecks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("PluginChecks")
+        cls.logger = logging.getLogger('copilot')
+        cls.logger.addHandler(logging.NullHandler())
+
+    def setUp(self):
+        self.plugin_dir = tempfile.mkdtemp()
+        self.target_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.plugin_dir)
+        shutil.rmtree(self.target_dir)
+
+    def add_plugin(self, name, target_dir, provides=None, requires=None):
+        with open(os.path.join(self.plugin_dir,
+                               '{}.py'.format(name)), 'w') as f:
+            f.write(PLUGIN.format(name=name,
+                                  yml_file=os.path.join(target_dir,
+                                                        '{}.yml'.format(name)),
+                                  provides=provides or [],
+                                  requires=requires or []))
+
+    def test_rejected_plugin(self):
+        """A plugin without its target directory is skipped, not fatal"""
+        self.add_plugin('good_yml', self.target_dir, provides=['good'])
+        self.add_plugin('bad_yml', os.path.join(self.target_dir, 'missing'),
+                        provides=['bad'], requires=['good'])
+        mgr = PluginMgr(plugin_dir=self.plugin_dir, logger=self.logger)
+        self.assertEqual(sorted(mgr.plugins.keys()), ['good_yml'])
+
+    def test_schedule(self):
+        """Plugins run after their providers, unknown requirements ignored"""
+        self.add_plugin('first_yml', self.target_dir, provides=['first'],
+                        requires=['used_roles'])
+        self.add_plugin('second_yml', self.target_dir,
+                        requires=['first', 'nothing_provides_this'])
+        mgr = PluginMgr(plugin_dir=self.plugin_dir, logger=self.logger)
+        self.assertEqual(mgr.schedule(), [['first_yml'], ['second_yml']])
+
+    def shortDescription(self):
+        return None
+
+    def __str__(self):
+        return "(%s) : %s" % (self._testMethodName,
+                              self._testMethodDoc)
+
+
+if __name__ == '__main__':
+
+    plugin_suite = unittest.TestLoader().loadTestsFromTestCase(PluginChecks)
+    unittest.TextTestRunner(verbosity=2).run(plugin_suite)
@@ -79,6 +79,22 @@ class ClusterChecks(unittest.TestCase):
         c = self._check_cluster([3, 3, 3], mode='prod', install_source='RH CDN')
         self.assertNotEqual(c.state, 'OK', msg=c.state_long)
 
+    def test_incremental_update(self):
+        """Deselecting and reselecting a host updates the verdict"""
+        c = self._check_cluster([0, 0, 0, 2, 2, 2], mode='dev')
+        self.assertEqual(c.state, 'OK', msg=c.state_long)
+        mon = c.hosts['mon_mgr']
+        mon.selected = False
+        c.update_host(mon)
+        c.check()
+        self.assertEqual(c.mons, 2)
+        self.assertNotEqual(c.state, 'OK')
+        mon.selected = True
+        c.update_host(mon)
+        c.check()
+        self.assertEqual(c.mons, 3)
+        self.assertEqual(c.state, 'OK', msg=c.state_long)
+
     def shortDescription(self):
         return None
 
@@ -97,7 +113,8 @@ class HostChecks(unittest.TestCase):
             (8, 36864, 10, 2, {"eth0": {"nic_gb": 10}}),
             (4, 2048, 10, 2, {"eth0": {"nic_gb": 10}}),
             (8, 36864, 16, 4, {"eth0": {"nic_gb": 10}}),
-            (8, 4096, 0, 0, {"eth0": {"nic_gb": 10}})
+            (8, 4096, 0, 0, {"eth0": {"nic_gb": 10}}),
+            (16, 65536, 0, 4, {"eth0": {"nic_gb": 10}})
         ]
 
     def _apply_spec(self, host_object, case_num, mode='dev'):
@@ -139,6 +156,43 @@ class HostChecks(unittest.TestCase):
         host_health = self._apply_spec(h, 3, 'prod')
         self.assertNotEqual(host_health.state, 'OK')
 
+    def test_prod_flash_network_FAIL(self):
+        """Prod - 10g is too slow for 4 ssd OSDs"""
+        h = Host(hostname='svr1', roles='osd')
+        host_health = self._apply_spec(h, 4, 'prod')
+        self.assertIn('Network bandwidth low', host_health.problems['warning'])
+
+    def test_bulk_check_matches_host_check(self):
+        """Bulk checks give the same state as the per host checks"""
+        hosts = dict()
+        expected = dict()
+        for case_num in range(len(self.specs)):
+            hostname = 'svr{}'.format(case_num)
+            h = Host(hostname=hostname, roles=['osd'])
+            expected[hostname] = self._apply_spec(h, case_num).state_long
+            hosts[hostname] = h
+
+        HostState.bulk_check(hosts)
+        for hostname in hosts:
+            self.assertEqual(hosts[hostname].state_msg, expected[hostname])
+
+    def test_role_filtered_rules(self):
+        """OSD only rules are not applied to a mon"""
+        h = Host(hostname='svr1', roles=['mon'])
+        host_health = self._apply_spec(h, 3, 'prod')
+        self.assertEqual(host_health.state, 'OK', msg=host_health.state_long)
+
+    def test_memoized_result(self):
+        """Hosts with the same fingerprint share the cached result"""
+        h1 = Host(hostname='svr1', roles=['osd'])
+        h2 = Host(hostname='svr2', roles=['osd'])
+        first = self._apply_spec(h1, 1, 'prod')
+        second = self._apply_spec(h2, 1, 'prod')
+        self.assertEqual(first.fingerprint, second.fingerprint)
+        self.assertEqual(first.problems, second.problems)
+        self.assertIsNot(first.problems['warning'],
+                         second.problems['warning'])
+
     def shortDescription(self):
         return None
 